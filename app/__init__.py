@@ -5,10 +5,16 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_bootstrap import Bootstrap5
 from app.middleware import PrefixMiddleware
+from app.database import configure_engine, database_url, engine_options
 
 application = Flask(__name__)
 application.config.from_object(Config)
+application.config['SQLALCHEMY_DATABASE_URI'] = database_url(application.config['SQLALCHEMY_DATABASE_URI'])
+application.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS',
+                              engine_options(application.config['SQLALCHEMY_DATABASE_URI'], application.config))
 db = SQLAlchemy(application)
+with application.app_context():
+    configure_engine(db.engine, application.config)
 migrate = Migrate(application, db)
 login = LoginManager(application)
 login.login_view = 'login'
@@ -18,4 +24,4 @@ bootstrap = Bootstrap5(application)
 application.wsgi_app = PrefixMiddleware(application.wsgi_app, voc=False)
 
 
-from app import routes, models
\ No newline at end of file
+from app import routes, models, notifications, instrumentation
\ No newline at end of file
@@ -0,0 +1,201 @@
+import json
+import re
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Any, Optional
+
+import PIL.Image
+
+from app import application
+
+
+class ModelBackend:
+    """
+    Source of the generative models behind every AI feature.
+
+    `model()` returns an object with `generate_content(contents, stream=False,
+    request_options=None)` and `chat_model(system_instruction)` one with
+    `start_chat(history)`, matching `google.generativeai.GenerativeModel`, so
+    the code built on them does not care which backend is configured.
+    """
+
+    name = None
+
+    def model(self):
+        raise NotImplementedError
+
+    def chat_model(self, system_instruction: str):
+        raise NotImplementedError
+
+
+class GeminiBackend(ModelBackend):
+    """Google Gemini; the SDK is configured on first use rather than at import."""
+
+    name = 'gemini'
+
+    def __init__(self, api_key: str, model_name: str = 'gemini-1.5-flash'):
+        self.api_key = api_key
+        self.model_name = model_name
+        self._model = None
+        self._configured = False
+
+    def _genai(self):
+        import google.generativeai as genai
+        if not self._configured:
+            genai.configure(api_key=self.api_key)
+            self._configured = True
+        return genai
+
+    def model(self):
+        if self._model is None:
+            self._model = self._genai().GenerativeModel(self.model_name)
+        return self._model
+
+    def chat_model(self, system_instruction: str):
+        return self._genai().GenerativeModel(f"models/{self.model_name}", system_instruction=system_instruction)
+
+
+# Products the local backend "recognises", with their shelf life in days
+LOCAL_PRODUCTS = [
+    ('Rice', 'Royal Umbrella', 'Carbohydrates', 365,
+     '100g of cooked rice: about 130 kcal, 2.7g protein, 28g carbohydrates, 0.3g fat.'),
+    ('Milk', 'Meiji', 'Protein', 7, '100ml: about 64 kcal, 3.3g protein, 4.8g carbohydrates, 3.6g fat.'),
+    ('Eggs', None, 'Protein', 21, 'One egg: about 72 kcal, 6.3g protein, 0.4g carbohydrates, 4.8g fat.'),
+    ('Chicken Breast', None, 'Protein', 3, '100g: about 165 kcal, 31g protein, 0g carbohydrates, 3.6g fat.'),
+    ('Broccoli', None, 'Fruits and Vegetables', 5, '100g: about 34 kcal, 2.8g protein, 7g carbohydrates, 0.4g fat.'),
+    ('Apples', None, 'Fruits and Vegetables', 30, 'One apple: about 95 kcal, 0.5g protein, 25g carbohydrates.'),
+    ('Butter', 'Anchor', 'Fats', 60, '10g: about 72 kcal, 8.1g fat.'),
+    ('Yoghurt', 'Marigold', 'Protein', 14, '100g: about 59 kcal, 3.5g protein, 4.1g carbohydrates, 3.3g fat.'),
+]
+
+RECIPE_STYLES = [
+    ('{} Stir-Fry', ['Chop the {ingredients}.', 'Stir-fry everything over high heat for 5 minutes.', 'Season and serve hot.']),
+    ('Baked {}', ['Preheat the oven to 200C.', 'Toss the {ingredients} with oil and salt.', 'Bake for 25 minutes.']),
+    ('{} Soup', ['Simmer the {ingredients} in stock for 20 minutes.', 'Blend until smooth.', 'Season to taste.']),
+]
+
+
+def _simulate_latency(latency: float, request_options: Optional[dict]):
+    """Sleep like an upstream request would, timing out like one past the caller's deadline."""
+    timeout = (request_options or {}).get('timeout')
+    if timeout is not None and latency > timeout:
+        time.sleep(timeout)
+        raise TimeoutError('Local model request timed out')
+    time.sleep(latency)
+
+
+class LocalResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class LocalModel:
+    """
+    Deterministic stand-in for a Gemini model, for load tests and offline runs.
+
+    Prompts are recognised by their shape: images get a product from
+    LOCAL_PRODUCTS chosen by a checksum of their pixels, the batch prompt
+    gets a JSON array with one product per image and recipe prompts get
+    recipes built from the listed ingredients. Every request waits `latency`
+    seconds first, so upstream time can be simulated separately from the
+    app's own overhead.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    @staticmethod
+    def product(img: PIL.Image.Image) -> dict[str, Any]:
+        name, brand, category, shelf_life, nutrition = \
+            LOCAL_PRODUCTS[zlib.crc32(img.tobytes()) % len(LOCAL_PRODUCTS)]
+        return {
+            'name': name,
+            'brand': brand,
+            'type': category,
+            'expiry_date': (date.today() + timedelta(days=shelf_life)).strftime('%Y-%m-%d'),
+            'nutrition_content': nutrition,
+        }
+
+    @staticmethod
+    def recipes(ingredients: list[str]) -> list[dict[str, Any]]:
+        listed = ', '.join(ingredients)
+        return [{
+            'name': name.format(ingredients[0].title()),
+            'ingredients': ingredients,
+            'steps': [step.format(ingredients=listed) for step in steps],
+        } for name, steps in RECIPE_STYLES]
+
+    def reply(self, contents: list) -> str:
+        prompt = next((part for part in contents if isinstance(part, str)), '')
+        images = [part for part in contents if isinstance(part, PIL.Image.Image)]
+        if images and 'numbered images' in prompt:
+            return json.dumps([{'image': index + 1, **self.product(img)} for index, img in enumerate(images)])
+        if images:
+            return json.dumps(self.product(images[0]))
+        match = re.search(r'following ingredients: (.*?)\.\s*\n', prompt)
+        if match:
+            return json.dumps(self.recipes([name.strip() for name in match.group(1).split(',') if name.strip()]))
+        return 'Sorry, I can only help with groceries and recipes.'
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        if not isinstance(contents, list):
+            contents = [contents]
+        _simulate_latency(self.latency, request_options)
+        text = self.reply(contents)
+        if stream:
+            return (LocalResponse(text[start:start + 64]) for start in range(0, len(text), 64))
+        return LocalResponse(text)
+
+
+class LocalChatModel:
+    def __init__(self, system_instruction: str, latency: float = 0.0):
+        self.system_instruction = system_instruction
+        self.latency = latency
+
+    def start_chat(self, history: Optional[list] = None) -> 'LocalChat':
+        return LocalChat(self, history or [])
+
+
+class LocalChat:
+    """Chat session that answers from the ingredient list in the system prompt."""
+
+    def __init__(self, model: LocalChatModel, history: list):
+        self.model = model
+        self.history = list(history)
+
+    def send_message(self, message: str, request_options=None) -> LocalResponse:
+        _simulate_latency(self.model.latency, request_options)
+        ingredients = [name.strip() for name in re.findall(r'([^,()\n]+) \([^()]*expiry:', self.model.system_instruction)]
+        if ingredients:
+            text = f"With {', '.join(ingredients[:3])} you could make a quick stir-fry. Want the steps?"
+        else:
+            text = 'Your fridge looks empty, so a shopping trip is the first step!'
+        self.history += [{'role': 'user', 'parts': [message]}, {'role': 'model', 'parts': [text]}]
+        return LocalResponse(text)
+
+
+class LocalBackend(ModelBackend):
+    """Rule-based models that never leave the process."""
+
+    name = 'local'
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def model(self):
+        return LocalModel(self.latency)
+
+    def chat_model(self, system_instruction: str):
+        return LocalChatModel(system_instruction, self.latency)
+
+
+def build_backend(config) -> ModelBackend:
+    if config['MODEL_BACKEND'] == 'gemini':
+        return GeminiBackend(config['GEMINI_API_KEY'], config['GEMINI_MODEL'])
+    if config['MODEL_BACKEND'] == 'local':
+        return LocalBackend(latency=config['LOCAL_MODEL_LATENCY'])
+    raise ValueError(f"Unknown model backend: {config['MODEL_BACKEND']}")
+
+
+model_backend = build_backend(application.config)
@@ -0,0 +1,377 @@
+import csv
+import io
+import json
+import re
+import sys
+import time as clock
+import zipfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import IO, Any, Iterable, Iterator, Optional
+
+import click
+from sqlalchemy import insert, select
+
+from app import application, db
+from app.models import FoodImage, PantryItem, User
+from app.search import search_index
+from app.summary import rebuild_summary
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+
+# Spellings found in catalogs and older forms, casefolded
+CATEGORY_ALIASES = {
+    'carbohydrates': 'Carbohydrates', 'carbohydrate': 'Carbohydrates', 'carbs': 'Carbohydrates',
+    'fruits and vegetables': 'Fruits and Vegetables', 'fruit + vegetable': 'Fruits and Vegetables',
+    'fruit': 'Fruits and Vegetables', 'fruits': 'Fruits and Vegetables',
+    'vegetable': 'Fruits and Vegetables', 'vegetables': 'Fruits and Vegetables',
+    'protein': 'Protein', 'proteins': 'Protein',
+    'fats': 'Fats', 'fat': 'Fats',
+}
+
+# Column names accepted for each field, casefolded
+COLUMN_ALIASES = {
+    'type': 'category',
+    'nutritional_content': 'nutrition_content',
+    'expiry_date': 'expiration_date',
+    'image': 'image_url',
+}
+
+WEIGHT_UNITS = {'': 1.0, 'g': 1.0, 'gram': 1.0, 'grams': 1.0, 'kg': 1000.0, 'mg': 0.001,
+                'ml': 1.0, 'l': 1000.0}
+ENERGY_UNITS = {'': 1.0, 'kcal': 1.0, 'cal': 1.0, 'calories': 1.0, 'kj': 1 / 4.184}
+
+EXPORT_COLUMNS = ['name', 'brand', 'category', 'weight', 'calories', 'expiration_date', 'added_date',
+                  'used', 'out_of_stock', 'nutrition_content', 'image_url']
+
+_QUANTITY = re.compile(r'\s*([0-9]+(?:[.,][0-9]+)?|[.,][0-9]+)\s*([a-zA-Z]*)\s*$')
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; the import skips it and carries on."""
+
+
+def parse_quantity(value, units: dict[str, float]) -> Optional[float]:
+    """
+    Parse "400g", "1kg" or "968 kcal" into a float in the base unit of `units`.
+
+    Args:
+        value: A number, a string with an optional unit, or empty.
+        units (Dict[str, float]): Multiplier per lower-case unit; '' for bare numbers.
+
+    Returns:
+        float, optional: The quantity, or None when `value` is empty.
+    """
+    if value is None or isinstance(value, (int, float)):
+        return None if value is None else float(value)
+    match = _QUANTITY.match(value)
+    if not match:
+        if not value.strip():
+            return None
+        raise RowError(f'Not a quantity: {value!r}')
+    number, unit = match.groups()
+    unit = unit.lower()
+    if unit not in units:
+        raise RowError(f'Unknown unit {unit!r} in {value!r}')
+    return float(number.replace(',', '.')) * units[unit]
+
+
+def normalize_category(value) -> str:
+    category = CATEGORY_ALIASES.get(str(value or '').strip().casefold())
+    if category is None:
+        raise RowError(f'Unknown category {value!r}, expected one of {", ".join(CATEGORIES)}')
+    return category
+
+
+def parse_date(value) -> Optional[datetime]:
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time.min)
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RowError(f'Not a date: {value!r}') from None
+
+
+def _flag(value) -> bool:
+    if not value:
+        return False
+    return value is True or str(value).strip().casefold() in ('1', 'true', 'yes', 'y')
+
+
+def _normalize_header(name) -> str:
+    name = str(name or '').strip().casefold()
+    return COLUMN_ALIASES.get(name, name)
+
+
+def read_csv(stream: IO[bytes]) -> Iterator[dict]:
+    reader = csv.reader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    header = [_normalize_header(name) for name in next(reader, [])]
+    for row in reader:
+        if any(row):
+            yield dict(zip(header, row))
+
+
+def read_jsonl(stream: IO[bytes]) -> Iterator[dict | RowError]:
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            # Handed to the importer, which skips the line like any other bad row
+            yield RowError(f'Invalid JSON on line {line_number}: {e}')
+            continue
+        if not isinstance(row, dict):
+            yield RowError(f'Expected a JSON object on line {line_number}')
+            continue
+        yield {_normalize_header(key): value for key, value in row.items()}
+
+
+def read_xlsx(stream: IO[bytes]) -> Iterator[dict]:
+    """Rows of the first sheet; openpyxl's read-only mode parses it as it goes."""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError('Importing .xlsx files requires openpyxl (pip install openpyxl)') from None
+    try:
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise ValueError(f'Not a valid .xlsx file: {e}') from None
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_normalize_header(name) for name in next(rows, ())]
+        for row in rows:
+            if any(value is not None and value != '' for value in row):
+                yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'xlsx': read_xlsx}
+
+
+def detect_format(filename: str) -> str:
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    extension = {'json': 'jsonl', 'ndjson': 'jsonl'}.get(extension, extension)
+    if extension not in READERS:
+        raise ValueError(f'Unsupported file type {filename!r}, expected .xlsx, .csv or .jsonl')
+    return extension
+
+
+def prepare_row(row: dict, user_id: int, now: datetime, expires_in: Optional[int]) -> tuple[dict, Optional[str]]:
+    """Validate one input row; returns the pantry_item values and the image URL."""
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise RowError('Missing name')
+    expiration_date = parse_date(row.get('expiration_date'))
+    if expiration_date is None:
+        if expires_in is None:
+            raise RowError('Missing expiration_date')
+        expiration_date = datetime.combine(now.date() + timedelta(days=expires_in), time.min)
+    brand = row.get('brand')
+    image_url = str(row.get('image_url') or '').strip() or None
+    values = {
+        'user_id': user_id,
+        'name': name[:128],
+        'brand': str(brand).strip()[:64] if brand not in (None, '') else None,
+        'category': normalize_category(row.get('category')),
+        'weight': parse_quantity(row.get('weight'), WEIGHT_UNITS),
+        'calories': parse_quantity(row.get('calories'), ENERGY_UNITS),
+        'nutrition_content': str(row.get('nutrition_content') or '').strip() or None,
+        'expiration_date': expiration_date,
+        'added_date': parse_date(row.get('added_date')) or now,
+        'used': _flag(row.get('used')),
+        'out_of_stock': _flag(row.get('out_of_stock')),
+    }
+    return values, image_url
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list)  # the first `max_errors` row errors
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'imported': self.imported, 'skipped': self.skipped, 'errors': self.errors}
+
+
+def _insert_chunk(connection, items: list[dict], images: list[Optional[str]]):
+    table = PantryItem.__table__
+    if connection.dialect.name == 'sqlite':
+        # RETURNING with ordered rows degrades to one statement per row on SQLite. Instead,
+        # the first insert takes the database's write lock, so the ids that follow it are
+        # free until this transaction ends and the rest can be inserted with explicit ids.
+        first_id = connection.execute(insert(table), items[0]).inserted_primary_key[0]
+        for offset, values in enumerate(items[1:], start=1):
+            values['id'] = first_id + offset
+        if len(items) > 1:
+            connection.execute(insert(table), items[1:])
+        ids = range(first_id, first_id + len(items))
+        new_rows = table.c.id.between(first_id, ids[-1])
+    else:
+        ids = connection.execute(
+            insert(table).returning(table.c.id, sort_by_parameter_order=True), items).scalars().all()
+        new_rows = table.c.id.in_(ids)
+    if any(images):
+        connection.execute(insert(FoodImage.__table__), [
+            {'pantry_item_id': item_id, 'image_url': image_url}
+            for item_id, image_url in zip(ids, images) if image_url])
+    # Inserts bypass the session, so the new rows are added to the search index here
+    search_index.index(connection, 'pantry', new_rows)
+
+
+def import_items(rows: Iterable[dict], user_id: int, chunk_size: int = 5000, expires_in: Optional[int] = None,
+                 max_errors: int = 100) -> ImportResult:
+    """
+    Stream rows into a user's pantry.
+
+    Rows are validated as they are read and inserted `chunk_size` at a
+    time, each chunk in its own transaction, so memory stays flat however
+    long the file is and a failure keeps the chunks already committed.
+    Invalid rows are skipped and reported. The user's summary is rebuilt
+    once at the end, which also bumps the pantry version.
+
+    Args:
+        rows (Iterable[Dict]): Rows from one of the READERS.
+        user_id (int): Owner of the imported items.
+        chunk_size (int): Rows per transaction.
+        expires_in (int, optional): Days until expiry for rows without an expiration_date;
+            such rows are rejected when omitted.
+        max_errors (int): Row errors kept in the result.
+
+    Returns:
+        ImportResult: Counts and the first row errors.
+    """
+    result = ImportResult()
+    now = datetime.now()
+    items, images = [], []
+    engine = db.engine
+    for row_number, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, RowError):
+                raise row
+            values, image_url = prepare_row(row, user_id, now, expires_in)
+        except RowError as e:
+            result.skipped += 1
+            if len(result.errors) < max_errors:
+                result.errors.append(f'Row {row_number}: {e}')
+            continue
+        items.append(values)
+        images.append(image_url)
+        if len(items) >= chunk_size:
+            with engine.begin() as connection:
+                _insert_chunk(connection, items, images)
+            result.imported += len(items)
+            items, images = [], []
+    with engine.begin() as connection:
+        if items:
+            _insert_chunk(connection, items, images)
+            result.imported += len(items)
+        if result.imported:
+            rebuild_summary(connection, user_id)
+    # The notifier picks up the new items at its next notify-at time
+    return result
+
+
+def _export_rows(user_id: int, batch_size: int) -> Iterator[dict]:
+    """
+    The user's items in expiry order, with their first image.
+
+    One query is streamed `batch_size` rows at a time (it follows the
+    (user_id, expiration_date) index, so nothing is sorted), and the
+    images of each batch are fetched with one IN query.
+    """
+    item_table, image_table = PantryItem.__table__, FoodImage.__table__
+    columns = [item_table.c[name] for name in EXPORT_COLUMNS if name != 'image_url']
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(
+            select(item_table.c.id, *columns).where(item_table.c.user_id == user_id)
+            .order_by(item_table.c.expiration_date, item_table.c.id))
+        for rows in result.partitions():
+            images = {}
+            for item_id, image_url in connection.execute(
+                    select(image_table.c.pantry_item_id, image_table.c.image_url)
+                    .where(image_table.c.pantry_item_id.in_([row.id for row in rows]))
+                    .order_by(image_table.c.id)):
+                images.setdefault(item_id, image_url)
+            for row in rows:
+                data = row._asdict()
+                data['image_url'] = images.get(data.pop('id'))
+                yield data
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == time.min else value.isoformat()
+    return value
+
+
+def export_csv(user_id: int, batch_size: int = 5000) -> Iterator[str]:
+    """The user's pantry as CSV, one chunk of text per batch of rows."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_COLUMNS)
+    writer.writeheader()
+    for count, row in enumerate(_export_rows(user_id, batch_size), start=1):
+        writer.writerow({key: _export_value(value) for key, value in row.items()})
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_jsonl(user_id: int, batch_size: int = 5000) -> Iterator[str]:
+    """The user's pantry as JSON lines, one chunk of text per batch of rows."""
+    lines = []
+    for row in _export_rows(user_id, batch_size):
+        lines.append(json.dumps({key: _export_value(value) for key, value in row.items()}))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+EXPORTERS = {'csv': (export_csv, 'text/csv'), 'jsonl': (export_jsonl, 'application/x-ndjson')}
+
+
+def _user_id(username: str) -> int:
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.BadParameter(f'No user named {username!r}', param_hint='--user')
+    return user.id
+
+
+@application.cli.command('import-pantry')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user', 'username', required=True, help='Owner of the imported items.')
+@click.option('--format', 'fmt', type=click.Choice(sorted(READERS)), help='Defaults to the file extension.')
+@click.option('--expires-in', type=int, help='Days until expiry for rows without an expiration_date.')
+@click.option('--chunk-size', type=int, default=lambda: application.config['BULK_IMPORT_CHUNK_SIZE'],
+              show_default='BULK_IMPORT_CHUNK_SIZE')
+def import_pantry_command(path, username, fmt, expires_in, chunk_size):
+    """Import pantry items from an .xlsx, .csv or .jsonl file."""
+    start = clock.perf_counter()
+    with open(path, 'rb') as stream:
+        result = import_items(READERS[fmt or detect_format(path)](stream), _user_id(username),
+                              chunk_size=chunk_size, expires_in=expires_in)
+    for error in result.errors:
+        print(error, file=sys.stderr)
+    print(f"Imported {result.imported} items, skipped {result.skipped} rows "
+          f"in {clock.perf_counter() - start:.1f}s.")
+
+
+@application.cli.command('export-pantry')
+@click.argument('output', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--user', 'username', required=True, help='Owner of the exported items.')
+@click.option('--format', 'fmt', type=click.Choice(sorted(EXPORTERS)), default='csv', show_default=True)
+def export_pantry_command(output, username, fmt):
+    """Write a user's pantry as CSV or JSON lines to OUTPUT (stdout by default)."""
+    export, _ = EXPORTERS[fmt]
+    for chunk in export(_user_id(username)):
+        output.write(chunk)
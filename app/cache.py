@@ -0,0 +1,371 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import PIL.Image
+
+from app import application
+
+
+def content_hash(img: PIL.Image.Image) -> str:
+    """SHA-256 of the decoded pixels, so re-encoded copies of one photo share a key."""
+    digest = hashlib.sha256()
+    digest.update(f'{img.mode}:{img.width}x{img.height}:'.encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def perceptual_hash(img: PIL.Image.Image) -> int:
+    """64-bit difference hash (dHash); near-duplicate photos differ in only a few bits."""
+    small = img.convert('L').resize((9, 8), PIL.Image.LANCZOS)
+    pixels = small.tobytes()  # one byte per pixel in mode L
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _bands(phash: int) -> list[int]:
+    """Split a 64-bit hash into four 16-bit bands used as lookup keys."""
+    return [(phash >> shift) & 0xFFFF for shift in (48, 32, 16, 0)]
+
+
+class LRUCache:
+    """
+    Thread-safe in-memory LRU cache with an optional time-to-live.
+
+    `ttl` is in seconds (None keeps entries until they are evicted or
+    invalidated). Hit and miss counters are kept for `stats()`.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class DiskCache:
+    """
+    File-backed cache with the `LRUCache` interface, for values shared by
+    every worker process and kept across restarts.
+
+    Each value is stored as JSON in its own file under `directory`, named
+    by a hash of the key, and written atomically. Entries older than `ttl`
+    seconds are treated as missing; once more than `maxsize` files exist
+    the least recently used ones are removed.
+    """
+
+    def __init__(self, directory: str, maxsize: int = 10000, ttl: Optional[float] = None):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: Hashable) -> str:
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode()).hexdigest() + '.json')
+
+    def get(self, key: Hashable, default=None):
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, encoding='utf-8') as f:
+                value = json.load(f)
+            os.utime(path, (time.time(), os.path.getmtime(path)))  # atime orders the eviction
+        except (OSError, ValueError):
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        path = self._path(key)
+        temp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(value, f)
+        os.replace(temp, path)
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % 100 == 0
+        if evict:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    entries.append((entry.stat().st_atime, entry.path))
+                except OSError:
+                    pass
+        entries.sort()
+        for _, path in entries[:max(len(entries) - self.maxsize, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def invalidate(self, key: Hashable):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def __len__(self):
+        return sum(1 for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class ProductCache:
+    """
+    Persistent cache of product-recognition results stored in SQLite.
+
+    Lookups first try the exact content hash, then any entry whose perceptual
+    hash is within `max_distance` bits. `max_distance` is at most 3: two
+    hashes that close always share at least one of their four 16-bit bands,
+    so only rows matching a band need to be compared.
+
+    Only the product fields are shared between near duplicates: a different
+    photo of the same product may well show another expiry date, so
+    `get_or_compute()` re-reads the date from the new photo on those hits.
+    Results without an expiry date are never stored.
+
+    Entries expire `ttl` seconds after they were stored, and the least recently
+    used entries are evicted once the cache holds more than `max_entries`.
+    Both are deleted when a result is stored, so lookups only read.
+    """
+
+    def __init__(self, path: str, ttl: float = 30 * 24 * 3600, max_entries: int = 5000, max_distance: int = 3):
+        if not 0 <= max_distance <= 3:
+            raise ValueError(f"max_distance must be between 0 and 3 bits, not {max_distance}")
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._conn = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.executescript('''
+                CREATE TABLE IF NOT EXISTS product_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    phash TEXT NOT NULL,
+                    band0 INTEGER NOT NULL,
+                    band1 INTEGER NOT NULL,
+                    band2 INTEGER NOT NULL,
+                    band3 INTEGER NOT NULL,
+                    product TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_product_cache_band0 ON product_cache (band0);
+                CREATE INDEX IF NOT EXISTS ix_product_cache_band1 ON product_cache (band1);
+                CREATE INDEX IF NOT EXISTS ix_product_cache_band2 ON product_cache (band2);
+                CREATE INDEX IF NOT EXISTS ix_product_cache_band3 ON product_cache (band3);
+                CREATE INDEX IF NOT EXISTS ix_product_cache_last_used ON product_cache (last_used);
+                CREATE INDEX IF NOT EXISTS ix_product_cache_created_at ON product_cache (created_at);
+            ''')
+            self._conn = conn
+        return self._conn
+
+    def get(self, img: PIL.Image.Image) -> Optional[dict]:
+        """Return the cached product dict for an image, or None on a miss."""
+        return self._lookup(img)[0]
+
+    def _lookup(self, img: PIL.Image.Image) -> tuple[Optional[dict], bool]:
+        """The cached product dict for an image (None on a miss) and whether it was stored for this exact image."""
+        key = content_hash(img)
+        phash = perceptual_hash(img)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT product FROM product_cache WHERE content_hash = ? AND created_at >= ?',
+                               (key, now - self.ttl)).fetchone()
+            if row is not None:
+                self.hits += 1
+                conn.execute('UPDATE product_cache SET last_used = ? WHERE content_hash = ?', (now, key))
+                return json.loads(row[0]), True
+
+            best = None
+            bands = _bands(phash)
+            candidates = conn.execute(
+                'SELECT content_hash, phash, product FROM product_cache '
+                'WHERE (band0 = ? OR band1 = ? OR band2 = ? OR band3 = ?) AND created_at >= ?',
+                (*bands, now - self.ttl))
+            for other_key, other_phash, product in candidates:
+                distance = bin(phash ^ int(other_phash, 16)).count('1')
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, other_key, product)
+            if best is None:
+                self.misses += 1
+                return None, False
+            self.near_hits += 1
+            conn.execute('UPDATE product_cache SET last_used = ? WHERE content_hash = ?', (now, best[1]))
+            return json.loads(best[2]), False
+
+    def put(self, img: PIL.Image.Image, product: dict):
+        """Store a product dict for an image, then delete expired entries and the least recently used overflow."""
+        key = content_hash(img)
+        phash = perceptual_hash(img)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO product_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, f'{phash:016x}', *_bands(phash), json.dumps(product), now, now))
+            evicted = conn.execute('DELETE FROM product_cache WHERE created_at < ?', (now - self.ttl,)).rowcount
+            evicted += conn.execute(
+                'DELETE FROM product_cache WHERE content_hash IN ('
+                'SELECT content_hash FROM product_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)).rowcount
+            self.evictions += evicted
+
+    def get_or_compute(self, img: PIL.Image.Image, compute, read_expiry) -> dict:
+        """
+        Return the cached product for `img`, calling `compute(img)` and storing it on a miss.
+
+        Args:
+            img (PIL.Image.Image): The product photo.
+            compute (Callable[[PIL.Image.Image], dict]): Full recognition, used on a miss.
+            read_expiry (Callable[[PIL.Image.Image], Optional[str]]): Reads just the expiry date
+                off a photo, used on near-duplicate hits.
+
+        Returns:
+            Dict[str, Any]: The product dict.
+        """
+        product, exact = self._lookup(img)
+        if product is not None:
+            if not exact:
+                product = {**product, 'expiry_date': read_expiry(img)}
+            return product
+        product = compute(img)
+        # Without an expiry date the item cannot be added anyway, and a retake may read one.
+        if product and product.get('expiry_date'):
+            self.put(img, product)
+        return product
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute('DELETE FROM product_cache')
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._connection().execute('SELECT COUNT(*) FROM product_cache').fetchone()[0]
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'size': size,
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.near_hits) / lookups if lookups else 0.0,
+            }
+
+
+product_cache = ProductCache(
+    application.config['PRODUCT_CACHE_PATH'],
+    ttl=application.config['PRODUCT_CACHE_TTL'],
+    max_entries=application.config['PRODUCT_CACHE_SIZE'],
+    max_distance=application.config['PRODUCT_CACHE_DISTANCE'],
+)
+
+recipe_cache = LRUCache(
+    maxsize=application.config['RECIPE_CACHE_SIZE'],
+    ttl=application.config['RECIPE_CACHE_TTL'],
+)
+
+
+def build_fragment_cache(config):
+    """Cache of rendered page fragments: 'memory' (per process) or 'disk' (shared by processes)."""
+    if config['FRAGMENT_CACHE_BACKEND'] == 'memory':
+        return LRUCache(maxsize=config['FRAGMENT_CACHE_SIZE'], ttl=config['FRAGMENT_CACHE_TTL'])
+    if config['FRAGMENT_CACHE_BACKEND'] == 'disk':
+        return DiskCache(config['FRAGMENT_CACHE_DIR'], maxsize=config['FRAGMENT_CACHE_SIZE'],
+                         ttl=config['FRAGMENT_CACHE_TTL'])
+    raise ValueError(f"Unknown fragment cache backend: {config['FRAGMENT_CACHE_BACKEND']}")
+
+
+fragment_cache = build_fragment_cache(application.config)
+
+def cached_information_products(img) -> dict:
+    """`get_information_products` behind the persistent product cache."""
+    from app.llm import get_expiry_date, get_information_products
+    return product_cache.get_or_compute(img, get_information_products, get_expiry_date)
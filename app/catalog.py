@@ -0,0 +1,372 @@
+import logging
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator, Optional
+
+import numpy as np
+
+from sqlalchemy import case, func, select
+
+from app import application, db
+from app.bulk import ENERGY_UNITS, READERS, WEIGHT_UNITS, RowError, detect_format, normalize_category, parse_quantity
+from app.cache import LRUCache
+from app.models import PantryItem
+from app.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Item fields the catalog can fill in when they were left empty
+DETAIL_FIELDS = ['brand', 'category', 'weight', 'calories', 'nutrition_content']
+
+def normalize_name(text) -> str:
+    """Casefolded words of a name without accents or punctuation: "Crème Fraîche!" -> "creme fraiche"."""
+    return ' '.join(tokenize(text))
+
+
+def trigrams(normalized: str, prefix: bool = False) -> set[str]:
+    """
+    Trigrams of each word padded like pg_trgm ("  milk " -> "  m", " mi", "mil", "ilk", "lk ").
+
+    With `prefix`, the last word is taken as still being typed and gets no
+    trailing pad, so "chick" shares all of its trigrams with "chicken".
+    """
+    words = normalized.split()
+    grams = set()
+    for position, word in enumerate(words):
+        padded = '  ' + word if prefix and position == len(words) - 1 else f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass(frozen=True)
+class Product:
+    name: str
+    brand: Optional[str] = None
+    category: Optional[str] = None
+    weight: Optional[float] = None  # grams
+    calories: Optional[float] = None  # kcal
+    nutrition_content: Optional[str] = None
+    source: str = 'catalog'  # 'catalog' file or 'pantry' history
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+class _Index:
+    """
+    Trigram postings over a list of products; the position in `products` is the product id.
+
+    Postings are collected in lists while the index is built and turned
+    into NumPy arrays by `freeze()`, so a lookup counts the shared
+    trigrams of every product with one `bincount` and scores them as
+    vectors, instead of looping over the candidates in Python.
+    """
+
+    def __init__(self):
+        self.products: list[Product] = []
+        self.words: list[frozenset[str]] = []
+        self.keys: set[tuple[str, str]] = set()  # (name, brand), normalised
+        self.postings: dict[str, list[int] | np.ndarray] = {}
+        self.sizes: list[int] | np.ndarray = []  # trigrams per product
+        self.frozen = False
+
+    def add(self, product: Product) -> bool:
+        key = (normalize_name(product.name), normalize_name(product.brand))
+        if not key[0] or key in self.keys:
+            return False
+        grams = trigrams(key[0])
+        product_id = len(self.products)
+        self.products.append(product)
+        self.words.append(frozenset(key[0].split()))
+        self.keys.add(key)
+        if self.frozen:
+            self.sizes = np.append(self.sizes, len(grams))
+            for gram in grams:
+                self.postings[gram] = np.append(self.postings.get(gram, ()), product_id).astype(np.int32)
+        else:
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings.setdefault(gram, []).append(product_id)
+        return True
+
+    def freeze(self) -> '_Index':
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in self.postings.items()}
+        self.sizes = np.array(self.sizes, dtype=np.int32)
+        self.frozen = True
+        return self
+
+    def shared(self, grams: set[str]) -> np.ndarray:
+        """Number of `grams` each product has, indexed by product id."""
+        postings = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not postings:
+            return np.zeros(len(self.products), dtype=np.int64)
+        return np.bincount(np.concatenate(postings), minlength=len(self.products))
+
+
+class ProductCatalog:
+    """
+    In-memory fuzzy index of known products, for autocomplete and for
+    filling in the details of items that are added by name.
+
+    Products are matched on the trigrams of their normalised names. The
+    index is built on first use by `loader` (an iterable of products) and
+    rebuilt in a background thread once it is older than `refresh`
+    seconds; lookups keep using the old index meanwhile. Results are
+    cached per query, since autocomplete sends the same prefixes over and
+    over.
+
+    Args:
+        loader (Callable[[], Iterable[Product]]): Yields every product; earlier ones win
+            over later ones with the same name and brand.
+        refresh (float): Seconds before the index is rebuilt.
+        threshold (float): Least trigram similarity (0-1) for `match()` to accept a product.
+        cache_size (int): Queries whose results are kept.
+    """
+
+    def __init__(self, loader, refresh: float = 3600, threshold: float = 0.5, cache_size: int = 4096):
+        self.loader = loader
+        self.refresh = refresh
+        self.threshold = threshold
+        self._index: Optional[_Index] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._results = LRUCache(maxsize=cache_size)
+        self.lookups = 0
+        self.matches = 0
+
+    def _build(self) -> _Index:
+        start = time.perf_counter()
+        index = _Index()
+        for product in self.loader():
+            index.add(product)
+        index.freeze()
+        logger.info('Built product catalog: %d products in %.2fs', len(index.products), time.perf_counter() - start)
+        return index
+
+    def _reload(self):
+        try:
+            index = self._build()
+        except Exception:
+            logger.exception('Rebuilding the product catalog failed; keeping the old index')
+            index = None
+        with self._lock:
+            if index is not None:
+                self._index, self._loaded_at = index, time.monotonic()
+                self._results.clear()
+            self._reloading = False
+
+    def index(self) -> _Index:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index, self._loaded_at = self._build(), time.monotonic()
+        elif time.monotonic() - self._loaded_at > self.refresh and not self._reloading:
+            with self._lock:
+                start, self._reloading = not self._reloading, True
+            if start:
+                threading.Thread(target=self._reload, name='catalog-reload', daemon=True).start()
+        return self._index
+
+    def reload(self):
+        """Rebuild the index now, e.g. after importing a new catalog file."""
+        with self._lock:
+            self._reloading = True
+        self._reload()
+
+    def add(self, product: Product):
+        """Make a product findable right away, until the next rebuild."""
+        index = self.index()
+        with self._lock:
+            if index.add(product):
+                self._results.clear()
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[Product, float]]:
+        """
+        Products for an autocomplete box, best first, with their scores.
+
+        A product scores the share of the query's trigrams it contains,
+        taking the last word as a prefix; ties go to the closer overall
+        match, so "milk" ranks "Milk" above "Milk Chocolate". Products
+        holding less than 40% of the query (and at least three trigrams of
+        it), which still lets a typo or two through, are left out.
+        """
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        key = ('search', normalized, limit)
+        results = self._results.get(key)
+        if results is None:
+            index = self.index()
+            grams = trigrams(normalized, prefix=True)
+            needed = max(-(-len(grams) * 2 // 5), min(len(grams), 3))
+            counts = index.shared(grams)
+            candidates = np.flatnonzero(counts >= needed)
+            shared = counts[candidates]
+            coverage = shared / len(grams)
+            similarity = shared / (len(grams) + index.sizes[candidates] - shared)
+            # Best coverage, then similarity; catalog products (lower ids) win full ties over pantry names
+            best = candidates[np.lexsort((candidates, -similarity, -coverage))[:limit]]
+            results = [(index.products[product_id], round(float(score), 3))
+                       for product_id, score in zip(best, counts[best] / len(grams))]
+            self._results.set(key, results)
+        self.lookups += 1
+        return results
+
+    def match(self, name: str, brand: Optional[str] = None) -> Optional[Product]:
+        """
+        The product `name` most likely refers to, or None.
+
+        Products are compared on trigram similarity (shared trigrams over
+        all trigrams of both names). Labels tend to say more than the
+        catalog ("Meiji Fresh Milk" for "Milk"), so a product whose every
+        word is in the name scores at least half way up from its
+        similarity. Only products scoring `threshold` or more qualify;
+        among close candidates one with the same brand wins.
+        """
+        normalized = normalize_name(name)
+        if not normalized:
+            return None
+        brand = normalize_name(brand)
+        key = ('match', normalized, brand)
+        product = self._results.get(key, False)
+        if product is False:
+            index = self.index()
+            grams, words = trigrams(normalized), set(normalized.split())
+            counts = index.shared(grams)
+            candidates = np.flatnonzero(counts)
+            shared, sizes = counts[candidates], index.sizes[candidates]
+            scores = shared / (len(grams) + sizes - shared)
+            for position in np.flatnonzero((scores < self.threshold) & (shared == sizes)):
+                if index.words[candidates[position]] <= words:
+                    scores[position] = 0.5 + scores[position] / 2
+            best, best_score = None, 0.0
+            for product_id, score in zip(candidates[scores >= self.threshold], scores[scores >= self.threshold]):
+                candidate = index.products[product_id]
+                if brand and normalize_name(candidate.brand) == brand:
+                    score += 0.1
+                if score > best_score:
+                    best, best_score = candidate, score
+            product = best
+            self._results.set(key, product)
+        self.lookups += 1
+        self.matches += product is not None
+        return product
+
+    def fill_details(self, values: dict[str, Any]) -> dict[str, Any]:
+        """
+        `values` with its empty DETAIL_FIELDS taken from the product its name matches.
+
+        Args:
+            values (Dict[str, Any]): Pantry item values with at least a `name`.
+
+        Returns:
+            Dict[str, Any]: A copy of `values`; unchanged when nothing matches.
+        """
+        if all(values.get(field) not in (None, '') for field in DETAIL_FIELDS):
+            return dict(values)
+        product = self.match(values.get('name'), values.get('brand'))
+        if product is None:
+            return dict(values)
+        filled = dict(values)
+        for field in DETAIL_FIELDS:
+            if filled.get(field) in (None, ''):
+                filled[field] = getattr(product, field)
+        return filled
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            'products': len(index.products) if index is not None else 0,
+            'trigrams': len(index.postings) if index is not None else 0,
+            'lookups': self.lookups,
+            'matches': self.matches,
+            'age': round(time.monotonic() - self._loaded_at, 1) if index is not None else None,
+            'results': self._results.stats(),
+        }
+
+
+def _optional(parse, value, *args):
+    try:
+        return parse(value, *args)
+    except RowError:
+        return None
+
+
+def read_catalog_file(path: str) -> Iterator[Product]:
+    """
+    Products from a catalog spreadsheet shaped like ingredient.xlsx.
+
+    Weights and calories such as "400g" and "968 kcal" are converted like
+    the bulk importer does; unreadable values are left empty rather than
+    dropping the product.
+    """
+    with open(path, 'rb') as stream:
+        for row in READERS[detect_format(path)](stream):
+            if isinstance(row, RowError) or not str(row.get('name') or '').strip():
+                continue
+            yield Product(
+                name=str(row['name']).strip(),
+                brand=str(row.get('brand') or '').strip() or None,
+                category=_optional(normalize_category, row.get('category')),
+                weight=_optional(parse_quantity, row.get('weight'), WEIGHT_UNITS),
+                calories=_optional(parse_quantity, row.get('calories'), ENERGY_UNITS),
+                nutrition_content=str(row.get('nutrition_content') or '').strip() or None,
+            )
+
+
+def pantry_products(limit: int) -> Iterator[Product]:
+    """
+    The `limit` most common names in everyone's pantry, with the details they were stored with.
+
+    Photo uploads store placeholder weights and calories, so only items
+    entered without a photo count towards those.
+    """
+    typed = PantryItem.image_path.is_(None)
+    query = (select(PantryItem.name, func.max(PantryItem.brand), func.max(PantryItem.category),
+                    func.avg(case((typed, PantryItem.weight))), func.avg(case((typed, PantryItem.calories))),
+                    func.max(PantryItem.nutrition_content))
+             .group_by(PantryItem.name).order_by(func.count().desc()).limit(limit))
+    with application.app_context():
+        for name, brand, category, weight, calories, nutrition_content in db.session.execute(query):
+            yield Product(name=name, brand=brand, category=category, weight=weight, calories=calories,
+                          nutrition_content=nutrition_content, source='pantry')
+
+
+def check_catalog_file(path: str):
+    """
+    Read the first product of a catalog file, so a missing file or reader
+    (openpyxl for .xlsx) stops the app at startup instead of leaving the
+    catalog silently empty.
+
+    Raises:
+        RuntimeError: If the file cannot be read.
+    """
+    try:
+        next(read_catalog_file(path), None)
+    except (OSError, ValueError, RuntimeError) as e:
+        raise RuntimeError(f'Cannot read the product catalog {path} (CATALOG_PATH): {e}') from e
+
+
+def load_products(config) -> Iterator[Product]:
+    """The catalog file's products first, then the names from pantry history."""
+    path = config['CATALOG_PATH']
+    if path:
+        try:
+            yield from read_catalog_file(path)
+        except (OSError, ValueError, RuntimeError) as e:
+            # It was readable at startup; keep serving the pantry names until it is fixed
+            logger.error('Skipping product catalog %s: %s', path, e)
+    if config['CATALOG_PANTRY_NAMES']:
+        yield from pantry_products(config['CATALOG_PANTRY_NAMES'])
+
+
+if application.config['CATALOG_PATH']:
+    check_catalog_file(application.config['CATALOG_PATH'])
+
+product_catalog = ProductCatalog(
+    lambda: load_products(application.config),
+    refresh=application.config['CATALOG_REFRESH'],
+    threshold=application.config['CATALOG_MATCH_THRESHOLD'],
+)
@@ -0,0 +1,160 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+from app import application, db
+from app.cache import LRUCache
+from app.database import begin_write
+from app.llm import Food_Management, Inventory_Management, MealPlanner, MasterChef
+from app.models import ChatSession, ChatMessage, PantryItem
+from app.summary import get_summary
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+@dataclass
+class _LiveSession:
+    session_id: int
+    summary: Optional[str]
+    turns: list[tuple[int, str, str]]  # (ChatMessage.id, role, content), oldest first
+    chef: Optional[MasterChef] = None
+    pantry: Optional[tuple] = None  # (summary version, day) of the pantry the chef was given
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def tokens(self) -> int:
+        return sum(estimate_tokens(content) for _, _, content in self.turns)
+
+    def history(self) -> list[dict]:
+        return [{'role': role, 'parts': [content]} for _, role, content in self.turns]
+
+
+def meal_planner_for(user_id: int) -> MealPlanner:
+    """Build a MealPlanner with every pantry item of a user that is not used up or out of stock selected."""
+    inventory = Inventory_Management()
+    planner = MealPlanner(inventory)
+    items = PantryItem.query.filter_by(user_id=user_id) \
+        .filter(PantryItem.used.isnot(True), PantryItem.out_of_stock.isnot(True)).order_by(PantryItem.expiration_date).all()
+    for food in Food_Management.from_pantry_items(items):
+        inventory.add_food_item(food)
+        planner.selected_ingredients.setdefault(food.type, []).append(food)
+    return planner
+
+
+class ChatSessionManager:
+    """
+    Keeps one MasterChef conversation per user.
+
+    Every turn is persisted as a ChatMessage, so sessions are restored lazily
+    from the database the first time a user chats after a restart or after
+    their idle session was evicted. Live sessions are held in an LRU cache
+    bounded by `max_sessions` and dropped after `idle_timeout` seconds without
+    a message.
+
+    The chef is given the pantry as it is when the conversation starts and
+    rebuilt whenever the user's pantry summary version (bumped on every
+    pantry write) or day changes, so replies never rely on items that have
+    since been used up. A session row is only created by the first message.
+
+    Once a history grows past `token_budget`, the oldest turns are folded into
+    a short summary carried in the system prompt, so each request resends a
+    bounded history instead of the whole conversation.
+    """
+
+    def __init__(self, max_sessions: int = 256, idle_timeout: Optional[float] = 30 * 60,
+                 token_budget: int = 4000, chef_factory=MasterChef):
+        self.token_budget = token_budget
+        self.chef_factory = chef_factory
+        self._sessions = LRUCache(maxsize=max_sessions, ttl=idle_timeout)
+        self._lock = threading.Lock()
+
+    def _session(self, user_id: int, create: bool = True) -> Optional[_LiveSession]:
+        with self._lock:
+            live = self._sessions.get(user_id)
+            if live is None:
+                record = ChatSession.query.filter_by(user_id=user_id).first()
+                if record is None:
+                    if not create:
+                        return None
+                    record = ChatSession(user_id=user_id)
+                    db.session.add(record)
+                    db.session.commit()
+                turns = [(message.id, message.role, message.content) for message in record.messages]
+                live = _LiveSession(record.id, record.summary, turns)
+                self._sessions.set(user_id, live)
+            return live
+
+    def send(self, user_id: int, message: str) -> str:
+        """Send a message in the user's conversation and return the reply."""
+        live = self._session(user_id)
+        with live.lock:
+            summary = get_summary(user_id)
+            pantry = (summary.version, summary.as_of)
+            if live.chef is None or live.pantry != pantry:
+                live.chef = self.chef_factory(meal_planner_for(user_id), history=live.history(), summary=live.summary)
+                live.pantry = pantry
+            reply = live.chef.send_message(message)
+
+            # The reply took seconds; write in a transaction of its own
+            begin_write(db.session)
+            sent = ChatMessage(session_id=live.session_id, role='user', content=message)
+            answer = ChatMessage(session_id=live.session_id, role='model', content=reply)
+            db.session.add_all([sent, answer])
+            db.session.commit()
+            live.turns += [(sent.id, 'user', message), (answer.id, 'model', reply)]
+
+            if live.tokens > self.token_budget:
+                self._compact(live)
+        # Re-inserting restarts the idle timer
+        self._sessions.set(user_id, live)
+        return reply
+
+    def _compact(self, live: _LiveSession):
+        """Fold the oldest turns into the summary until the history is half the budget."""
+        dropped = []
+        while live.tokens > self.token_budget // 2 and len(live.turns) > 2:
+            # Drop whole user/model exchanges so the history still starts with the user
+            dropped += live.turns[:2]
+            live.turns = live.turns[2:]
+
+        lines = [live.summary] if live.summary else []
+        for _, role, content in dropped:
+            speaker = 'Customer' if role == 'user' else 'Chef'
+            lines.append(f"{speaker}: {' '.join(content.split())[:160]}")
+        summary = '\n'.join(lines)
+        # Keep the most recent whole lines, at most token_budget characters: a quarter of the budget in tokens
+        if len(summary) > self.token_budget:
+            summary = summary[-self.token_budget:].split('\n', 1)[-1]
+        live.summary = summary
+
+        ChatMessage.query.filter(ChatMessage.id.in_([message_id for message_id, _, _ in dropped])) \
+            .delete(synchronize_session=False)
+        db.session.get(ChatSession, live.session_id).summary = live.summary
+        db.session.commit()
+        # The chat is rebuilt with the shorter history on the next message
+        live.chef = None
+
+    def reset(self, user_id: int):
+        """Forget a user's conversation, in memory and in the database."""
+        record = ChatSession.query.filter_by(user_id=user_id).first()
+        if record is not None:
+            ChatMessage.query.filter_by(session_id=record.id).delete()
+            record.summary = None
+            db.session.commit()
+        self._sessions.invalidate(user_id)
+
+    def history(self, user_id: int) -> list[dict]:
+        live = self._session(user_id, create=False)
+        if live is None:
+            return []
+        return [{'role': role, 'content': content} for _, role, content in live.turns]
+
+
+chat_sessions = ChatSessionManager(
+    max_sessions=application.config['CHAT_MAX_SESSIONS'],
+    idle_timeout=application.config['CHAT_IDLE_TIMEOUT'],
+    token_budget=application.config['CHAT_TOKEN_BUDGET'],
+)
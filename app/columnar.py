@@ -0,0 +1,162 @@
+from datetime import date
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+STATUSES = np.array(['Red', 'Yellow', 'Green', 'Unknown expiry status'])
+NO_EXPIRY = np.iinfo(np.int32).max
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _ordinals(values: list) -> np.ndarray:
+    """Day ordinals of dates, datetimes or 'YYYY-MM-DD' strings; NO_EXPIRY where missing."""
+    days = np.array(values, dtype='datetime64[D]')
+    ordinals = days.astype(np.int64) + EPOCH_ORDINAL
+    return np.where(np.isnat(days), NO_EXPIRY, ordinals).astype(np.int32)
+
+
+class ColumnarInventory:
+    """
+    Inventory stored as parallel NumPy columns instead of a list of objects.
+
+    Expiry and added dates are int32 day ordinals, categories are int8 codes
+    into CATEGORIES (-1 for anything else) and names and brands are indices
+    into string tables. Sorting, grouping and Red/Yellow/Green classification
+    then run as a handful of vectorized operations over the whole inventory,
+    with dates parsed once when items are added.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._size = 0
+        self.expiry = np.empty(capacity, dtype=np.int32)
+        self.added = np.empty(capacity, dtype=np.int32)
+        self.category = np.empty(capacity, dtype=np.int8)
+        self.name = np.empty(capacity, dtype=np.int32)
+        self.brand = np.empty(capacity, dtype=np.int32)
+        self.used = np.zeros(capacity, dtype=bool)
+        self.out_of_stock = np.zeros(capacity, dtype=bool)
+        self.strings: list[Optional[str]] = [None]
+        self._string_ids: dict[Optional[str], int] = {None: 0}
+        self._category_codes = {category: code for code, category in enumerate(CATEGORIES)}
+
+    def __len__(self):
+        return self._size
+
+    def _intern(self, value: Optional[str]) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self.expiry)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+        for column in ('expiry', 'added', 'category', 'name', 'brand', 'used', 'out_of_stock'):
+            old = getattr(self, column)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, column, new)
+
+    def add(self, name: str, brand: Optional[str], category: str, expiry_date, added_date=None,
+            used: bool = False, out_of_stock: bool = False):
+        self.extend([(name, brand, category, expiry_date, added_date, used, out_of_stock)])
+
+    def extend(self, rows: Iterable[tuple]):
+        """Append (name, brand, category, expiry_date, added_date, used, out_of_stock) rows."""
+        rows = list(rows)
+        self._reserve(len(rows))
+        today = date.today().toordinal()
+        start = self._size
+        end = start + len(rows)
+        self.name[start:end] = [self._intern(row[0]) for row in rows]
+        self.brand[start:end] = [self._intern(row[1]) for row in rows]
+        self.category[start:end] = [self._category_codes.get(row[2], -1) for row in rows]
+        self.expiry[start:end] = _ordinals([row[3] for row in rows])
+        added = _ordinals([row[4] for row in rows])
+        self.added[start:end] = np.where(added == NO_EXPIRY, today, added)
+        self.used[start:end] = [bool(row[5]) for row in rows]
+        self.out_of_stock[start:end] = [bool(row[6]) for row in rows]
+        self._size = end
+
+    @classmethod
+    def from_products(cls, products: Iterable[dict[str, Any]]) -> 'ColumnarInventory':
+        """Build from Gemini product dicts (name, brand, type, expiry_date)."""
+        products = list(products)
+        inventory = cls(capacity=max(len(products), 1))
+        inventory.extend((product['name'], product['brand'], product['type'], product['expiry_date'], None, False, False)
+                         for product in products)
+        return inventory
+
+    @classmethod
+    def from_pantry_items(cls, items) -> 'ColumnarInventory':
+        """Build from PantryItem rows."""
+        items = list(items)
+        inventory = cls(capacity=max(len(items), 1))
+        inventory.extend((item.name, item.brand, item.category, item.expiration_date, item.added_date,
+                          item.used, item.out_of_stock) for item in items)
+        return inventory
+
+    def days_until_expiry(self, today: Optional[date] = None) -> np.ndarray:
+        """Days left per item as int64; items without an expiry date get NO_EXPIRY."""
+        today = (today or date.today()).toordinal()
+        expiry = self.expiry[:self._size].astype(np.int64)
+        return np.where(expiry == NO_EXPIRY, NO_EXPIRY, expiry - today)
+
+    def expiry_status_codes(self, today: Optional[date] = None) -> np.ndarray:
+        """Index into STATUSES per item: 0 Red, 1 Yellow, 2 Green, 3 unknown."""
+        days_left = self.days_until_expiry(today)
+        return np.select([days_left == NO_EXPIRY, days_left < 0, days_left <= 3], [3, 0, 1], default=2).astype(np.int8)
+
+    def expiry_status(self, today: Optional[date] = None) -> np.ndarray:
+        """Status label per item, matching `Food_Management.expiry_status`."""
+        return STATUSES[self.expiry_status_codes(today)]
+
+    def status_counts(self, today: Optional[date] = None) -> dict[str, int]:
+        counts = np.bincount(self.expiry_status_codes(today), minlength=len(STATUSES))
+        return dict(zip(STATUSES.tolist(), counts.tolist()))
+
+    def sort_by_days_until_expiry(self) -> np.ndarray:
+        """Item indices ordered by expiry date, items without one last."""
+        return np.argsort(self.expiry[:self._size], kind='stable')
+
+    def sort_by_added_date(self) -> np.ndarray:
+        return np.argsort(self.added[:self._size], kind='stable')
+
+    def sort_by_category_and_expiry(self) -> dict[str, np.ndarray]:
+        """
+        Groups item indices by category, each group sorted by expiry date.
+
+        Returns:
+            Dict[str, np.ndarray]: Categories as keys and item indices as values.
+        """
+        category = self.category[:self._size]
+        order = np.lexsort((self.expiry[:self._size], category))
+        bounds = np.searchsorted(category[order], np.arange(len(CATEGORIES) + 1))
+        return {name: order[bounds[code]:bounds[code + 1]] for code, name in enumerate(CATEGORIES)}
+
+    def get_info(self, index: int) -> dict[str, Any]:
+        expiry = int(self.expiry[index])
+        return {
+            'name': self.strings[self.name[index]],
+            'brand': self.strings[self.brand[index]],
+            'type': CATEGORIES[self.category[index]] if self.category[index] >= 0 else None,
+            'expiry_date': None if expiry == NO_EXPIRY else date.fromordinal(expiry).strftime('%Y-%m-%d'),
+            'info': None,
+        }
+
+    def display_category(self, category: str) -> list[dict[str, Any]]:
+        """All items of a category as info dicts, soonest expiry first."""
+        code = self._category_codes.get(category)
+        if code is None:
+            return []
+        indices = np.flatnonzero(self.category[:self._size] == code)
+        indices = indices[np.argsort(self.expiry[indices], kind='stable')]
+        return [self.get_info(index) for index in indices]
+
+    def display_inventory(self) -> list[dict[str, Any]]:
+        return [self.get_info(index) for index in range(self._size)]
@@ -0,0 +1,131 @@
+import os
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session
+
+
+def database_url(url: str) -> str:
+    """
+    Normalise a DATABASE_URL for SQLAlchemy.
+
+    Hosting platforms hand out Postgres URLs as `postgres://`, a scheme
+    SQLAlchemy no longer accepts; it is rewritten to `postgresql://`.
+    """
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def _is_sqlite_file(url: str) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(url: str, config) -> dict[str, Any]:
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+
+    Every server thread, analysis worker and the notifier take a pooled
+    connection, so the pool is sized by DATABASE_POOL_SIZE and
+    DATABASE_MAX_OVERFLOW for SQLite files and server databases alike.
+    SQLite connections may be used from any pool thread and wait up to
+    SQLITE_BUSY_TIMEOUT seconds for a lock instead of failing with
+    "database is locked". Server connections are checked before use and
+    recycled, since the server may drop idle ones.
+
+    Args:
+        url (str): The normalised database URL.
+        config: The application config.
+
+    Returns:
+        Dict: Keyword arguments for `create_engine`.
+    """
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite' and not _is_sqlite_file(url):
+        return {}  # in-memory: Flask-SQLAlchemy shares one connection
+    options = {
+        'pool_size': config['DATABASE_POOL_SIZE'],
+        'max_overflow': config['DATABASE_MAX_OVERFLOW'],
+        'pool_timeout': config['DATABASE_POOL_TIMEOUT'],
+    }
+    if backend == 'sqlite':
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT'], 'check_same_thread': False}
+    else:
+        options.update(pool_pre_ping=True, pool_recycle=config['DATABASE_POOL_RECYCLE'])
+    return options
+
+
+def sqlite_pragmas(config) -> dict[str, Any]:
+    """
+    PRAGMAs run on every new SQLite connection.
+
+    WAL lets readers carry on while a single writer commits, and with
+    synchronous=NORMAL a commit only appends to the log instead of syncing
+    the database file (a power cut can lose the last commits, but never
+    corrupts the file). cache_size is per connection, in KiB when negative.
+    """
+    return {
+        'journal_mode': 'WAL' if config['SQLITE_WAL'] else 'DELETE',
+        'synchronous': config['SQLITE_SYNCHRONOUS'],
+        'cache_size': -config['SQLITE_CACHE_SIZE_MB'] * 1024,
+        'mmap_size': config['SQLITE_MMAP_SIZE_MB'] * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': int(config['SQLITE_BUSY_TIMEOUT'] * 1000),
+    }
+
+
+def configure_engine(engine: Engine, config):
+    """
+    Install the SQLite PRAGMAs and make the pool safe to inherit across fork().
+
+    On SQLite, transactions of connections carrying the `sqlite_immediate`
+    execution option (see `begin_write`) begin with BEGIN IMMEDIATE: pysqlite
+    is switched to isolation_level=None for them, so it does not open a
+    deferred transaction of its own. Other transactions keep pysqlite's
+    implicit BEGIN before the first write, so reads see the latest commits.
+    """
+    if engine.dialect.name == 'sqlite' and _is_sqlite_file(str(engine.url)):
+        pragmas = sqlite_pragmas(config)
+
+        @event.listens_for(engine, 'connect')
+        def _set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+            cursor.close()
+
+        @event.listens_for(engine, 'begin')
+        def _begin(connection):
+            immediate = connection.get_execution_options().get('sqlite_immediate', False)
+            # No transaction is open yet, so switching modes commits nothing
+            connection.connection.dbapi_connection.isolation_level = None if immediate else ''
+            if immediate:
+                connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+    # Pre-fork servers (gunicorn --preload) must not share the parent's connections
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+def begin_write(session: Session):
+    """
+    End the session's transaction and begin one that writes.
+
+    pysqlite begins a deferred transaction only at the first write, so what
+    a writer reads before it may change underneath, and a transaction that
+    did read inside it cannot take the write lock once another connection
+    has committed: SQLite fails at once with "database is locked" instead
+    of waiting out the busy timeout. Writers that read first, or that wait
+    on something slow such as a model call, call this just before they
+    write. The new transaction begins with BEGIN IMMEDIATE, so it waits for
+    the lock up front and holds it until the commit. The old transaction is
+    committed, with any pending changes. On other databases only the commit
+    happens.
+
+    Args:
+        session (Session): The session about to write.
+    """
+    session.commit()
+    session.connection(execution_options={'sqlite_immediate': True})
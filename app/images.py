@@ -0,0 +1,122 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import PIL.Image
+import PIL.ImageOps
+
+from app import application
+
+
+def _fit(img: PIL.Image.Image, max_size: int) -> PIL.Image.Image:
+    """A copy of `img` scaled down to fit in a `max_size` square (never scaled up)."""
+    img = img.copy()
+    img.thumbnail((max_size, max_size))
+    return img
+
+
+def model_input(img: PIL.Image.Image, max_size: int) -> PIL.Image.Image:
+    """Orient and downscale an already opened image for the model."""
+    img = PIL.ImageOps.exif_transpose(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    return _fit(img, max_size)
+
+
+def preprocess_image(source: str, directory: str, stem: str, model_size: int, display_size: int,
+                     thumbnail_size: int, quality: int) -> dict:
+    """
+    Decode an uploaded photo once and derive every variant from it.
+
+    The upload is read from disk, so only its path crosses over to the
+    worker process.
+
+    JPEGs are decoded straight at the smallest DCT scale that still covers
+    the display variant, the image is rotated according to its EXIF orientation
+    and each variant is resized from the previous, larger one. The display
+    and thumbnail variants are written next to each other; the model input
+    is returned as JPEG bytes so it never touches the disk.
+
+    Args:
+        source (str): Path of the uploaded file.
+        directory (str): Where to write `{stem}.jpg` and `{stem}_thumb.jpg`.
+        stem (str): File name without extension.
+        model_size, display_size, thumbnail_size (int): Longest side of each variant.
+        quality (int): JPEG quality of the written variants.
+
+    Returns:
+        Dict: `display` and `thumbnail` paths and the `model` JPEG bytes.
+    """
+    with PIL.Image.open(source) as original:
+        scale = min(display_size / max(original.size), 1)
+        original.draft('RGB', (int(original.width * scale), int(original.height * scale)))
+        img = PIL.ImageOps.exif_transpose(original)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+    display = _fit(img, display_size)
+    model = _fit(display, model_size)
+    thumbnail = _fit(model, thumbnail_size)
+
+    display_path = os.path.join(directory, f'{stem}.jpg').replace('\\', '/')
+    thumbnail_path = os.path.join(directory, f'{stem}_thumb.jpg').replace('\\', '/')
+    display.save(display_path, 'JPEG', quality=quality, optimize=True)
+    thumbnail.save(thumbnail_path, 'JPEG', quality=quality, optimize=True)
+
+    buffer = io.BytesIO()
+    model.save(buffer, 'JPEG', quality=quality)
+    return {'display': display_path, 'thumbnail': thumbnail_path, 'model': buffer.getvalue()}
+
+
+class ImagePipeline:
+    """
+    Runs `preprocess_image` in a pool of worker processes.
+
+    Decoding and resizing phone photos is CPU bound and PIL holds the GIL for
+    much of it, so doing it on request threads would stall every other
+    request. With `workers` set to 0 the work runs inline instead.
+    """
+
+    def __init__(self, workers=2, model_size=1024, display_size=1600, thumbnail_size=320, quality=85):
+        self.workers = workers
+        self.model_size = model_size
+        self.display_size = display_size
+        self.thumbnail_size = thumbnail_size
+        self.quality = quality
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def process(self, source: str, directory: str, stem: str) -> dict:
+        """Preprocess one upload saved at `source`; see `preprocess_image` for the result."""
+        args = (source, directory, stem, self.model_size, self.display_size, self.thumbnail_size, self.quality)
+        if self.workers <= 0:
+            return preprocess_image(*args)
+        return self.pool.submit(preprocess_image, *args).result()
+
+    def process_many(self, uploads: list[tuple[str, str]], directory: str) -> list[dict]:
+        """Preprocess several (source, stem) uploads in parallel, in order."""
+        if self.workers <= 0:
+            return [self.process(source, directory, stem) for source, stem in uploads]
+        futures = [self.pool.submit(preprocess_image, source, directory, stem, self.model_size, self.display_size,
+                                    self.thumbnail_size, self.quality) for source, stem in uploads]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+image_pipeline = ImagePipeline(
+    workers=application.config['IMAGE_WORKERS'],
+    model_size=application.config['IMAGE_MODEL_SIZE'],
+    display_size=application.config['IMAGE_DISPLAY_SIZE'],
+    thumbnail_size=application.config['IMAGE_THUMBNAIL_SIZE'],
+    quality=application.config['IMAGE_QUALITY'],
+)
@@ -0,0 +1,248 @@
+import logging
+from datetime import date, datetime, time
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import click
+from sqlalchemy import event, exists, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import application, db
+from app.models import Ingredient, PantryItem, Recipe, RecipeIngredient, RecipeStep
+from app.search import tokenize
+
+logger = logging.getLogger(__name__)
+
+ingredient_table = Ingredient.__table__
+recipe_table = Recipe.__table__
+line_table = RecipeIngredient.__table__
+step_table = RecipeStep.__table__
+
+# Quantities and preparation words that say nothing about what the ingredient is
+UNITS = {
+    'g', 'gram', 'kg', 'mg', 'ml', 'l', 'litre', 'liter', 'oz', 'ounce', 'lb', 'pound', 'cup', 'tbsp',
+    'tablespoon', 'tsp', 'teaspoon', 'pinch', 'dash', 'handful', 'clove', 'slice', 'piece', 'can', 'tin',
+    'pack', 'packet', 'bunch', 'sprig', 'stalk', 'head', 'inch', 'cm',
+}
+DESCRIPTORS = {
+    'a', 'an', 'and', 'or', 'of', 'the', 'to', 'for', 'with', 'into', 'about', 'taste', 'optional', 'needed',
+    'fresh', 'freshly', 'organic', 'frozen', 'large', 'medium', 'small', 'whole', 'premium', 'plain',
+    'chopped', 'diced', 'sliced', 'minced', 'grated', 'shredded', 'crushed', 'peeled', 'cooked', 'uncooked',
+    'boneless', 'skinless', 'finely', 'roughly', 'thinly', 'cut', 'cubed', 'halved', 'beaten', 'softened',
+    'melted', 'divided', 'rinsed', 'drained', 'trimmed', 'garnish', 'serve', 'serving', 'extra',
+}
+# Assumed to be in every kitchen, so recipes are not penalised for them
+STAPLES = {'salt', 'pepper', 'water', 'oil', 'sugar', 'ice', 'black', 'white', 'ground', 'vegetable', 'cooking'}
+
+
+def singular(word: str) -> str:
+    """Crude English singular, enough for ingredient names: "tomatoes" -> "tomato", "berries" -> "berry"."""
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+@lru_cache(maxsize=65536)  # the same lines ("2 cloves garlic") recur across recipes
+def ingredient_words(text) -> tuple[str, ...]:
+    """
+    The words naming an ingredient or pantry item, in order, without quantities,
+    units and preparation: "200g Fresh Chicken Breasts, diced" -> ("chicken", "breast").
+
+    Returns an empty tuple for staples like "salt and pepper to taste".
+    """
+    words = []
+    for word in tokenize(text):
+        if any(char.isdigit() for char in word):
+            continue
+        word = singular(word)
+        if word not in UNITS and word not in DESCRIPTORS and word not in words:
+            words.append(word)
+    if all(word in STAPLES for word in words):
+        return ()
+    return tuple(words)
+
+
+
+def ingredient_name(line) -> Optional[str]:
+    """The `Ingredient.name` a recipe line refers to, or None for staples and lines naming nothing."""
+    return ' '.join(ingredient_words(line))[:128].strip() or None
+
+
+def _insert_missing(connection):
+    # Another request may create the same ingredient between our select and insert
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert(ingredient_table).on_conflict_do_nothing(index_elements=['name'])
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(ingredient_table).on_conflict_do_nothing(index_elements=['name'])
+    return insert(ingredient_table)
+
+
+def ingredient_ids(connection, names: Iterable[str]) -> dict[str, int]:
+    """
+    Ids of the Ingredient rows with these names, creating the missing ones.
+
+    Args:
+        connection: Connection of the transaction the rows are written in.
+        names (Iterable[str]): Normalised names, as from `ingredient_name()`.
+
+    Returns:
+        Dict[str, int]: Id per name.
+    """
+    names = set(names)
+    if not names:
+        return {}
+    query = select(ingredient_table.c.name, ingredient_table.c.id).where(ingredient_table.c.name.in_(names))
+    ids = dict(connection.execute(query).all())
+    missing = names - ids.keys()
+    if missing:
+        connection.execute(_insert_missing(connection), [{'name': name} for name in sorted(missing)])
+        ids.update(connection.execute(query.where(ingredient_table.c.name.in_(missing))).all())
+    return ids
+
+
+@event.listens_for(Session, 'before_flush')
+def _link_ingredients(session, flush_context, instances):
+    """Point the recipe lines about to be inserted at their Ingredient rows."""
+    lines = [target for target in session.new
+             if isinstance(target, RecipeIngredient) and target.ingredient_id is None and target.ingredient is None]
+    names = {line: ingredient_name(line.text) for line in lines}
+    if not any(names.values()):
+        return
+    ids = ingredient_ids(session.connection(), filter(None, names.values()))
+    for line, name in names.items():
+        if name:
+            line.ingredient_id = ids[name]
+
+
+def structured_rows(recipe_id: int, ingredients: str, steps: str, ids: dict[str, int]) -> tuple[list[dict], list[dict]]:
+    """RecipeIngredient and RecipeStep values for a recipe stored as text only."""
+    lines = [{'recipe_id': recipe_id, 'position': position, 'text': line, 'ingredient_id': ids.get(ingredient_name(line))}
+             for position, line in enumerate(Recipe.split_ingredients(ingredients))]
+    steps = [{'recipe_id': recipe_id, 'position': position, 'text': step}
+             for position, step in enumerate(Recipe.split_steps(steps))]
+    return lines, steps
+
+
+def backfill_recipes(batch_size: int = 500) -> int:
+    """
+    Split the recipes saved as text only into RecipeIngredient and RecipeStep rows.
+
+    Recipes are taken in id order, `batch_size` per transaction, so the
+    job can be stopped and rerun; recipes that already have rows are
+    skipped. Only the new tables are written; the text columns, and the
+    search index built from them, stay as they are.
+
+    Returns:
+        int: Number of recipes backfilled.
+    """
+    has_rows = exists().where(line_table.c.recipe_id == recipe_table.c.id) \
+        | exists().where(step_table.c.recipe_id == recipe_table.c.id)
+    done, last_id = 0, 0
+    while True:
+        with db.engine.begin() as connection:
+            recipes = connection.execute(
+                select(recipe_table.c.id, recipe_table.c.ingredients, recipe_table.c.steps)
+                .where(recipe_table.c.id > last_id, ~has_rows).order_by(recipe_table.c.id).limit(batch_size)).all()
+            if not recipes:
+                return done
+            ids = ingredient_ids(connection, filter(None, (
+                ingredient_name(line) for recipe in recipes for line in Recipe.split_ingredients(recipe.ingredients))))
+            lines, steps = [], []
+            for recipe in recipes:
+                recipe_lines, recipe_steps = structured_rows(recipe.id, recipe.ingredients, recipe.steps, ids)
+                lines += recipe_lines
+                steps += recipe_steps
+            if lines:
+                connection.execute(insert(line_table), lines)
+            if steps:
+                connection.execute(insert(step_table), steps)
+        last_id = recipes[-1].id
+        done += len(recipes)
+        logger.info('Backfilled %d recipes (up to id %d)', done, last_id)
+
+
+def recipes_using(name: str, user_id: Optional[int] = None):
+    """
+    Query of the recipes with a line naming the ingredient, newest first.
+
+    An indexed join through RecipeIngredient on the normalised name, so
+    "Milk" finds the recipes listing "2 cups fresh milk".
+
+    Args:
+        name (str): Ingredient as typed.
+        user_id (int, optional): Only the recipes this user generated.
+    """
+    ingredient_id = select(ingredient_table.c.id).where(ingredient_table.c.name == ingredient_name(name)) \
+        .scalar_subquery()
+    query = select(Recipe).where(Recipe.id.in_(
+        select(line_table.c.recipe_id).where(line_table.c.ingredient_id == ingredient_id)))
+    if user_id is not None:
+        query = query.where(Recipe.user_id == user_id)
+    return query.order_by(Recipe.id.desc())
+
+
+def pantry_ingredient_names(names: Iterable[str], max_words: int = 6) -> set[str]:
+    """
+    `Ingredient.name`s that pantry items with these names stand in for: every
+    run of words of the normalised name, so "Chicken Breast Fillet" covers
+    "chicken breast fillet", "chicken breast", "chicken" and so on.
+    """
+    covered = set()
+    for name in names:
+        words = ingredient_words(name)[:max_words]
+        for start in range(len(words)):
+            for end in range(start + 1, len(words) + 1):
+                covered.add(' '.join(words[start:end])[:128])
+    return covered
+
+
+def recipes_cookable(user_id: int, max_missing: int = 0, mine: bool = False, today: Optional[date] = None):
+    """
+    Query of (Recipe, missing) rows for the recipes a user's pantry covers.
+
+    A recipe's Ingredient counts as covered when it is named by an item the
+    user has in stock and not expired (see `pantry_ingredient_names()`), the
+    rule `RecipeMatcher` ranks by too; staples have no Ingredient and never
+    count. Candidates come from the
+    (ingredient_id, recipe_id) index for the covered ingredients, and each
+    one's line count from the (recipe_id, position) index, so the query
+    never scans every recipe. Recipes saved before the ingredient tables
+    existed need `flask backfill-recipes` first.
+
+    Args:
+        user_id (int): Whose pantry to cook from.
+        max_missing (int): Most named ingredients a recipe may lack; 0 for "cook now".
+        mine (bool): Only the recipes this user generated.
+        today (date): Day before which items count as expired, today by default.
+
+    Returns:
+        Select: (Recipe, missing) rows, fewest missing first, then newest.
+    """
+    today = today or date.today()
+    names = db.session.execute(select(PantryItem.name).where(
+        PantryItem.user_id == user_id, PantryItem.used.isnot(True), PantryItem.out_of_stock.isnot(True),
+        PantryItem.expiration_date >= datetime.combine(today, time.min))).scalars()
+    ingredient_ids = select(ingredient_table.c.id).where(ingredient_table.c.name.in_(pantry_ingredient_names(names)))
+    covered = select(line_table.c.recipe_id, func.count(line_table.c.ingredient_id.distinct()).label('covered')) \
+        .where(line_table.c.ingredient_id.in_(ingredient_ids)).group_by(line_table.c.recipe_id).subquery()
+    total = select(func.count(line_table.c.ingredient_id.distinct())).select_from(line_table).where(
+        line_table.c.recipe_id == covered.c.recipe_id, line_table.c.ingredient_id.isnot(None)).scalar_subquery()
+    missing = (total - covered.c.covered).label('missing')
+    query = select(Recipe, missing).join(covered, Recipe.id == covered.c.recipe_id).where(missing <= max_missing)
+    if mine:
+        query = query.where(Recipe.user_id == user_id)
+    return query.order_by(missing, Recipe.id.desc())
+
+
+@application.cli.command('backfill-recipes')
+@click.option('--batch-size', default=500, show_default=True, help='Recipes per transaction.')
+def backfill_recipes_command(batch_size):
+    """Split recipes saved before the ingredient tables existed into ingredient and step rows."""
+    print(f"Backfilled {backfill_recipes(batch_size)} recipes.")
@@ -0,0 +1,306 @@
+import atexit
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import application
+from app.llm_client import LatencyHistogram, llm_client
+from app.middleware import InstrumentationMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with `extra=` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(level: str) -> logging.handlers.QueueListener:
+    """
+    Add a JSON handler to the root logger that writes through a queue on a background thread.
+
+    Request threads only enqueue the record; formatting and the write to
+    stderr happen on the listener thread, so a slow terminal or log
+    collector never blocks a request. Handlers already installed (the
+    server's, pytest's) are left in place.
+    """
+    records = queue.SimpleQueue()
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter())
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+@dataclass
+class RequestStats:
+    method: str
+    endpoint: str = 'unmatched'
+    started: float = 0.0
+    sql_queries: int = 0
+    sql_seconds: float = 0.0
+    model_seconds: float = 0.0
+    profile: Optional[cProfile.Profile] = None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar('request_stats', default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    """Stats of the request being handled, or None outside a request (e.g. job workers)."""
+    return _current.get()
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, labels)} {value:g}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) + ((float('inf'),) if buckets[-1] != float('inf') else ())
+        self.values: dict[tuple, tuple[list[int], list[float]]] = {}  # labels -> (bucket counts, [sum])
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self._lock:
+            counts, total = self.values.setdefault(labels, ([0] * len(self.buckets), [0.0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((labels, list(counts), total[0]) for labels, (counts, total) in self.values.items())
+        for labels, counts, total in values:
+            lines.extend(_histogram_lines(self.name, self.labels, labels, self.buckets, counts, total))
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names: tuple, values: tuple, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _histogram_lines(name, label_names, labels, buckets, counts, total) -> list[str]:
+    lines = []
+    cumulative = 0
+    for bound, count in zip(buckets, counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else f'{bound:g}'
+        lines.append(f'{name}_bucket{_labels(label_names, labels, le=le)} {cumulative}')
+    lines.append(f'{name}_sum{_labels(label_names, labels)} {total:g}')
+    lines.append(f'{name}_count{_labels(label_names, labels)} {cumulative}')
+    return lines
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status.', ('method', 'endpoint', 'status'))
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Wall time per request, including streaming the body.',
+                            ('method', 'endpoint'), LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram('http_response_size_bytes', 'Response body size.', ('method', 'endpoint'), SIZE_BUCKETS)
+REQUEST_QUERIES = Histogram('http_request_db_queries', 'SQL statements executed per request.',
+                            ('method', 'endpoint'), QUERY_BUCKETS)
+REQUEST_SQL_SECONDS = Counter('http_request_db_seconds_total', 'Time spent in SQL statements by requests.',
+                              ('method', 'endpoint'))
+REQUEST_MODEL_SECONDS = Counter('http_request_model_seconds_total', 'Time spent in model calls by requests.',
+                                ('method', 'endpoint'))
+SLOW_PROFILES = Counter('http_slow_request_profiles_total', 'Profiles saved for slow requests.', ('endpoint',))
+REQUEST_METRICS = (REQUESTS, REQUEST_SECONDS, RESPONSE_BYTES, REQUEST_QUERIES, REQUEST_SQL_SECONDS,
+                   REQUEST_MODEL_SECONDS, SLOW_PROFILES)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in REQUEST_METRICS:
+        lines.extend(metric.render())
+
+    stats = llm_client.stats()
+    lines += ['# HELP model_call_duration_seconds Model calls through the shared client, including retries.',
+              '# TYPE model_call_duration_seconds histogram']
+    for operation, histogram in sorted(dict(llm_client.latency).items()):
+        lines.extend(_histogram_lines('model_call_duration_seconds', ('operation',), (operation,),
+                                      LatencyHistogram.BUCKETS, list(histogram.counts), histogram.total))
+    lines += ['# HELP model_call_events_total Model call outcomes by operation.',
+              '# TYPE model_call_events_total counter']
+    for operation, counters in sorted(stats['operations'].items()):
+        for outcome in ('calls', 'errors', 'retries', 'timeouts'):
+            if outcome in counters:
+                lines.append(f'model_call_events_total{_labels(("operation", "event"), (operation, outcome))} '
+                             f'{counters[outcome]}')
+    lines += ['# HELP model_circuit_open Whether the model circuit breaker is rejecting calls.',
+              '# TYPE model_circuit_open gauge',
+              f"model_circuit_open {int(stats['breaker']['state'] == 'open')}"]
+    return '\n'.join(lines) + '\n'
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in cProfile sampling of slow requests.
+
+    A `sample_rate` fraction of requests runs under cProfile, one at a time
+    so concurrent requests do not fight over the profiler. The profile is
+    written to `directory` only if the request took longer than `threshold`
+    seconds, and discarded otherwise.
+    """
+
+    def __init__(self, enabled=False, threshold=1.0, sample_rate=0.1, directory='profiles'):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self.enabled or random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: cProfile.Profile, stats: RequestStats, seconds: float):
+        profile.disable()
+        self._lock.release()
+        if seconds < self.threshold:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        slug = stats.endpoint.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+        path = os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{stats.method}-{slug}.prof")
+        profile.dump_stats(path)
+        SLOW_PROFILES.inc((stats.endpoint,))
+        logger.warning('Slow request profiled', extra={'endpoint': stats.endpoint, 'method': stats.method,
+                                                       'seconds': round(seconds, 3), 'profile': path})
+
+
+class RequestRecorder:
+    """Recorder for InstrumentationMiddleware that feeds the request metrics."""
+
+    def __init__(self, profiler: SlowRequestProfiler):
+        self.profiler = profiler
+
+    def start(self, environ) -> tuple[RequestStats, object]:
+        stats = RequestStats(method=environ.get('REQUEST_METHOD', 'GET'), started=time.perf_counter())
+        token = _current.set(stats)
+        stats.profile = self.profiler.start()
+        return stats, token
+
+    def finish(self, context, status: str, size: int):
+        stats, token = context
+        seconds = time.perf_counter() - stats.started
+        if stats.profile is not None:
+            self.profiler.finish(stats.profile, stats, seconds)
+        labels = (stats.method, stats.endpoint)
+        REQUESTS.inc((stats.method, stats.endpoint, status))
+        REQUEST_SECONDS.observe(labels, seconds)
+        RESPONSE_BYTES.observe(labels, size)
+        REQUEST_QUERIES.observe(labels, stats.sql_queries)
+        REQUEST_SQL_SECONDS.inc(labels, stats.sql_seconds)
+        REQUEST_MODEL_SECONDS.inc(labels, stats.model_seconds)
+        try:
+            _current.reset(token)
+        except ValueError:
+            # Finished from a different context than it started in (e.g. a streamed body)
+            _current.set(None)
+
+
+@application.before_request
+def _label_request():
+    stats = current_request_stats()
+    if stats is not None and request.url_rule is not None:
+        stats.endpoint = request.url_rule.rule
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    stats = current_request_stats()
+    if stats is not None and started is not None:
+        stats.sql_queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def _record_model_time(operation: str, seconds: float):
+    stats = current_request_stats()
+    if stats is not None:
+        stats.model_seconds += seconds
+
+
+llm_client.listeners.append(_record_model_time)
+
+if application.config['LOG_JSON']:
+    setup_logging(application.config['LOG_LEVEL'])
+
+profiler = SlowRequestProfiler(
+    enabled=application.config['PROFILE_SLOW_REQUESTS'],
+    threshold=application.config['PROFILE_THRESHOLD'],
+    sample_rate=application.config['PROFILE_SAMPLE_RATE'],
+    directory=application.config['PROFILE_DIR'],
+)
+application.wsgi_app = InstrumentationMiddleware(application.wsgi_app, RequestRecorder(profiler))
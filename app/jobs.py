@@ -0,0 +1,386 @@
+import io
+import json
+import logging
+import os
+import queue
+import secrets
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+import PIL.Image
+from sqlalchemy import and_, or_
+from werkzeug.utils import secure_filename
+
+from app import application, db
+from app.catalog import product_catalog
+from app.database import begin_write
+from app.images import image_pipeline, model_input
+from app.models import AnalysisJob, PantryItem, FoodImage
+from app.notifications import notifier
+from app.search import search_index
+from app.summary import rebuild_summary
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """
+    In-process pool of worker threads that run image analysis jobs.
+
+    Job state lives in the `analysis_job` table, so queued jobs survive a
+    restart. A worker claims a job by leasing it to its process for `lease`
+    seconds, and a heartbeat thread renews the leases of the jobs the
+    process is running. Several processes can share the table: each one
+    runs the queued jobs and takes over running jobs whose lease ran out,
+    which only happens when the process holding them died.
+    """
+
+    def __init__(self, app, analyze=None, analyze_batch=None, workers=2, lease=120):
+        self.app = app
+        self._analyze = analyze
+        self._analyze_batch = analyze_batch
+        self.workers = workers
+        self.lease = lease
+        self._queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._images: dict[int, Any] = {}  # preprocessed model input per job, while it is queued
+        self._running: set[int] = set()  # jobs this process holds the lease of
+        self._enqueued: set[int] = set()  # jobs waiting in `_queue`, so each is queued once
+        self._lock = threading.RLock()
+
+    @property
+    def owner(self) -> str:
+        """Claim marker of this process; read on every claim since pre-fork servers change the pid."""
+        return f'{socket.gethostname()}:{os.getpid()}'[:64]
+
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(AnalysisJob.status == 'queued',
+                   and_(AnalysisJob.status == 'running',
+                        or_(AnalysisJob.lease_expires_at.is_(None), AnalysisJob.lease_expires_at < now)))
+
+    @property
+    def analyze(self):
+        """The model call used by the workers, the cached `get_information_products` unless overridden."""
+        if self._analyze is None:
+            from app.cache import cached_information_products
+            return cached_information_products
+        return self._analyze
+
+    @analyze.setter
+    def analyze(self, func):
+        self._analyze = func
+
+    @property
+    def analyze_batch(self):
+        """The multi-image model call used for batch jobs, `get_information_products_batch` unless overridden."""
+        if self._analyze_batch is None:
+            from app.llm import get_information_products_batch
+            return get_information_products_batch
+        return self._analyze_batch
+
+    @analyze_batch.setter
+    def analyze_batch(self, func):
+        self._analyze_batch = func
+
+    def start(self):
+        """Start the worker and heartbeat threads and pick up unfinished jobs (idempotent)."""
+        with self._lock:
+            if self._threads or self.workers <= 0:
+                return
+            for job_id in self._pending():
+                self._enqueue(job_id)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'analysis-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='analysis-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _pending(self) -> list[int]:
+        """Queued jobs, and running ones whose process stopped renewing their lease."""
+        with self.app.app_context():
+            return [job_id for (job_id,) in db.session.query(AnalysisJob.id)
+                    .filter(self._claimable(datetime.utcnow())).order_by(AnalysisJob.id)]
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                with self.app.app_context():
+                    if self._running:
+                        AnalysisJob.query.filter(AnalysisJob.id.in_(list(self._running)),
+                                                 AnalysisJob.claimed_by == self.owner) \
+                            .update({'lease_expires_at': datetime.utcnow() + timedelta(seconds=self.lease)},
+                                    synchronize_session=False)
+                        db.session.commit()
+                for job_id in self._pending():
+                    self._enqueue(job_id)  # run() claims atomically, so jobs another process takes are skipped
+            except Exception:
+                logger.exception('Renewing analysis job leases failed')
+
+    def _enqueue(self, job_id: int):
+        """Hand a job to the workers unless it is already waiting for one."""
+        with self._lock:
+            if job_id in self._enqueued:
+                return
+            self._enqueued.add(job_id)
+        self._queue.put(job_id)
+
+    def submit(self, user_id: int, payload: dict, image: Optional[Any] = None) -> AnalysisJob:
+        """
+        Persist a new job and hand it to the workers; returns the queued job.
+
+        `image` is the already downscaled model input (a list of them for a
+        batch job). It is only kept in memory, so a job recovered after a
+        restart reads the display files named in the payload instead.
+        """
+        job = AnalysisJob(user_id=user_id, status='queued', payload=json.dumps(payload))
+        db.session.add(job)
+        db.session.commit()
+        if image is not None:
+            self._images[job.id] = image
+        if self.workers <= 0:
+            self.run(job.id)
+        else:
+            # start() may already have recovered this job from the table
+            self.start()
+            self._enqueue(job.id)
+        return job
+
+    def join(self):
+        """Block until every enqueued job has been processed."""
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                self._enqueued.discard(job_id)
+            try:
+                with self.app.app_context():
+                    self.run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def run(self, job_id: int):
+        """Claim a job, run it and record its outcome; does nothing if another worker has it."""
+        image = self._images.pop(job_id, None)
+        now = datetime.utcnow()
+        claimed = AnalysisJob.query.filter(AnalysisJob.id == job_id, self._claimable(now)) \
+            .update({'status': 'running', 'claimed_by': self.owner,
+                     'lease_expires_at': now + timedelta(seconds=self.lease)}, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            return
+        self._running.add(job_id)
+        try:
+            job = db.session.get(AnalysisJob, job_id)
+            try:
+                payload = json.loads(job.payload)
+                if 'images' in payload:
+                    item_ids = analyse_batch(job.user_id, payload, self.analyze_batch, image)
+                else:
+                    item_ids = analyse_upload(job.user_id, payload, self.analyze, image, job_id=job_id)
+            except Exception as e:
+                db.session.rollback()
+                job = db.session.get(AnalysisJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+            else:
+                job.status = 'done'
+                job.result = json.dumps(item_ids)
+            job.lease_expires_at = None
+            db.session.commit()
+        finally:
+            self._running.discard(job_id)
+
+
+def _static_url(path: str) -> str:
+    """URL of a file saved under app/static."""
+    if path.startswith("food"):
+        path = path[4:]
+    if path.startswith('app'):
+        path = path[3:]
+    return path
+
+
+def catalog_details(product: dict) -> dict:
+    """
+    Pantry item details for a recognised product, completed from the product catalog.
+
+    The model reads a name, brand and category off the label but no
+    package size; when the name matches a catalog product its weight and
+    calories are used, otherwise the usual placeholders.
+    """
+    details = product_catalog.fill_details({
+        'name': product['name'],
+        'brand': product.get('brand'),
+        'category': product.get('type'),
+        'weight': None,
+        'calories': None,
+        'nutrition_content': product.get('nutrition_content'),
+    })
+    if details['weight'] is None:
+        details['weight'] = 120.0
+    if details['calories'] is None:
+        details['calories'] = 520.0
+    return details
+
+
+def analyse_upload(user_id: int, payload: dict, analyze, image: Optional[bytes] = None,
+                   job_id: Optional[int] = None) -> list[int]:
+    """
+    Run the model on an uploaded image and store the recognised product.
+
+    Args:
+        user_id (int): Owner of the new pantry item.
+        payload (dict): Job payload with the `filepath` of the display variant and its `thumbnail`.
+        analyze (Callable): Model call taking a PIL image and returning the product dict.
+        image (bytes, optional): Preprocessed model input; rebuilt from `filepath` when missing.
+        job_id (int, optional): Id of the job, kept in the stored file names so that two photos
+            of the same product do not overwrite each other.
+
+    Returns:
+        List[int]: Ids of the created PantryItem rows.
+    """
+    filepath = payload['filepath']
+    thumbnail = payload.get('thumbnail')
+    if image is not None:
+        img = PIL.Image.open(io.BytesIO(image))
+    else:
+        img = model_input(PIL.Image.open(filepath), image_pipeline.model_size)
+
+    product_info = analyze(img)
+    if product_info is None or not product_info.get('name') or product_info.get('expiry_date') is None:
+        raise ValueError('Product information not found. Please try again.')
+
+    try:
+        product_info['expiry_date'] = datetime.strptime(product_info['expiry_date'], '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f"Unreadable expiry date: {product_info['expiry_date']}")
+
+    # Name the stored variants after the product; they are already JPEGs, so no re-encoding
+    stem = secure_filename(product_info.get('name') or '') or 'product'
+    stem = f"{stem}_{job_id}" if job_id is not None else f"{stem}_{secrets.token_hex(4)}"
+    renamed = [(filepath, os.path.join(os.path.dirname(filepath), f"{stem}.jpg").replace('\\', '/'))]
+    if thumbnail and os.path.exists(thumbnail):
+        renamed.append((thumbnail, os.path.join(os.path.dirname(thumbnail), f"{stem}_thumb.jpg").replace('\\', '/')))
+    new_filepath = renamed[0][1]
+    thumbnail_url = _static_url(renamed[1][1]) if len(renamed) > 1 else None
+
+    # The model call took seconds; take the write lock before storing the item
+    begin_write(db.session)
+    moved = []
+    try:
+        for old, new in renamed:
+            os.replace(old, new)
+            moved.append((old, new))
+        details = catalog_details(product_info)
+        new_item = PantryItem(
+            used=False,
+            out_of_stock=False,
+            expiration_date=product_info['expiry_date'],
+            image_path=new_filepath,
+            user_id=user_id,
+            **details
+        )
+        db.session.add(new_item)
+        db.session.flush()
+
+        db.session.add(FoodImage(image_url=_static_url(new_filepath), thumbnail_url=thumbnail_url,
+                                 pantry_item_id=new_item.id))
+        db.session.commit()
+    except BaseException:
+        # Put the files back where the payload names them, so a retry finds them
+        for old, new in reversed(moved):
+            os.replace(new, old)
+        raise
+    return [new_item.id]
+
+
+def _batch_product(product: dict) -> Optional[dict]:
+    """A recognised product with a parsed expiry date, or None if it cannot be stored."""
+    if not product.get('name') or not product.get('expiry_date'):
+        return None
+    try:
+        expiry_date = datetime.strptime(product['expiry_date'], '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return {**product, 'expiry_date': expiry_date}
+
+
+def analyse_batch(user_id: int, payload: dict, analyze_batch, images: Optional[list[bytes]] = None) -> list[int]:
+    """
+    Run the model over a batch of uploaded images and store every recognised product.
+
+    Images are sent `BATCH_INTAKE_SIZE` at a time in a single prompt each,
+    with at most `BATCH_INTAKE_CONCURRENCY` requests in flight. All items and
+    their images are then inserted with `bulk_save_objects` in one
+    transaction; products without a readable name or expiry date are skipped.
+    Bulk inserts bypass the session events, so the owner's pantry summary is
+    rebuilt and the items are added to the search index in the same
+    transaction, and the new items are handed to the expiry notifier after
+    the commit.
+
+    Args:
+        user_id (int): Owner of the new pantry items.
+        payload (dict): Job payload with an `images` list of `filepath`/`thumbnail` dicts.
+        analyze_batch (Callable): Model call taking a list of PIL images and returning product
+            dicts whose `image` is the index of the image they were found in.
+        images (List[bytes], optional): Preprocessed model inputs; rebuilt from the display files when missing.
+
+    Returns:
+        List[int]: Ids of the created PantryItem rows.
+    """
+    uploads = payload['images']
+    if images is None:
+        images = [None] * len(uploads)
+    pil_images = [PIL.Image.open(io.BytesIO(image)) if image is not None
+                  else model_input(PIL.Image.open(upload['filepath']), image_pipeline.model_size)
+                  for upload, image in zip(uploads, images)]
+
+    size = application.config['BATCH_INTAKE_SIZE']
+    chunks = [range(start, min(start + size, len(pil_images))) for start in range(0, len(pil_images), size)]
+    with ThreadPoolExecutor(max_workers=application.config['BATCH_INTAKE_CONCURRENCY']) as pool:
+        results = pool.map(lambda chunk: analyze_batch([pil_images[i] for i in chunk]), chunks)
+        products = [{**product, 'image': chunk[product['image']]}
+                    for chunk, found in zip(chunks, results) for product in found]
+
+    items, item_images = [], []
+    for product in filter(None, map(_batch_product, products)):
+        upload = uploads[product['image']]
+        items.append(PantryItem(
+            used=False,
+            out_of_stock=False,
+            expiration_date=product['expiry_date'],
+            image_path=upload['filepath'],
+            user_id=user_id,
+            **catalog_details(product),
+        ))
+        item_images.append(upload)
+    if not items:
+        raise ValueError('No products recognised. Please try again.')
+
+    begin_write(db.session)
+    db.session.bulk_save_objects(items, return_defaults=True)
+    db.session.bulk_save_objects([
+        FoodImage(image_url=_static_url(upload['filepath']),
+                  thumbnail_url=_static_url(upload['thumbnail']) if upload.get('thumbnail') else None,
+                  pantry_item_id=item.id)
+        for item, upload in zip(items, item_images)])
+    rebuild_summary(db.session.connection(), user_id)
+    search_index.index(db.session.connection(), 'pantry', PantryItem.id.in_([item.id for item in items]))
+    db.session.commit()
+
+    for item in items:
+        notifier.schedule(item.id, item.expiration_date)
+    return [item.id for item in items]
+
+
+analysis_queue = JobQueue(application, workers=application.config['ANALYSIS_WORKERS'],
+                          lease=application.config['ANALYSIS_JOB_LEASE'])
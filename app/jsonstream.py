@@ -0,0 +1,73 @@
+import json
+from typing import Any
+
+
+class JSONObjectStream:
+    """
+    Incrementally extract top-level JSON objects from streamed model output.
+
+    Model replies wrap the JSON in prose or markdown fences and arrive in
+    arbitrary chunks, so instead of slicing between braces we track brace depth
+    (ignoring braces inside strings) and decode each object as soon as its
+    closing brace arrives. An object that fails to decode is skipped without
+    affecting the ones around it, and an unterminated tail is simply never
+    emitted.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._scanned = 0
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escaped = False
+        self.errors = 0
+
+    def feed(self, chunk: str) -> list[dict[str, Any]]:
+        """
+        Add a chunk of text and return the objects it completed.
+
+        Args:
+            chunk (str): The next piece of the model's response.
+
+        Returns:
+            List[Dict[str, Any]]: Objects completed by this chunk, in order.
+        """
+        self._buffer += chunk
+        completed = []
+        i = self._scanned
+        while i < len(self._buffer):
+            char = self._buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                # Strings only matter inside an object; quotes in surrounding prose are ignored
+                self._in_string = self._depth > 0
+            elif char == '{':
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == '}' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        obj = json.loads(self._buffer[self._start:i + 1])
+                    except json.JSONDecodeError:
+                        self.errors += 1
+                    else:
+                        completed.append(obj)
+                    # Drop everything we have consumed so the buffer stays small
+                    self._buffer = self._buffer[i + 1:]
+                    self._start = None
+                    i = -1
+            i += 1
+        if self._depth == 0:
+            # Only prose between objects is left, nothing worth keeping
+            self._buffer = ''
+        self._scanned = len(self._buffer)
+        return completed
@@ -1,17 +1,19 @@
 
-import google.generativeai as genai
 import PIL.Image
 import json
+import logging
 
 from typing import TypeAlias
-from typing import Optional, Any    
+from typing import Optional, Any, Iterable, List
 
-Number: TypeAlias = int | float
+from app.backends import model_backend
+from app.jsonstream import JSONObjectStream
+from app.llm_client import llm_client
+
+logger = logging.getLogger(__name__)
 
-GOOGLE_API_KEY = "YOUR-API-KEY"
+Number: TypeAlias = int | float
 
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
 
 INFO_PROMPT = '''
 You are an expert product analyzer. Your task is to analyze the image of a product and provide its description in JSON format with the following attributes:
@@ -40,38 +42,149 @@ If the product is not recognized or that product is not food, set all values as
 
 def get_information_products(img, prompt = INFO_PROMPT) -> dict[str, any]:
     """Get information products from Gemini API."""
-    print("Getting information products...")
     try:
-        response = model.generate_content([prompt, img])
+        response = llm_client.generate('product_info', model_backend.model(), [prompt, img])
         text = response.text
-        print(text)
+        logger.debug('Product info response: %s', text)
         start_index = text.find('{')
         end_index = text.find('}') + 1
         json_str = text[start_index:end_index]
         try:
             product_info = json.loads(json_str)
-            print(product_info)
         except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
+            logger.warning('Error decoding JSON: %s', e)
         
         return product_info
     except Exception as e:
         raise ValueError(f"Error in get_information_products: {e}")
     
 
-from datetime import datetime
+EXPIRY_PROMPT = '''
+Read the expiry date printed on the product in this image.
+Return only JSON: {"expiry_date": expiry_date}, with the date in the format "YYYY-MM-DD", or `null` if no expiry date is visible.
+'''
+
+def get_expiry_date(img, prompt: str = EXPIRY_PROMPT) -> Optional[str]:
+    """Read just the expiry date off a product photo, as 'YYYY-MM-DD' or None if it is not visible."""
+    try:
+        response = llm_client.generate('expiry_date', model_backend.model(), [prompt, img])
+    except Exception as e:
+        raise ValueError(f"Error in get_expiry_date: {e}")
+    for result in JSONObjectStream().feed(response.text):
+        return result.get('expiry_date')
+    return None
+
+
+BATCH_INFO_PROMPT = '''
+You are an expert product analyzer. You are given {count} numbered images of groceries; image 1 is the first image after this text.
+An image may show one product or several products.
+
+For every food product you can see, return one JSON object with the following attributes:
+1. **image**: The number of the image the product appears in.
+2. **name**: The type of product, such as "rice" or "yoghurt".
+3. **brand**: The brand of the product, or `null` if it is not visible.
+4. **type**: One of "Carbohydrates", "Fruits and Vegetables", "Protein", "Fats".
+5. **expiry_date**: The expiry date in the format "YYYY-MM-DD", or `null` if it is not visible.
+6. **nutrition_content**: A brief description of the product's nutritional content. If it is not visible, estimate it from typical values for similar products.
+
+Skip anything that is not food. Return only a JSON array of these objects:
+[{{"image": 1, "name": name, "brand": brand, "type": type, "expiry_date": expiry_date, "nutrition_content": nutrition_content}}]
+'''
+
+def get_information_products_batch(images: list, prompt: str = BATCH_INFO_PROMPT) -> list[dict[str, Any]]:
+    """
+    Recognise the products in several images with a single Gemini request.
+
+    Args:
+        images (List[PIL.Image.Image]): The images, numbered from 1 in the prompt.
+        prompt (str): Template with a `{count}` placeholder for the number of images.
+
+    Returns:
+        List[Dict[str, Any]]: One product dict per recognised product, with the 0-based
+        index of its image under `image`. Objects with an out of range image are dropped.
+    """
+    try:
+        response = llm_client.generate('product_info_batch', model_backend.model(),
+                                       [prompt.format(count=len(images)), *images])
+    except Exception as e:
+        raise ValueError(f"Error in get_information_products_batch: {e}")
+    products = []
+    for product in JSONObjectStream().feed(response.text):
+        try:
+            index = int(product.get('image')) - 1
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < len(images):
+            products.append({**product, 'image': index})
+    return products
+
+
+from datetime import date, datetime
+from time import time as _clock
+
+_today = (0, 0.0)  # (today's ordinal, timestamp of the next midnight)
+
+
+def today_ordinal() -> int:
+    """Today's date as a day ordinal, recomputed only once the day has rolled over."""
+    global _today
+    ordinal, next_midnight = _today
+    if _clock() >= next_midnight:
+        ordinal = date.today().toordinal()
+        next_midnight = datetime.combine(date.fromordinal(ordinal + 1), datetime.min.time()).timestamp()
+        _today = (ordinal, next_midnight)
+    return ordinal
+
+
+def _to_ordinal(value) -> Optional[int]:
+    """Day ordinal of a date, datetime or 'YYYY-MM-DD' string, or None if missing."""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value.toordinal()
+    return date.fromisoformat(value).toordinal()
+
 
 class Food_Management:
+    # Dates are stored as day ordinals parsed once, so status checks are integer arithmetic
+    __slots__ = ('_name', '_brand', '_type', '_expiry', '_used', '_out_of_stock', '_images', '_info', '_added')
+
     def __init__(self, info: dict[str, Any]):
-        self._name = info['name']
-        self._brand = info['brand']
-        self._type = info['type']
-        self._expiry_date = info['expiry_date']
-        self._used: bool = False
-        self._out_of_stock: bool = False
+        self._init(info['name'], info['brand'], info['type'], _to_ordinal(info['expiry_date']), today_ordinal())
+
+    def _init(self, name, brand, type, expiry: Optional[int], added: int, used=False, out_of_stock=False):
+        self._name = name
+        self._brand = brand
+        self._type = type
+        self._expiry = expiry
+        self._used: bool = used
+        self._out_of_stock: bool = out_of_stock
         self._images = None
         self._info = None
-        self._added_date = datetime.now().date()
+        self._added = added
+
+    @classmethod
+    def _create(cls, *args, **kwargs) -> 'Food_Management':
+        """An item from already parsed fields (see `_init`), without going through the info dict."""
+        food = cls.__new__(cls)
+        food._init(*args, **kwargs)
+        return food
+
+    @classmethod
+    def from_products(cls, products: Iterable[dict[str, Any]]) -> List['Food_Management']:
+        """Build items from Gemini product dicts (name, brand, type, expiry_date)."""
+        today = today_ordinal()
+        return [cls._create(product['name'], product['brand'], product['type'],
+                            _to_ordinal(product['expiry_date']), today) for product in products]
+
+    @classmethod
+    def from_pantry_items(cls, items) -> List['Food_Management']:
+        """Build items from PantryItem rows, reusing their already parsed dates."""
+        today = today_ordinal()
+        return [cls._create(item.name, item.brand, item.category,
+                            item.expiration_date.toordinal() if item.expiration_date else None,
+                            item.added_date.toordinal() if item.added_date else today,
+                            bool(item.used), bool(item.out_of_stock)) for item in items]
 
     # Property for name
     @property
@@ -100,14 +213,20 @@ class Food_Management:
     def type(self, value):
         self._type = value
 
-    # Property for expiry_date
+    # Property for expiry_date, as a 'YYYY-MM-DD' string
     @property
     def expiry_date(self):
-        return self._expiry_date
+        if self._expiry is None:
+            return None
+        return date.fromordinal(self._expiry).isoformat()
 
     @expiry_date.setter
     def expiry_date(self, value):
-        self._expiry_date = value
+        self._expiry = _to_ordinal(value)
+
+    @property
+    def added_date(self):
+        return date.fromordinal(self._added)
 
     # Method to get product information
     def get_info(self):
@@ -115,18 +234,15 @@ class Food_Management:
             'name': self._name,
             'brand': self._brand,
             'type': self._type,
-            'expiry_date': self._expiry_date,
+            'expiry_date': self.expiry_date,
             'info': self._info
         }
 
     # Property to calculate days until expiry
     @property
     def days_until_expiry(self):
-        if self._expiry_date:
-            expiry = datetime.strptime(self._expiry_date, '%Y-%m-%d').date()
-            today = datetime.today().date()
-            delta = (expiry - today).days
-            return delta
+        if self._expiry is not None:
+            return self._expiry - today_ordinal()
         return None
 
     # Prperty to determine expiry status
@@ -168,11 +284,11 @@ class Inventory_Management:
 
     def sort_by_days_until_expiry(self):
         """Sort inventory by days left until expiry, ascending order."""
-        self.food_items.sort(key=lambda food: (food.days_until_expiry or float('inf')))
+        self.food_items.sort(key=lambda food: food._expiry if food._expiry is not None else float('inf'))
 
     def sort_by_added_date(self):
         """Sort inventory by the date the food was added, ascending order."""
-        self.food_items.sort(key=lambda food: food._added_date)
+        self.food_items.sort(key=lambda food: food._added)
 
     def sort_by_category_and_expiry(self):
         """
@@ -183,13 +299,13 @@ class Inventory_Management:
             and sorted food items as values.
         """
         categories = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
-        sorted_items = {}
-        
-        for category in categories:
-            sorted_items[category] = sorted(
-                [item for item in self.food_items if item._type == category],
-                key=lambda x: datetime.strptime(x._expiry_date, "%Y-%m-%d")
-            )
+        sorted_items = {category: [] for category in categories}
+
+        for item in self.food_items:
+            if item._type in sorted_items:
+                sorted_items[item._type].append(item)
+        for items in sorted_items.values():
+            items.sort(key=lambda x: x._expiry if x._expiry is not None else float('inf'))
         return sorted_items
 
     def display_category(self, category: str):
@@ -272,7 +388,7 @@ class MealPlanner:
             result += "\n"
             if ingredients:
                 result += ", ".join(
-                    f"{ingredient._name} ({ingredient._brand if ingredient._brand else 'No Brand'}, expiry: {ingredient._expiry_date})"
+                    f"{ingredient._name} ({ingredient._brand if ingredient._brand else 'No Brand'}, expiry: {ingredient.expiry_date})"
                     for ingredient in ingredients
                 )
             else:
@@ -282,7 +398,7 @@ class MealPlanner:
         return result
 
 class MasterChef:
-    def __init__(self, meal_planner: MealPlanner):
+    def __init__(self, meal_planner: MealPlanner, history: Optional[list[dict[str, Any]]] = None, summary: Optional[str] = None):
         self.meal_planner = meal_planner
         
         system_prompt = f"""
@@ -299,10 +415,18 @@ class MasterChef:
             Do not introduce ingredients outside this list. Keep track of the conversation history to continue assisting seamlessly.
             If the customer do not have enough ingredients, suggest them to buy the missing ingredients.
             """
+        if summary:
+            system_prompt += f"""
+            Summary of the earlier conversation with this customer:
+            {summary}
+            """
+
+        self.model = model_backend.chat_model(system_prompt)
+        self.chat = self.model.start_chat(history=history or [])
 
-        self.model = genai.GenerativeModel(
-            "models/gemini-1.5-flash",
-            system_instruction=system_prompt
-        )
-        self.chat = self.model.start_chat(history=[])
+    def send_message(self, message: str) -> str:
+        """Send a customer message and return the chef's reply."""
+        response = llm_client.call('chat', lambda seconds: self.chat.send_message(
+            message, request_options={'timeout': seconds}))
+        return response.text
 
@@ -0,0 +1,324 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from google.api_core import exceptions as google_exceptions
+
+from app import application
+
+T = TypeVar('T')
+
+# Upstream errors worth another attempt: overload, rate limits, timeouts and dropped connections
+RETRYABLE = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call, including its retries and queueing, ran out of time."""
+
+
+class LatencyHistogram:
+    """Cumulative latency histogram with fixed buckets, in seconds."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf'))
+
+    def __init__(self):
+        self.counts = [0] * len(self.BUCKETS)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+            self.total += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th (0-1) observation."""
+        with self._lock:
+            count = sum(self.counts)
+            if not count:
+                return None
+            rank = q * count
+            seen = 0
+            for bound, bucket in zip(self.BUCKETS, self.counts):
+                seen += bucket
+                if seen >= rank:
+                    return bound
+        return self.BUCKETS[-1]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            buckets = dict(zip([str(bound) for bound in self.BUCKETS], self.counts))
+            count, total = sum(self.counts), self.total
+        return {
+            'count': count,
+            'mean': total / count if count else None,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'buckets': buckets,
+        }
+
+
+class CircuitBreaker:
+    """
+    Fails fast once too many recent upstream calls failed.
+
+    Outcomes of the last `window` attempts are kept; when at least
+    `min_calls` of them are recorded and the failure rate reaches
+    `threshold` the circuit opens and calls are rejected for `cooldown`
+    seconds. After that a single trial call is let through (half-open): its
+    success closes the circuit, its failure opens it again.
+
+    `allow()` hands out a permit that the caller passes back to `record()`
+    with the outcome, or to `release()` when the call ended in a way that
+    says nothing about upstream health. Only the permit of the trial call
+    decides the trial, so calls that were already in flight cannot close
+    or reopen the circuit, and a released trial lets the next call try.
+    """
+
+    CLOSED = object()  # permit for calls let through while the circuit is closed
+
+    def __init__(self, threshold=0.5, window=20, min_calls=5, cooldown=30.0):
+        self.threshold = threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._trial: Optional[object] = None  # permit of the half-open trial call in flight
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._trial is not None or time.monotonic() - self._opened_at >= self.cooldown:
+                return 'half_open'
+            return 'open'
+
+    def allow(self) -> Optional[object]:
+        """A permit for one call, or None when the circuit rejects it."""
+        with self._lock:
+            if self._opened_at is None:
+                return self.CLOSED
+            if self._trial is None and time.monotonic() - self._opened_at >= self.cooldown:
+                self._trial = object()
+                return self._trial
+            self.rejected += 1
+            return None
+
+    def release(self, permit: object):
+        """End a call without an outcome; a released trial lets the next call be the trial."""
+        with self._lock:
+            if permit is self._trial:
+                self._trial = None
+
+    def record(self, permit: object, success: bool):
+        """Record the outcome of the call `permit` was handed out for."""
+        with self._lock:
+            if self._opened_at is not None:
+                if permit is not self._trial:
+                    return  # a call started before the circuit opened
+                self._trial = None
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = time.monotonic()
+                    self.opened += 1
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+
+class ModelClient:
+    """
+    Shared gate in front of every model call.
+
+    Each call gets a deadline covering queueing, attempts and backoff. At
+    most `max_concurrency` calls are in flight; callers wait for a slot only
+    until their deadline. Retryable upstream errors are retried up to
+    `retries` times with full-jitter exponential backoff, every attempt feeds
+    the circuit breaker, and the latency of each call is recorded in a
+    per-operation histogram.
+
+    The wrapped function receives the seconds left before the deadline and
+    is expected to pass them on as its own request timeout.
+    """
+
+    def __init__(self, max_concurrency=8, timeout=30.0, retries=3, backoff_base=0.5, backoff_max=8.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.latency: dict[str, LatencyHistogram] = {}
+        self.counters: dict[str, dict[str, int]] = {}
+        self.listeners: list[Callable[[str, float], None]] = []  # called with (operation, seconds) after every call
+
+    def _count(self, operation: str, name: str):
+        with self._lock:
+            counters = self.counters.setdefault(operation, {'calls': 0, 'errors': 0, 'retries': 0, 'timeouts': 0})
+            counters[name] += 1
+
+    def _observe(self, operation: str, seconds: float):
+        with self._lock:
+            histogram = self.latency.setdefault(operation, LatencyHistogram())
+        histogram.observe(seconds)
+
+    def _backoff(self, attempt: int, deadline: float):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            raise DeadlineExceededError('No time left to retry the model call')
+        time.sleep(delay)
+
+    def call(self, operation: str, func: Callable[[float], T], timeout: Optional[float] = None) -> T:
+        """
+        Run `func(seconds_left)` under the concurrency limit, deadline, retries and breaker.
+
+        Args:
+            operation (str): Label for the metrics, e.g. 'recipes'.
+            func (Callable[[float], T]): The model call.
+            timeout (float, optional): Deadline in seconds, the client default when omitted.
+
+        Returns:
+            T: Whatever `func` returned.
+        """
+        result, permit = self._call(operation, func, timeout)
+        self.breaker.record(permit, True)
+        return result
+
+    def _call(self, operation: str, func: Callable[[float], T], timeout: Optional[float]) -> tuple[T, object]:
+        """`call()` without recording the success: returns the result and the breaker permit to settle."""
+        self._count(operation, 'calls')
+        start = time.monotonic()
+        deadline = start + (timeout or self.timeout)
+        if not self._semaphore.acquire(timeout=deadline - start):
+            self._count(operation, 'timeouts')
+            raise DeadlineExceededError(f'Timed out waiting for a free model slot ({operation})')
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count(operation, 'timeouts')
+                    raise DeadlineExceededError(f'Model call timed out ({operation})')
+                permit = self.breaker.allow()
+                if permit is None:
+                    self._count(operation, 'errors')
+                    raise CircuitOpenError(f'Model calls are failing, not calling the model ({operation})')
+                try:
+                    result = func(remaining)
+                except RETRYABLE as e:
+                    self.breaker.record(permit, False)
+                    if attempt >= self.retries:
+                        self._count(operation, 'errors')
+                        raise
+                    try:
+                        self._backoff(attempt, deadline)
+                    except DeadlineExceededError:
+                        self._count(operation, 'timeouts')
+                        raise DeadlineExceededError(f'Model call timed out ({operation}): {e}') from e
+                    attempt += 1
+                    self._count(operation, 'retries')
+                    continue
+                except BaseException as e:
+                    # Bad requests (or interrupts) say nothing about upstream health
+                    self.breaker.release(permit)
+                    if isinstance(e, Exception):
+                        self._count(operation, 'errors')
+                    raise
+                return result, permit
+        finally:
+            self._semaphore.release()
+            elapsed = time.monotonic() - start
+            self._observe(operation, elapsed)
+            for listener in self.listeners:
+                listener(operation, elapsed)
+
+    def generate(self, operation: str, model, contents: list, timeout: Optional[float] = None):
+        """`model.generate_content(contents)` through `call`."""
+        return self.call(operation, lambda seconds: model.generate_content(
+            contents, request_options={'timeout': seconds}), timeout)
+
+    def stream(self, operation: str, model, contents: list, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        Stream `model.generate_content(contents, stream=True)` chunks.
+
+        Opening the stream and receiving the first chunk go through `call`,
+        so they are retried; an error after the first chunk is raised to the
+        caller, who already consumed part of the reply. The concurrency slot
+        is only held while opening the stream, but the breaker outcome is
+        the whole stream's: a retryable error mid-stream counts as a failure,
+        and a stream the caller abandons or that fails otherwise is released.
+        """
+        def first_chunk(seconds):
+            chunks = iter(model.generate_content(contents, stream=True, request_options={'timeout': seconds}))
+            return chunks, next(chunks, None)
+
+        (chunks, first), permit = self._call(operation, first_chunk, timeout)
+        try:
+            if first is not None:
+                yield first
+                yield from chunks
+        except RETRYABLE:
+            self.breaker.record(permit, False)
+            raise
+        except BaseException:
+            # Includes GeneratorExit when the caller stops reading early
+            self.breaker.release(permit)
+            raise
+        self.breaker.record(permit, True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            operations = {operation: {**counters} for operation, counters in self.counters.items()}
+            histograms = dict(self.latency)
+        for operation, histogram in histograms.items():
+            operations.setdefault(operation, {})['latency'] = histogram.snapshot()
+        return {
+            'breaker': {'state': self.breaker.state, 'opened': self.breaker.opened, 'rejected': self.breaker.rejected},
+            'operations': operations,
+        }
+
+
+llm_client = ModelClient(
+    max_concurrency=application.config['LLM_MAX_CONCURRENCY'],
+    timeout=application.config['LLM_TIMEOUT'],
+    retries=application.config['LLM_RETRIES'],
+    backoff_base=application.config['LLM_BACKOFF_BASE'],
+    backoff_max=application.config['LLM_BACKOFF_MAX'],
+    breaker=CircuitBreaker(
+        threshold=application.config['LLM_BREAKER_THRESHOLD'],
+        window=application.config['LLM_BREAKER_WINDOW'],
+        min_calls=application.config['LLM_BREAKER_MIN_CALLS'],
+        cooldown=application.config['LLM_BREAKER_COOLDOWN'],
+    ),
+)
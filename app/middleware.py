@@ -30,3 +30,61 @@ class PrefixMiddleware(object):
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 53))
         return s.getsockname()[0]
+
+
+class InstrumentationMiddleware(object):
+    """
+    Times every request and reports it to `recorder` once the response is sent.
+
+    `recorder.start(environ)` is called before the app runs and returns a
+    per-request context; `recorder.finish(context, status, size)` is called
+    after the last byte of the body went out (or the client went away), so
+    streamed responses are timed and sized in full.
+    """
+
+    def __init__(self, app, recorder):
+        self.app = app
+        self.recorder = recorder
+
+    def __call__(self, environ, start_response):
+        context = self.recorder.start(environ)
+        status = ['500']
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(' ', 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            body = self.app(environ, recording_start_response)
+        except Exception:
+            self.recorder.finish(context, status[0], 0)
+            raise
+        return _RecordedBody(body, lambda size: self.recorder.finish(context, status[0], size))
+
+
+class _RecordedBody(object):
+    """Response body that reports its size once it is exhausted or closed, whichever comes first."""
+
+    def __init__(self, body, on_finish):
+        self.body = body
+        self.on_finish = on_finish
+        self.size = 0
+        self._finished = False
+
+    def _finish(self):
+        if not self._finished:
+            self._finished = True
+            self.on_finish(self.size)
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+        self._finish()
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self._finish()
@@ -1,12 +1,25 @@
 from app import db, login
+from flask import g
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import time
+import json
 from datetime import datetime
 
 @login.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    """
+    Load the logged-in user, at most once per request.
+
+    The user is kept on `g` for the rest of the request, and `session.get`
+    answers from the identity map when the user row was already loaded
+    (e.g. through `PantryItem.owner`), so neither costs another query.
+    """
+    cached = g.get('_identity')
+    if cached is not None and cached.id == int(id):
+        return cached
+    g._identity = db.session.get(User, int(id))
+    return g._identity
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,6 +42,10 @@ class User(UserMixin, db.Model):
 
 class PantryItem(db.Model):
 	__tablename__ = 'pantry_item'
+	__table_args__ = (
+		db.Index('ix_pantry_item_user_id_expiration_date', 'user_id', 'expiration_date'),
+		db.Index('ix_pantry_item_user_id_category', 'user_id', 'category'),
+	)
 	user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
 	id = db.Column(db.Integer, primary_key=True)
 	name = db.Column(db.String(128), index=True, nullable=False)
@@ -37,7 +54,7 @@ class PantryItem(db.Model):
 	used = db.Column(db.Boolean, default=False)
 	out_of_stock = db.Column(db.Boolean, default=False)
 	weight = db.Column(db.Float)
-	expiration_date = db.Column(db.DateTime, nullable=False)
+	expiration_date = db.Column(db.DateTime, index=True, nullable=False)
 	added_date = db.Column(db.DateTime, default=datetime.utcnow)
 	calories = db.Column(db.Float)
 	nutrition_content = db.Column(db.Text)
@@ -54,19 +71,179 @@ class FoodImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     image_url = db.Column(db.String(255))  # For remote storage (e.g., S3 or URLs)
     image_path = db.Column(db.String(255))  # For local storage (e.g., /static/images/)
-    pantry_item_id = db.Column(db.Integer, db.ForeignKey('pantry_item.id'), nullable=False)
+    thumbnail_url = db.Column(db.String(255))  # Small variant for lists; falls back to image_url when missing
+    pantry_item_id = db.Column(db.Integer, db.ForeignKey('pantry_item.id'), index=True, nullable=False)
 
 class Recipe(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)  # Who generated it; None for recipes saved before ownership was recorded
     name = db.Column(db.String(100), nullable=False)
-    ingredients = db.Column(db.Text, nullable=False)  # Store ingredients as a JSON or comma-separated string
-    steps = db.Column(db.Text, nullable=False)  # Store steps as a JSON or comma-separated string
+    ingredients = db.Column(db.Text, nullable=False)  # Ingredient lines joined with ', ', kept for full-text search and previews
+    steps = db.Column(db.Text, nullable=False)  # Steps joined with newlines, kept for full-text search
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ingredient_key = db.Column(db.String(40), index=True)  # Hash of the normalized ingredient selection that produced this recipe
+    ingredient_rows = db.relationship('RecipeIngredient', backref='recipe', lazy=True, cascade='all, delete-orphan',
+                                      order_by='RecipeIngredient.position')
+    step_rows = db.relationship('RecipeStep', backref='recipe', lazy=True, cascade='all, delete-orphan',
+                                order_by='RecipeStep.position')
 
     def __repr__(self):
         return f"<Recipe {self.name}>"
 
-    def __init__(self, name, ingredients, steps):
+    @staticmethod
+    def split_ingredients(text) -> list[str]:
+        """Ingredient lines of the `ingredients` text, which joins them with ', '."""
+        return [ingredient.strip() for ingredient in (text or '').split(', ') if ingredient.strip()]
+
+    @staticmethod
+    def split_steps(text) -> list[str]:
+        """Steps of the `steps` text, one per line."""
+        return [step.strip() for step in (text or '').split('\n') if step.strip()]
+
+    @property
+    def ingredient_list(self) -> list[str]:
+        """Ingredient lines in order; split from the text for recipes `backfill-recipes` has not reached yet."""
+        if self.ingredient_rows:
+            return [row.text for row in self.ingredient_rows]
+        return self.split_ingredients(self.ingredients)
+
+    @property
+    def step_list(self) -> list[str]:
+        """Steps in order; split from the text for recipes `backfill-recipes` has not reached yet."""
+        if self.step_rows:
+            return [row.text for row in self.step_rows]
+        return self.split_steps(self.steps)
+
+    def __init__(self, name, ingredients, steps, ingredient_key=None, user_id=None):
+        """`ingredients` and `steps` are lists of lines, or text joined the way the columns store it."""
+        if isinstance(ingredients, str):
+            ingredients = self.split_ingredients(ingredients)
+        if isinstance(steps, str):
+            steps = self.split_steps(steps)
         self.name = name
-        self.ingredients = ingredients
-        self.steps = steps
\ No newline at end of file
+        self.ingredients = ', '.join(ingredients)
+        self.steps = '\n'.join(steps)
+        self.ingredient_key = ingredient_key
+        self.user_id = user_id
+        self.ingredient_rows = [RecipeIngredient(position=position, text=line) for position, line in enumerate(ingredients)]
+        self.step_rows = [RecipeStep(position=position, text=step) for position, step in enumerate(steps)]
+
+
+class Ingredient(db.Model):
+    """One normalised ingredient ("chicken breast"), shared by every recipe line naming it."""
+    __tablename__ = 'ingredient'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(128), unique=True, nullable=False)
+
+
+class RecipeIngredient(db.Model):
+    __tablename__ = 'recipe_ingredient'
+    __table_args__ = (
+        db.Index('ix_recipe_ingredient_recipe_id_position', 'recipe_id', 'position', unique=True),
+        db.Index('ix_recipe_ingredient_ingredient_id_recipe_id', 'ingredient_id', 'recipe_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)  # The line as generated, e.g. "200g chicken breast, diced"
+    ingredient_id = db.Column(db.Integer, db.ForeignKey('ingredient.id'))  # None for staples like "salt to taste"
+    ingredient = db.relationship('Ingredient', lazy=True)
+
+
+class RecipeStep(db.Model):
+    __tablename__ = 'recipe_step'
+    __table_args__ = (
+        db.Index('ix_recipe_step_recipe_id_position', 'recipe_id', 'position', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipe.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+
+
+class AnalysisJob(db.Model):
+    __tablename__ = 'analysis_job'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(16), index=True, nullable=False, default='queued')  # queued, running, done, failed
+    payload = db.Column(db.Text, nullable=False)  # JSON describing the uploaded image(s) to analyse
+    result = db.Column(db.Text)  # JSON list of the PantryItem ids created by the job
+    error = db.Column(db.Text)
+    claimed_by = db.Column(db.String(64))  # host:pid of the process running the job
+    lease_expires_at = db.Column(db.DateTime)  # UTC; a running job past its lease is taken over by another process
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'items': json.loads(self.result) if self.result else [],
+            'error': self.error,
+        }
+
+
+class ChatSession(db.Model):
+    __tablename__ = 'chat_session'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=False)
+    summary = db.Column(db.Text)  # Compacted digest of turns dropped from the history
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    messages = db.relationship('ChatMessage', backref='session', lazy='dynamic', order_by='ChatMessage.id')
+
+
+class ChatMessage(db.Model):
+    __tablename__ = 'chat_message'
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), index=True, nullable=False)
+    role = db.Column(db.String(16), nullable=False)  # user or model
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PantrySummary(db.Model):
+    __tablename__ = 'pantry_summary'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    red = db.Column(db.Integer, nullable=False, default=0)  # expired
+    yellow = db.Column(db.Integer, nullable=False, default=0)  # expiring within 3 days
+    green = db.Column(db.Integer, nullable=False, default=0)
+    category_counts = db.Column(db.Text, nullable=False, default='{}')  # JSON {category: count}
+    next_expiry = db.Column(db.DateTime)  # earliest expiry date that has not passed yet
+    as_of = db.Column(db.Date, nullable=False)  # day the Red/Yellow/Green buckets were computed for
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped on every pantry write
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)  # time of the last pantry write (UTC)
+
+    @property
+    def total(self):
+        return self.red + self.yellow + self.green
+
+    def to_dict(self):
+        return {
+            'total': self.total,
+            'red': self.red,
+            'yellow': self.yellow,
+            'green': self.green,
+            'categories': json.loads(self.category_counts),
+            'next_expiry': self.next_expiry.strftime('%Y-%m-%d') if self.next_expiry else None,
+            'as_of': self.as_of.strftime('%Y-%m-%d'),
+        }
+
+
+class ExpiryNotification(db.Model):
+    """An expiry notification that was sent, claimed before sending so that no two processes send it."""
+    __tablename__ = 'expiry_notification'
+    __table_args__ = (db.UniqueConstraint('item_id', 'days_before', 'expiration_date'),)
+    id = db.Column(db.Integer, primary_key=True)
+    item_id = db.Column(db.Integer, nullable=False)  # no foreign key, so items can be deleted freely
+    days_before = db.Column(db.Integer, nullable=False)
+    expiration_date = db.Column(db.DateTime, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SummaryRollover(db.Model):
+    """One row per day whose summary rollover was claimed, so only one process runs it."""
+    __tablename__ = 'summary_rollover'
+    day = db.Column(db.Date, primary_key=True)
+    owner = db.Column(db.String(64), nullable=False)  # host:pid of the process running it
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
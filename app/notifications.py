@@ -0,0 +1,385 @@
+import heapq
+import json
+import logging
+import smtplib
+import threading
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from email.message import EmailMessage
+from typing import Optional
+
+from sqlalchemy import event, insert, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import application, db
+from app.models import ExpiryNotification, PantryItem, User
+
+logger = logging.getLogger(__name__)
+
+notification_table = ExpiryNotification.__table__
+
+
+@dataclass
+class DigestEntry:
+    item_id: int
+    name: str
+    expiration_date: datetime
+    days_before: int
+
+
+@dataclass
+class Digest:
+    user_id: int
+    username: str
+    email: Optional[str]
+    entries: list[DigestEntry]
+
+    def text(self) -> str:
+        lines = [f"Hi {self.username}, these items in your fridge are expiring soon:"]
+        for entry in sorted(self.entries, key=lambda entry: entry.expiration_date):
+            lines.append(f"- {entry.name}: expires {entry.expiration_date.strftime('%Y-%m-%d')}")
+        return '\n'.join(lines)
+
+
+class FileSink:
+    """Appends each digest as a JSON line to a local file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, digest: Digest):
+        record = {
+            'sent_at': datetime.now().isoformat(timespec='seconds'),
+            'user_id': digest.user_id,
+            'items': [{'id': entry.item_id, 'name': entry.name,
+                       'expiration_date': entry.expiration_date.strftime('%Y-%m-%d'),
+                       'days_before': entry.days_before} for entry in digest.entries],
+            'text': digest.text(),
+        }
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+class SMTPSink:
+    """Emails each digest to users that have an email address."""
+
+    def __init__(self, host: str, port: int, sender: str):
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, digest: Digest):
+        if not digest.email:
+            return
+        message = EmailMessage()
+        message['Subject'] = 'Digital Fridge: items expiring soon'
+        message['From'] = self.sender
+        message['To'] = digest.email
+        message.set_content(digest.text())
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+
+class NotificationScheduler:
+    """
+    Sends expiry digests 7, 3 and 1 days (configurable) before items expire.
+
+    Every notification falls on the notify-at hour, so a single thread sleeps
+    until the next notify-at time and only then asks the database for the
+    notifications due since its previous lookup, one range on
+    `expiration_date` per notice period. That picks up items written by any
+    process (web workers, imports). The due entries go through a min-heap
+    keyed on their notify-at time, which items written by this process are
+    pushed onto from a commit hook too. The first lookup after a start goes
+    back `max(days_before)` days, so notices that fell due while no scheduler
+    was running are still sent; a failed lookup or digest is retried after
+    `retry_interval` seconds.
+
+    Entries are checked against the database when they fire, so items that
+    were used, deleted or re-dated since they were scheduled are skipped. Each
+    notification is claimed with an `expiry_notification` row before it is
+    sent, so it goes out once however many scheduler processes run or lookups
+    see it. All entries due at the same time are grouped into one digest per
+    user, with one line per item.
+    """
+
+    def __init__(self, app, days_before=(7, 3, 1), notify_at=time(8, 0), sinks=None, retry_interval: float = 60):
+        self.app = app
+        self.days_before = tuple(sorted(days_before, reverse=True))
+        self.notify_at = notify_at
+        self.sinks = sinks or []
+        self.retry_interval = timedelta(seconds=retry_interval)
+        self._heap: list[tuple[datetime, int, int, datetime]] = []  # (due, days_before, item_id, expiration_date)
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._loaded_from: Optional[datetime] = None
+        self._loaded_until: Optional[datetime] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def due_times(self, expiration_date: datetime) -> list[tuple[datetime, int]]:
+        return [(datetime.combine(expiration_date.date() - timedelta(days=days), self.notify_at), days)
+                for days in self.days_before]
+
+    def next_notify_at(self, after: datetime) -> datetime:
+        """The first notify-at time at or after `after`."""
+        notify_at = datetime.combine(after.date(), self.notify_at)
+        return notify_at if notify_at >= after else notify_at + timedelta(days=1)
+
+    def schedule(self, item_id: int, expiration_date):
+        """Queue the notifications of one item that fall inside the loaded window."""
+        if not isinstance(expiration_date, datetime):
+            expiration_date = datetime.combine(expiration_date, time.min)
+        with self._condition:
+            if self._loaded_until is None:
+                return
+            wake = False
+            for due, days in self.due_times(expiration_date):
+                key = (item_id, days, expiration_date)
+                if due < self._loaded_from or due >= self._loaded_until or key in self._pending:
+                    continue
+                self._pending.add(key)
+                heapq.heappush(self._heap, (due, days, item_id, expiration_date))
+                wake = wake or self._heap[0][0] == due
+            if wake:
+                self._condition.notify()
+
+    def load_window(self, now: Optional[datetime] = None):
+        """
+        Schedule everything that fell due since the previous lookup.
+
+        The window only moves on once the lookup succeeded, so a failed one is
+        covered by the next. The first window starts `max(days_before)` days
+        before today; notices already sent are skipped by their claims.
+        """
+        now = now or datetime.now()
+        with self._condition:
+            since = self._loaded_until
+        if since is None:
+            since = datetime.combine(now.date() - timedelta(days=max(self.days_before)), time.min)
+        until = max(since, now)
+        # Notify-at times inside [since, until), and the expiry days they notify about
+        days = since.date()
+        ranges = []
+        while days <= until.date():
+            if since <= datetime.combine(days, self.notify_at) < until:
+                ranges += [days + timedelta(days=before) for before in self.days_before]
+            days += timedelta(days=1)
+        rows = []
+        if ranges:
+            rows = db.session.query(PantryItem.id, PantryItem.expiration_date).filter(
+                or_(*(PantryItem.expiration_date.between(datetime.combine(day, time.min),
+                                                         datetime.combine(day, time.max)) for day in ranges)),
+                PantryItem.used.isnot(True), PantryItem.out_of_stock.isnot(True)).all()
+        with self._condition:
+            self._loaded_from, self._loaded_until = since, until
+        for item_id, expiration_date in rows:
+            self.schedule(item_id, expiration_date)
+
+    def start(self):
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='expiry-notifier', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _wake_at(self, retry_at: Optional[datetime]) -> datetime:
+        if self._loaded_until is None:
+            return datetime.min
+        wake_at = retry_at or self.next_notify_at(self._loaded_until)
+        return min(wake_at, self._heap[0][0]) if self._heap else wake_at
+
+    def _run(self):
+        retry_at = None
+        while True:
+            with self._condition:
+                while not self._stopped:
+                    now = datetime.now()
+                    wake_at = self._wake_at(retry_at)
+                    if wake_at <= now:
+                        break
+                    self._condition.wait((wake_at - now).total_seconds())
+                if self._stopped:
+                    return
+                now = datetime.now()
+                reload = retry_at is not None or self._loaded_until is None \
+                    or self.next_notify_at(self._loaded_until) <= now
+            retry_at = None
+            with self.app.app_context():
+                try:
+                    if reload:
+                        self.load_window(now)
+                except Exception:
+                    logger.exception('Error looking up due expiry notifications')
+                    retry_at = now + self.retry_interval
+                with self._condition:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        entry = heapq.heappop(self._heap)
+                        self._pending.discard((entry[2], entry[1], entry[3]))
+                        due.append(entry)
+                try:
+                    if due:
+                        self.deliver(due, now)
+                except Exception:
+                    logger.exception('Error sending expiry notifications')
+                    self._requeue(due, now + self.retry_interval)
+                finally:
+                    db.session.remove()
+
+    def _requeue(self, entries: list[tuple[datetime, int, int, datetime]], due: datetime):
+        with self._condition:
+            for _, days, item_id, expiration_date in entries:
+                key = (item_id, days, expiration_date)
+                if key not in self._pending:
+                    self._pending.add(key)
+                    heapq.heappush(self._heap, (due, days, item_id, expiration_date))
+            self._condition.notify()
+
+    def deliver(self, due: list[tuple[datetime, int, int, datetime]], now: Optional[datetime] = None) -> list[Digest]:
+        """
+        Check due entries against the pantry, claim them and send one digest per user.
+
+        An item listed by several notices (after the scheduler was down) gets
+        one line, from the nearest notice; items that already expired are
+        skipped. Digests that fail to send are released and queued again.
+        """
+        now = now or datetime.now()
+        items = {item.id: item for item in PantryItem.query.filter(
+            PantryItem.id.in_({item_id for _, _, item_id, _ in due})).options(db.joinedload(PantryItem.owner))}
+        entries = []
+        for _, days, item_id, expiration_date in due:
+            item = items.get(item_id)
+            if item is None or item.used or item.out_of_stock or item.owner is None \
+                    or item.expiration_date != expiration_date or expiration_date.date() < now.date():
+                continue
+            entries.append(DigestEntry(item.id, item.name, item.expiration_date, days))
+        digests: dict[int, Digest] = {}
+        claimed: dict[int, list[DigestEntry]] = {}
+        for entry in sorted(claim_notifications(entries), key=lambda entry: entry.days_before):
+            item = items[entry.item_id]
+            digest = digests.get(item.user_id)
+            if digest is None:
+                digest = digests[item.user_id] = Digest(item.user_id, item.owner.username, item.owner.email, [])
+            claimed.setdefault(item.user_id, []).append(entry)
+            if all(listed.item_id != entry.item_id for listed in digest.entries):
+                digest.entries.append(entry)
+        sent = []
+        for digest in digests.values():
+            try:
+                for sink in self.sinks:
+                    sink.send(digest)
+            except Exception:
+                logger.exception('Error sending the expiry digest of user %s', digest.user_id)
+                # Release the claims so the retry can send the digest
+                release_notifications(claimed[digest.user_id])
+                self._requeue([(now, entry.days_before, entry.item_id, entry.expiration_date)
+                               for entry in claimed[digest.user_id]], now + self.retry_interval)
+            else:
+                sent.append(digest)
+        return sent
+
+
+def _insert_claim(connection):
+    # Another scheduler may claim the same notification at the same time
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert(notification_table).on_conflict_do_nothing()
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(notification_table).on_conflict_do_nothing()
+    return insert(notification_table)
+
+
+def claim_notifications(entries: list[DigestEntry]) -> list[DigestEntry]:
+    """
+    Record notifications as sent, in one transaction.
+
+    Args:
+        entries (List[DigestEntry]): Notifications about to be sent.
+
+    Returns:
+        List[DigestEntry]: The entries this call claimed; the others were already sent or claimed
+        by another process.
+    """
+    claimed = []
+    with db.engine.begin() as connection:
+        statement = _insert_claim(connection)
+        for entry in entries:
+            inserted = connection.execute(statement.values(
+                item_id=entry.item_id, days_before=entry.days_before, expiration_date=entry.expiration_date,
+                sent_at=datetime.utcnow())).rowcount
+            if inserted:
+                claimed.append(entry)
+    return claimed
+
+
+def release_notifications(entries: list[DigestEntry]):
+    """Forget the claims of notifications that could not be sent."""
+    with db.engine.begin() as connection:
+        for entry in entries:
+            connection.execute(notification_table.delete().where(
+                notification_table.c.item_id == entry.item_id,
+                notification_table.c.days_before == entry.days_before,
+                notification_table.c.expiration_date == entry.expiration_date))
+
+
+def build_sinks(config) -> list:
+    sinks = []
+    for name in config['NOTIFY_SINKS']:
+        if name == 'file':
+            sinks.append(FileSink(config['NOTIFY_FILE']))
+        elif name == 'smtp':
+            sinks.append(SMTPSink(config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_SENDER']))
+        else:
+            raise ValueError(f"Unknown notification sink: {name}")
+    return sinks
+
+
+notifier = NotificationScheduler(
+    application,
+    days_before=application.config['NOTIFY_DAYS_BEFORE'],
+    notify_at=time(application.config['NOTIFY_HOUR']),
+    sinks=build_sinks(application.config),
+    retry_interval=application.config['NOTIFY_RETRY_INTERVAL'],
+)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_pantry_writes(session, flush_context):
+    if not notifier.running:
+        return
+    written = session.info.setdefault('notify_items', [])
+    for target in list(session.new) + list(session.dirty):
+        if isinstance(target, PantryItem) and not target.used and not target.out_of_stock:
+            written.append((target.id, target.expiration_date))
+
+
+@event.listens_for(Session, 'after_commit')
+def _schedule_pantry_writes(session):
+    for item_id, expiration_date in session.info.pop('notify_items', []):
+        notifier.schedule(item_id, expiration_date)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pantry_writes(session):
+    session.info.pop('notify_items', None)
+
+
+@application.cli.command('notify')
+def notify_command():
+    """Run the expiry notification scheduler in the foreground."""
+    notifier.start()
+    notifier._thread.join()
+
+
+if application.config['NOTIFICATIONS_ENABLED']:
+    notifier.start()
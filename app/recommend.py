@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, Optional
+
+import numpy as np
+
+from sqlalchemy import select
+
+from app import db
+from app.models import Ingredient, PantryItem, RecipeIngredient
+from app.ingredients import pantry_ingredient_names
+from app.summary import expiry_status
+
+logger = logging.getLogger(__name__)
+
+# How much an ingredient counts for by the Red/Yellow/Green status of the pantry item covering it.
+# Expired (red) items are not offered to cook with; ones expiring within 3 days count double.
+URGENCY = {'red': 0.0, 'yellow': 2.0, 'green': 1.0}
+
+
+@dataclass(frozen=True)
+class RecipeMatch:
+    recipe_id: int
+    score: float  # urgency-weighted coverage; 1.0 when everything is covered by items that keep
+    coverage: float  # share of the recipe's ingredients in the pantry
+    missing: tuple[str, ...]  # ingredients the pantry does not cover
+
+    def to_dict(self) -> dict:
+        return {'recipe_id': self.recipe_id, 'score': round(self.score, 3), 'coverage': round(self.coverage, 3),
+                'missing': list(self.missing)}
+
+
+class _Index:
+    """
+    Inverted index from Ingredient to the saved recipes using it, read from
+    the RecipeIngredient rows.
+
+    `postings[ingredient_id]` lists the positions (in `recipe_ids`) of the
+    recipes using an ingredient, `ingredients[position]` the ingredient ids
+    of a recipe and `sizes[position]` how many there are. Postings are
+    appended to as lists and turned into NumPy arrays the first time a
+    lookup needs them.
+    """
+
+    def __init__(self):
+        self.ids: dict[str, int] = {}  # Ingredient.name -> Ingredient.id
+        self.names: dict[int, str] = {}
+        self.postings: dict[int, list[int]] = {}
+        self._arrays: dict[int, np.ndarray] = {}
+        self.recipe_ids: list[int] = []
+        self.positions: dict[int, int] = {}  # recipe id -> position
+        self.ingredients: list[tuple[int, ...]] = []
+        self.sizes = np.zeros(0, dtype=np.int32)
+        self.last_id = 0  # of the last RecipeIngredient row read
+
+    def add(self, rows: Iterable[tuple[int, int, int, str]]):
+        """Index (line id, recipe id, ingredient id, ingredient name) rows, in increasing line id order."""
+        touched = set()
+        for line_id, recipe_id, ingredient_id, name in rows:
+            self.last_id = line_id
+            if ingredient_id not in self.names:
+                self.names[ingredient_id] = name
+                self.ids[name] = ingredient_id
+                self.postings[ingredient_id] = []
+            position = self.positions.get(recipe_id)
+            if position is None:
+                position = self.positions[recipe_id] = len(self.recipe_ids)
+                self.recipe_ids.append(recipe_id)
+                self.ingredients.append(())
+            if ingredient_id in self.ingredients[position]:
+                continue
+            self.ingredients[position] += (ingredient_id,)
+            self.postings[ingredient_id].append(position)
+            self._arrays.pop(ingredient_id, None)
+            touched.add(position)
+        if len(self.recipe_ids) > len(self.sizes):
+            self.sizes = np.concatenate([self.sizes, np.zeros(len(self.recipe_ids) - len(self.sizes), dtype=np.int32)])
+        for position in touched:
+            self.sizes[position] = len(self.ingredients[position])
+
+    def recipes(self, ingredient_id: int) -> np.ndarray:
+        array = self._arrays.get(ingredient_id)
+        if array is None:
+            array = self._arrays[ingredient_id] = np.array(self.postings[ingredient_id], dtype=np.int32)
+        return array
+
+    def covered(self, name: str) -> set[int]:
+        """Ingredients a pantry item with this name stands in for, as in `pantry_ingredient_names()`."""
+        return {self.ids[covered] for covered in pantry_ingredient_names([name]) if covered in self.ids}
+
+
+class RecipeMatcher:
+    """
+    Ranks the saved recipes by how much of them a user's pantry covers,
+    favouring the ones that use up items about to expire.
+
+    Recipes are matched on their RecipeIngredient rows, with the same
+    coverage rule as `recipes_cookable()`, so this ranking and the "cook
+    now" list agree on what the pantry covers. Recipe lines are only ever
+    added (with new recipes or by `flask backfill-recipes`), so the index
+    loads every line once and afterwards just the ones with a higher id
+    than it has seen; each lookup first picks those up with one
+    primary-key range query. Lookups hold a lock while they score, which
+    takes a few milliseconds.
+
+    Scoring goes through the inverted index: every ingredient the pantry
+    covers adds its urgency weight to the recipes in its postings list
+    (one `bincount` over the concatenated postings), and only recipes
+    reached that way are ranked.
+
+    Args:
+        loader (Callable[[int], Iterable[Tuple[int, int, int, str]]]): (line id, recipe id,
+            ingredient id, ingredient name) of the recipe lines naming an ingredient with a
+            line id above the given one, in line id order.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._index = _Index()
+        self._lock = threading.RLock()
+        self.lookups = 0
+        self.hits = 0
+
+    def index(self) -> _Index:
+        with self._lock:
+            start = time.perf_counter()
+            before = len(self._index.recipe_ids)
+            self._index.add(self.loader(self._index.last_id))
+            added = len(self._index.recipe_ids) - before
+            if added > 100:
+                logger.info('Indexed %d recipes for matching in %.2fs', added, time.perf_counter() - start)
+            return self._index
+
+    def recommend(self, pantry: Iterable[tuple[str, datetime]], required: Iterable[str] = (), limit: int = 5,
+                  min_coverage: float = 0.0, today: Optional[date] = None) -> list[RecipeMatch]:
+        """
+        The saved recipes best made from a pantry, best first.
+
+        Each ingredient counts for the URGENCY weight of the most urgent
+        pantry item covering it, so a recipe's score is its coverage with
+        ingredients that expire soon counting double.
+
+        Args:
+            pantry (Iterable[Tuple[str, datetime]]): (name, expiration_date) of the items on hand.
+            required (Iterable[str]): Item names of which each result must use at least one, e.g. the
+                ingredients picked on the recipes page; empty for no restriction.
+            limit (int): Most recipes returned.
+            min_coverage (float): Least share (0-1) of a recipe's ingredients the pantry must cover.
+            today (date): Day the expiry statuses are computed for, today by default.
+
+        Returns:
+            List[RecipeMatch]: Up to `limit` matches, highest score first.
+        """
+        today = today or date.today()
+        with self._lock:
+            return self._recommend(self.index(), pantry, required, limit, min_coverage, today)
+
+    def _recommend(self, index: _Index, pantry, required, limit, min_coverage, today) -> list[RecipeMatch]:
+        self.lookups += 1
+        weights: dict[int, float] = {}
+        for name, expiration in pantry:
+            if expiration is None:
+                continue
+            weight = URGENCY[expiry_status(expiration, today)]
+            if weight:
+                for ingredient_id in index.covered(name):
+                    weights[ingredient_id] = max(weights.get(ingredient_id, 0.0), weight)
+        if not weights:
+            return []
+        ingredient_ids = list(weights)
+        postings = [index.recipes(ingredient_id) for ingredient_id in ingredient_ids]
+        positions = np.concatenate(postings)
+        size = len(index.recipe_ids)
+        covered = np.bincount(positions, minlength=size)
+        weighted = np.bincount(positions, weights=np.repeat([weights[i] for i in ingredient_ids],
+                                                            [len(p) for p in postings]), minlength=size)
+        candidates = np.flatnonzero(covered)
+        if required:
+            wanted = set()
+            for name in required:
+                wanted.update(index.covered(name))
+            uses = np.zeros(size, dtype=bool)
+            for ingredient_id in wanted & set(ingredient_ids):
+                uses[index.recipes(ingredient_id)] = True
+            candidates = candidates[uses[candidates]]
+        coverage = covered[candidates] / index.sizes[candidates]
+        keep = coverage >= min_coverage
+        candidates, coverage = candidates[keep], coverage[keep]
+        scores = weighted[candidates] / index.sizes[candidates]
+        # Best score, then coverage, then the newest recipe; only the ones scoring in the top `limit` get sorted
+        top = np.arange(len(scores))
+        if len(scores) > limit > 0:
+            top = np.flatnonzero(scores >= np.partition(scores, -limit)[-limit])
+        best = top[np.lexsort((-candidates[top], -coverage[top], -scores[top]))][:limit]
+        matches = [RecipeMatch(
+            recipe_id=index.recipe_ids[candidates[i]],
+            score=float(scores[i]),
+            coverage=float(coverage[i]),
+            missing=tuple(index.names[j] for j in index.ingredients[candidates[i]] if j not in weights),
+        ) for i in best]
+        self.hits += bool(matches)
+        return matches
+
+    def recommend_for_user(self, user_id: int, required: Iterable[str] = (), limit: int = 5,
+                           min_coverage: float = 0.0) -> list[RecipeMatch]:
+        """`recommend()` over the items a user has not used up yet."""
+        pantry = db.session.execute(
+            select(PantryItem.name, PantryItem.expiration_date)
+            .where(PantryItem.user_id == user_id, PantryItem.used.isnot(True), PantryItem.out_of_stock.isnot(True)))
+        return self.recommend(pantry, required, limit=limit, min_coverage=min_coverage)
+
+    def stats(self) -> dict:
+        index = self._index
+        return {
+            'recipes': len(index.recipe_ids),
+            'ingredients': len(index.names),
+            'lookups': self.lookups,
+            'hits': self.hits,
+        }
+
+
+def saved_recipe_lines(after_id: int) -> Iterable[tuple[int, int, int, str]]:
+    """The recipe lines naming an ingredient with an id above `after_id`, as `RecipeMatcher` reads them."""
+    return db.session.execute(
+        select(RecipeIngredient.id, RecipeIngredient.recipe_id, Ingredient.id, Ingredient.name)
+        .join(Ingredient, RecipeIngredient.ingredient_id == Ingredient.id)
+        .where(RecipeIngredient.id > after_id).order_by(RecipeIngredient.id)
+        .execution_options(yield_per=5000))
+
+
+recipe_matcher = RecipeMatcher(saved_recipe_lines)
@@ -1,17 +1,40 @@
 from app import application
-from flask import render_template, flash, redirect, url_for
+from flask import render_template, flash, redirect, url_for, jsonify, make_response
 from app.forms import LoginForm, RegistrationForm, ProfileUpdateForm
 from flask_login import current_user, login_user, logout_user, login_required
-from app.models import User, PantryItem, Recipe, FoodImage
+from app.models import User, PantryItem, Recipe, FoodImage, AnalysisJob
 from urllib.parse import urlparse, unquote
 from app import db
-from flask import request 
+from flask import request, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os, sys
-from threading import Thread
-from datetime import datetime, timedelta, time
+import logging
+from datetime import datetime, timedelta, time, timezone
 from app.llm import *
+from app.jobs import analysis_queue
+from app.images import image_pipeline
+from app.cache import product_cache, recipe_cache, fragment_cache
+from app.backends import model_backend
+from app.llm_client import llm_client
+from app.instrumentation import render_metrics
+from app.chat import chat_sessions
+from app.summary import get_summary
+from app.bulk import READERS, EXPORTERS, detect_format, import_items
+from app.catalog import product_catalog
+from app.search import SOURCES as SEARCH_SOURCES, search_documents
+from app.recommend import RecipeMatch, recipe_matcher
+from app.ingredients import recipes_cookable, recipes_using
 import json
+import hashlib
+import hmac
+import base64
+import binascii
+import secrets
+import PIL.Image
+from typing import Iterator, Callable, Optional
+from app.jsonstream import JSONObjectStream
+
+logger = logging.getLogger(__name__)
 
 @application.route('/login', methods=['GET', 'POST'])
 def login():
@@ -50,48 +73,203 @@ def logout():
 @login_required
 def inventory():
 	if request.method == 'POST':
-		item = PantryItem(
-			name=request.form['name'],
-			category=request.form['category'],
-			weight=request.form['weight'],
-			expiration_date=datetime.strptime(request.form['expiration_date'], '%Y-%m-%d').date(),
-			calories=request.form['calories'],
-			owner=current_user
-		)
-		db.session.add(item)
-		db.session.commit()
-		flash('Item added successfully!')
-	items = PantryItem.query.filter_by(user_id=current_user.id).all()
-	return render_template('inventory.html', title='Inventory', items=items)
+		# Details left blank are taken from the catalog product the name matches
+		details = product_catalog.fill_details({
+			'name': request.form['name'].strip(),
+			'brand': request.form.get('brand', '').strip() or None,
+			'category': request.form.get('category') or None,
+			'weight': request.form.get('weight', type=float),
+			'calories': request.form.get('calories', type=float),
+			'nutrition_content': request.form.get('nutrition_content', '').strip() or None,
+		})
+		if not details['name'] or details['category'] is None:
+			flash('Please enter a name and pick a category.')
+		else:
+			item = PantryItem(
+				expiration_date=datetime.strptime(request.form['expiration_date'], '%Y-%m-%d').date(),
+				owner=current_user,
+				**details
+			)
+			db.session.add(item)
+			db.session.commit()
+			flash('Item added successfully!')
+	# Rows are loaded page by page from /api/inventory
+	return render_template('inventory.html', title='Inventory')
+
+INVENTORY_FIELDS = ['id', 'name', 'brand', 'category', 'used', 'out_of_stock', 'weight',
+					'expiration_date', 'added_date', 'calories', 'nutrition_content', 'image_path']
+# nutrition_content can be long, so it is only loaded when asked for
+DEFAULT_INVENTORY_FIELDS = [field for field in INVENTORY_FIELDS if field != 'nutrition_content']
+
+def encode_cursor(item: PantryItem) -> str:
+	"""Opaque keyset cursor pointing just after `item` in (expiration_date, id) order."""
+	raw = f"{item.expiration_date.isoformat()}|{item.id}"
+	return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+	expiration_date, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+	return datetime.fromisoformat(expiration_date), int(item_id)
+
+def serialize_item(item: PantryItem, fields: list[str]) -> dict[str, Any]:
+	data = {}
+	for field in fields:
+		value = getattr(item, field)
+		data[field] = value.isoformat() if isinstance(value, datetime) else value
+	data['status'] = 'expired' if item.is_expired() else 'near_expiry' if item.is_near_expiry() else None
+	return data
+
+@application.route('/api/inventory')
+@login_required
+def inventory_api():
+	"""
+	Page through the user's pantry in (expiration_date, id) order.
+
+	Query parameters:
+		cursor: `next_cursor` from the previous page.
+		limit: Page size (1-200, default 50).
+		category: Only items in this category.
+		used, out_of_stock: `true` or `false`.
+		expires_after, expires_before: Expiry window as YYYY-MM-DD (inclusive).
+		fields: Comma-separated columns to return; nutrition_content is left out by default.
+	"""
+	args = request.args
+	try:
+		limit = min(max(int(args.get('limit', 50)), 1), 200)
+		fields = args['fields'].split(',') if args.get('fields') else DEFAULT_INVENTORY_FIELDS
+		unknown = set(fields) - set(INVENTORY_FIELDS)
+		if unknown:
+			raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+		query = PantryItem.query.filter(PantryItem.user_id == current_user.id)
+		if args.get('category'):
+			query = query.filter(PantryItem.category == args['category'])
+		for flag in ('used', 'out_of_stock'):
+			if flag in args:
+				if args[flag] not in ('true', 'false'):
+					raise ValueError(f"{flag} must be true or false")
+				column = getattr(PantryItem, flag)
+				query = query.filter(column.is_(True) if args[flag] == 'true' else column.isnot(True))
+		if args.get('expires_after'):
+			query = query.filter(PantryItem.expiration_date >= datetime.strptime(args['expires_after'], '%Y-%m-%d'))
+		if args.get('expires_before'):
+			query = query.filter(PantryItem.expiration_date < datetime.strptime(args['expires_before'], '%Y-%m-%d') + timedelta(days=1))
+		if args.get('cursor'):
+			query = query.filter(db.tuple_(PantryItem.expiration_date, PantryItem.id) > decode_cursor(args['cursor']))
+	except (ValueError, binascii.Error) as e:
+		return jsonify(error=str(e)), 400
+
+	# id and expiration_date are always needed for the cursor and the status
+	columns = {'id', 'expiration_date', *fields}
+	# Rows are serialized from their own columns only; raise rather than lazy-load per row
+	query = query.options(db.load_only(*[getattr(PantryItem, column) for column in columns]), db.raiseload('*'))
+	items = query.order_by(PantryItem.expiration_date, PantryItem.id).limit(limit + 1).all()
+
+	next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+	return jsonify(items=[serialize_item(item, fields) for item in items[:limit]], next_cursor=next_cursor)
+
+@application.route('/api/pantry/import', methods=['POST'])
+@login_required
+def pantry_import():
+	"""
+	Import pantry items from an uploaded .xlsx, .csv or .jsonl file.
 
-@application.route('/food/<int:food_id>')
-def food_detail(food_id):
-	food_item = PantryItem.query.get_or_404(food_id)
-	print(len(food_item.image_urls))
-	for image in food_item.image_urls:
-		print(image.image_url)
-	return render_template('food_detail.html', title=food_item.name, food=food_item)
+	Rows are streamed from the upload and inserted in chunks; invalid rows
+	are skipped and the first errors are returned with the counts. Rows
+	without an expiration_date need the `expires_in` form field (days).
+	"""
+	upload = request.files.get('file')
+	if upload is None or not upload.filename:
+		return jsonify(error='No file uploaded.'), 400
+	try:
+		rows = READERS[detect_format(upload.filename)](upload.stream)
+		result = import_items(rows, current_user.id, chunk_size=application.config['BULK_IMPORT_CHUNK_SIZE'],
+							  expires_in=request.form.get('expires_in', type=int))
+	except (ValueError, RuntimeError) as e:
+		# Unsupported or unreadable files; individual bad rows are reported in the result instead
+		return jsonify(error=str(e)), 400
+	return jsonify(result.to_dict())
+
+@application.route('/api/pantry/export')
+@login_required
+def pantry_export():
+	"""Download the pantry as CSV (`format=csv`, default) or JSON lines (`format=jsonl`), streamed."""
+	fmt = request.args.get('format', 'csv')
+	if fmt not in EXPORTERS:
+		return jsonify(error=f"format must be one of: {', '.join(EXPORTERS)}"), 400
+	export, mimetype = EXPORTERS[fmt]
+	filename = f"pantry-{datetime.now():%Y%m%d}.{fmt}"
+	return Response(stream_with_context(export(current_user.id)), mimetype=mimetype,
+					headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+@application.route('/api/products/suggest')
+@login_required
+def product_suggest():
+	"""
+	Autocomplete for product names: `q` is what has been typed so far.
 
-def get_ai_recipe_suggestions(selected_items: list[str]) -> list[dict[str, Any]]:
+	Returns up to `limit` (default 10, at most 50) catalog products, best
+	match first, with the details the add-item form fills in from them.
 	"""
-	Generate AI-based recipe suggestions using selected items.
-	
-	Args:
-		selected_items (List[str]): A list of ingredient names.
+	limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+	matches = product_catalog.search(request.args.get('q', ''), limit=limit)
+	response = jsonify(products=[{**product.to_dict(), 'score': score} for product, score in matches])
+	response.headers['Cache-Control'] = 'private, max-age=300'
+	return response
+
+def search_page(kind: str, query: str, page: int, per_page: int) -> dict[str, Any]:
+	"""One page of `kind` results for the current user, as plain dicts."""
+	owner = current_user.id if kind == 'pantry' else None
+	rows, has_next = search_documents(kind, query, owner, page=page, per_page=per_page)
+	results = []
+	for row, score in rows:
+		if kind == 'pantry':
+			result = {'id': row.id, 'name': row.name, 'brand': row.brand, 'category': row.category,
+					  'expiration_date': row.expiration_date.isoformat(), 'url': url_for('food_detail', food_id=row.id)}
+		else:
+			result = {'id': row.id, 'name': row.name, 'url': url_for('recipe', id=row.id)}
+		results.append({**result, 'score': round(score, 4)})
+	return {'kind': kind, 'query': query, 'page': page, 'results': results,
+			'next_page': page + 1 if has_next else None}
+
+def search_args() -> tuple[str, str, int, int]:
+	kind = request.args.get('kind', 'pantry')
+	page = max(request.args.get('page', 1, type=int), 1)
+	per_page = min(max(request.args.get('per_page', application.config['SEARCH_PER_PAGE'], type=int), 1), 100)
+	return kind, request.args.get('q', '').strip(), page, per_page
+
+@application.route('/api/search')
+@login_required
+def search_api():
+	"""
+	Ranked full-text search over the user's pantry (`kind=pantry`, default) or the saved recipes (`kind=recipes`).
 
-	Returns:
-		List[Dict[str, Any]]: A list of recipes, each with a name, image URL, ingredients, and steps.
+	Every word of `q` must match (the last one as a prefix), in the name,
+	brand or nutrition of an item, or the name, ingredients or steps of a
+	recipe; name matches rank highest. `page` is 1-based and `next_page`
+	is null on the last page.
 	"""
-	if not selected_items:
-		return []
+	kind, query, page, per_page = search_args()
+	if kind not in SEARCH_SOURCES:
+		return jsonify(error=f"kind must be one of: {', '.join(SEARCH_SOURCES)}"), 400
+	return jsonify(search_page(kind, query, page, per_page))
 
-	# Prepare the input prompt for the AI model
-	if not selected_items:
-		return []
+@application.route('/search')
+@login_required
+def search():
+	kind, query, page, per_page = search_args()
+	kind = kind if kind in SEARCH_SOURCES else 'pantry'
+	results = search_page(kind, query, page, per_page) if query else None
+	return render_template('search.html', title='Search', kind=kind, query=query, search=results)
+
+@application.route('/food/<int:food_id>')
+def food_detail(food_id):
+	food_item = PantryItem.query.options(db.selectinload(PantryItem.image_urls)).get_or_404(food_id)
+	return render_template('food_detail.html', title=food_item.name, food=food_item)
 
-	# Prepare the input prompt for the AI model
+def recipe_prompt(selected_items: list[str]) -> str:
+	"""Build the recipe-suggestion prompt for a list of ingredient names."""
 	ingredients_list = ', '.join(selected_items)
-	prompt = f"""
+	return f"""
 	You are a professional chef. Suggest creative recipes using the following ingredients: {ingredients_list}.
 	Return output as Json format following this example:
 	[
@@ -103,78 +281,261 @@ def get_ai_recipe_suggestions(selected_items: list[str]) -> list[dict[str, Any]]
 	]
 	"""
 
+def get_ai_recipe_suggestions(selected_items: list[str]) -> list[dict[str, Any]]:
+	"""
+	Generate AI-based recipe suggestions using selected items.
+	
+	Args:
+		selected_items (List[str]): A list of ingredient names.
+
+	Returns:
+		List[Dict[str, Any]]: A list of recipes, each with a name, ingredients, and steps.
+	"""
+	if not selected_items:
+		return []
+
 	try:
 		# Generate response using the AI model
-		response = model.generate_content([prompt])
+		response = llm_client.generate('recipes', model_backend.model(), [recipe_prompt(selected_items)])
 
-		text = response.text
+		# Parse and return recipes
+		return parse_ai_response(response.text)
 
-		start_index = text.find('{')
-		end_index = text.find('}') + 1
-		json_text = text[start_index: end_index]
+	except Exception as e:
+		logger.warning('Error generating AI response: %s', e)
+		return []
 
-		print(json_text)
+def stream_ai_recipe_suggestions(selected_items: list[str]) -> Iterator[dict[str, Any]]:
+	"""
+	Generate AI-based recipe suggestions, yielding each recipe as soon as it is complete.
 
-		# Parse and return recipes
-		return parse_ai_response(json_text)
+	Args:
+		selected_items (List[str]): A list of ingredient names.
+
+	Yields:
+		Dict[str, Any]: A validated recipe with a name, ingredients, and steps.
+	"""
+	if not selected_items:
+		return
 
+	parser = JSONObjectStream()
+	try:
+		for chunk in llm_client.stream('recipes_stream', model_backend.model(), [recipe_prompt(selected_items)]):
+			for obj in parser.feed(chunk.text):
+				yield from validate_recipes(obj)
 	except Exception as e:
-		print(f"Error generating AI response: {e}")
+		# Recipes already yielded stay valid; only the unfinished tail is lost
+		logger.warning('Error streaming AI response: %s', e)
+
+def validate_recipes(obj: Any) -> list[dict[str, Any]]:
+	"""
+	Check a decoded JSON value against the recipe structure.
+
+	Args:
+		obj (Any): A decoded object; a `{"recipes": [...]}` wrapper is unpacked.
+
+	Returns:
+		List[Dict[str, Any]]: The valid recipes, with ingredients and steps as lists of strings.
+	"""
+	if isinstance(obj, dict) and isinstance(obj.get('recipes'), list):
+		return [recipe for item in obj['recipes'] for recipe in validate_recipes(item)]
+	if not isinstance(obj, dict) or not all(key in obj for key in ["name", "ingredients", "steps"]):
+		logger.debug('Invalid recipe structure: %r', obj)
+		return []
+	if not isinstance(obj['ingredients'], list) or not isinstance(obj['steps'], list):
+		logger.debug('Invalid recipe structure: %r', obj)
 		return []
+	return [{
+		'name': str(obj['name']),
+		'ingredients': [str(ingredient) for ingredient in obj['ingredients']],
+		'steps': [str(step) for step in obj['steps']],
+	}]
 
 def parse_ai_response(ai_response: str) -> list[dict[str, Any]]:
 	"""
 	Parse the AI-generated response into a structured recipe format.
 
+	Every complete recipe object in the text is kept; malformed objects are
+	skipped individually instead of discarding the whole response.
+
 	Args:
 		ai_response (str): The raw text response from the AI model.
 
 	Returns:
 		List[Dict[str, Any]]: A list of parsed recipes.
 	"""
-	try:
-		# Assuming AI provides JSON-like responses in text format
-		recipes = json.loads(ai_response)
-
-		# If the response is a single recipe, wrap it in a list
-		if isinstance(recipes, dict):
-			recipes = [recipes]
-
-		# Validate the structure of the recipes
-		if isinstance(recipes, list):
-			for recipe in recipes:
-				if not all(key in recipe for key in ["name", "ingredients", "steps"]):
-					print(f"Invalid recipe structure: {recipe}")
-					return []
-			return recipes
-		else:
-			print("AI response is not a valid list of recipes.")
-			return []
+	recipes = [recipe for obj in JSONObjectStream().feed(ai_response) for recipe in validate_recipes(obj)]
+	if not recipes:
+		logger.warning('Failed to decode AI response. Ensure the AI response is JSON formatted.')
+	return recipes
+
+def save_recipe(recipe_data: dict[str, Any], key: str) -> Recipe:
+	"""Add a generated recipe, with its ingredient and step rows, to the session (the caller commits)."""
+	recipe = Recipe(name=recipe_data["name"], ingredients=recipe_data["ingredients"], steps=recipe_data["steps"],
+					ingredient_key=key, user_id=current_user.id)
+	db.session.add(recipe)
+	return recipe
+
+def with_lines(query):
+	"""Load the ingredient and step rows of the queried recipes in two more queries, whatever their number."""
+	return query.options(db.selectinload(Recipe.ingredient_rows), db.selectinload(Recipe.step_rows))
+
+def recipe_cache_key(selected_items: list[str]) -> str:
+	"""
+	Key a selection of ingredients independently of order, case and duplicates.
 
-	except json.JSONDecodeError:
-		print("Failed to decode AI response. Ensure the AI response is JSON formatted.")
+	Args:
+		selected_items (List[str]): A list of ingredient names.
+
+	Returns:
+		str: SHA-1 hex digest of the sorted, case-folded, deduplicated names.
+	"""
+	names = sorted({item.strip().casefold() for item in selected_items if item.strip()})
+	return hashlib.sha1('\n'.join(names).encode()).hexdigest()
+
+def get_cached_recipes(key: str) -> list[Recipe]:
+	"""
+	Look up the recipes previously generated for the same ingredient selection.
+
+	The in-memory cache answers repeat requests without a model call; on a
+	miss we fall back to the `ingredient_key` index so recipes generated
+	before a restart are reused instead of inserted again.
+	"""
+	recipe_ids = recipe_cache.get(key)
+	if recipe_ids is not None:
+		return with_lines(Recipe.query).filter(Recipe.id.in_(recipe_ids)).order_by(Recipe.id).all()
+	cutoff = datetime.utcnow() - timedelta(seconds=recipe_cache.ttl)
+	recipes = with_lines(Recipe.query).filter_by(ingredient_key=key).filter(Recipe.created_at >= cutoff) \
+		.order_by(Recipe.id).all()
+	if recipes:
+		recipe_cache.set(key, [recipe.id for recipe in recipes])
+	return recipes
+
+def invalidate_recipe_cache(selected_items: list[str] | None = None):
+	"""
+	Forget cached recipes for one ingredient selection, or for all of them.
+
+	The recipes themselves are kept; they just stop being reused.
+	"""
+	query = Recipe.query.filter(Recipe.ingredient_key.isnot(None))
+	if selected_items is None:
+		recipe_cache.clear()
+	else:
+		key = recipe_cache_key(selected_items)
+		recipe_cache.invalidate(key)
+		query = query.filter_by(ingredient_key=key)
+	query.update({'ingredient_key': None})
+	db.session.commit()
+
+def match_saved_recipes(selected_items: list[str], limit: int) -> list[tuple[Recipe, RecipeMatch]]:
+	"""
+	Saved recipes the user's pantry covers well enough to be offered instead of asking the model.
+
+	Args:
+		selected_items (List[str]): Names of the picked items; every recipe uses at least one of them.
+		limit (int): Most recipes returned.
+
+	Returns:
+		List[Tuple[Recipe, RecipeMatch]]: Best match first; empty when none covers
+		RECIPE_MATCH_MIN_COVERAGE of its ingredients.
+	"""
+	matches = recipe_matcher.recommend_for_user(current_user.id, selected_items, limit=limit,
+												min_coverage=application.config['RECIPE_MATCH_MIN_COVERAGE'])
+	if not matches:
 		return []
+	found = {recipe.id: recipe for recipe in
+			 with_lines(Recipe.query).filter(Recipe.id.in_([match.recipe_id for match in matches]))}
+	return [(found[match.recipe_id], match) for match in matches if match.recipe_id in found]
+
+@application.route('/api/recipes')
+@login_required
+def recipes_api():
+	"""
+	Saved recipes with a line naming `ingredient` ("milk" finds "2 cups fresh milk"), newest first.
+
+	`mine=1` keeps the recipes the user generated. `page` is 1-based and
+	`next_page` is null on the last page.
+	"""
+	ingredient = request.args.get('ingredient', '').strip()
+	if not ingredient:
+		return jsonify(error='ingredient is required'), 400
+	page = max(request.args.get('page', 1, type=int), 1)
+	per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+	query = recipes_using(ingredient, current_user.id if request.args.get('mine') == '1' else None)
+	recipes = db.session.execute(with_lines(query).offset((page - 1) * per_page).limit(per_page + 1)).scalars().all()
+	return jsonify(page=page, next_page=page + 1 if len(recipes) > per_page else None, recipes=[{
+		'id': recipe.id,
+		'name': recipe.name,
+		'ingredients': recipe.ingredient_list,
+		'url': url_for('recipe', id=recipe.id),
+	} for recipe in recipes[:per_page]])
+
+@application.route('/api/recipes/cookable')
+@login_required
+def cookable_recipes():
+	"""
+	Saved recipes the pantry covers: every named ingredient (staples aside) matches an item in stock and not expired.
+
+	`missing` (0-5, default 0) also returns recipes short of up to that many
+	ingredients, fewest missing first. `mine=1` keeps the recipes the user
+	generated. `page` is 1-based and `next_page` is null on the last page.
+	"""
+	max_missing = min(max(request.args.get('missing', 0, type=int), 0), 5)
+	page = max(request.args.get('page', 1, type=int), 1)
+	per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+	query = recipes_cookable(current_user.id, max_missing, mine=request.args.get('mine') == '1')
+	rows = db.session.execute(with_lines(query).offset((page - 1) * per_page).limit(per_page + 1)).all()
+	return jsonify(page=page, next_page=page + 1 if len(rows) > per_page else None, recipes=[{
+		'id': recipe.id,
+		'name': recipe.name,
+		'ingredients': recipe.ingredient_list,
+		'missing': missing,
+		'url': url_for('recipe', id=recipe.id),
+	} for recipe, missing in rows[:per_page]])
+
+@application.route('/api/recipes/match')
+@login_required
+def recipe_matches():
+	"""
+	Saved recipes ranked by how much of them the pantry covers, items about to expire counting double.
+
+	`ingredients` (repeatable) restricts the results to recipes using one of
+	those items; `limit` is 1-50.
+	"""
+	limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+	return jsonify(recipes=[{
+		**match.to_dict(),
+		'name': recipe.name,
+		'url': url_for('recipe', id=recipe.id),
+	} for recipe, match in match_saved_recipes(request.args.getlist('ingredients'), limit)])
 
 @application.route('/recipes', methods=['GET', 'POST'])
 @login_required
 def recipes():
 	if request.method == 'POST':
 		selected_items = request.form.getlist('ingredients')  # Fetch selected ingredients
-		recipes_data = get_ai_recipe_suggestions(selected_items)  # Call AI model with selected items
-		# Save the recipe to the database
-		# for recipe_data in recipes_data:
-		print('recipes_data', recipes_data)
-		name = recipes_data[0]["name"]
-		ingredients = ', '.join(recipes_data[0]["ingredients"])  # Join ingredients into a string or JSON
-		steps = '\n'.join(recipes_data[0]["steps"])  # Join steps into a string or JSON
-		recipe = Recipe(name=name, ingredients=ingredients, steps=steps)
-		db.session.add(recipe)
-		db.session.commit()
+		refresh = request.form.get('refresh')
+		if refresh:
+			invalidate_recipe_cache(selected_items)
+		key = recipe_cache_key(selected_items)
+		saved = get_cached_recipes(key)
+		if not saved and not refresh:
+			# A saved recipe the pantry covers well is served without a model call
+			saved = [recipe for recipe, _ in match_saved_recipes(selected_items, limit=1)]
+		if not saved:
+			recipes_data = get_ai_recipe_suggestions(selected_items)  # Call AI model with selected items
+			if not recipes_data:
+				flash('No recipe could be generated. Please try again.')
+				return redirect(url_for('recipes'))
+			# Save the recipes to the database
+			saved = [save_recipe(recipe_data, key) for recipe_data in recipes_data]
+			db.session.commit()
+			recipe_cache.set(key, [recipe.id for recipe in saved])
 
-		return redirect(f'recipe/{recipe.id}')
+		return redirect(f'recipe/{saved[0].id}')
 
 	# Group items by category
-	items = PantryItem.query.filter_by(owner=current_user).all()
+	items = PantryItem.query.filter_by(owner=current_user).options(db.raiseload('*')).all()
 	categories = {
 		"Carbs": [],
 		"Fruit + Vegetable": [],
@@ -187,23 +548,124 @@ def recipes():
 
 	return render_template('recipes.html', title='Recipe Suggestion', categories=categories)
 
+@application.route('/recipes/stream', methods=['POST'])
+@login_required
+def recipes_stream():
+	"""Server-Sent Events: one `recipe` event per recipe as soon as it is generated, then `done`."""
+	selected_items = request.form.getlist('ingredients')
+	refresh = request.form.get('refresh')
+	if refresh:
+		invalidate_recipe_cache(selected_items)
+	key = recipe_cache_key(selected_items)
+
+	def event(name, data):
+		return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+	def recipe_event(recipe):
+		return event('recipe', {
+			'id': recipe.id,
+			'name': recipe.name,
+			'ingredients': recipe.ingredient_list,
+			'steps': recipe.step_list,
+			'url': url_for('recipe', id=recipe.id),
+		})
+
+	def generate():
+		cached = get_cached_recipes(key)
+		if not cached and not refresh:
+			cached = [recipe for recipe, _ in match_saved_recipes(selected_items, application.config['RECIPE_MATCH_LIMIT'])]
+		for recipe in cached:
+			yield recipe_event(recipe)
+		if not cached:
+			saved = []
+			for recipe_data in stream_ai_recipe_suggestions(selected_items):
+				recipe = save_recipe(recipe_data, key)
+				db.session.commit()
+				saved.append(recipe.id)
+				yield recipe_event(recipe)
+			if saved:
+				recipe_cache.set(key, saved)
+		yield event('done', {})
+
+	return Response(stream_with_context(generate()), mimetype='text/event-stream',
+					headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _templates_version() -> str:
+	"""Changes whenever a template does, so a deploy invalidates the browsers' copies."""
+	folder = os.path.join(application.root_path, application.template_folder)
+	mtimes = [os.path.getmtime(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names]
+	return str(int(max(mtimes, default=0)))
+
+TEMPLATES_VERSION = _templates_version()
+
+def page_etag(*parts) -> str:
+	"""ETag for a page determined by `parts` (ids, versions, page numbers)."""
+	return hashlib.sha1(repr((TEMPLATES_VERSION,) + parts).encode()).hexdigest()[:20]
+
+def conditional_page(etag: str, last_modified: Optional[datetime], render: Callable[[], str]) -> Response:
+	"""
+	Answer 304 Not Modified when the browser's copy is current, or render the page.
+
+	Args:
+		etag (str): Identifies this version of the page for this user.
+		last_modified (datetime, optional): When the page content last changed, naive UTC.
+		render (Callable[[], str]): Renders the page; only called when the browser needs it.
+
+	Returns:
+		Response: The page, or an empty 304 with the same validators.
+	"""
+	if last_modified is not None:
+		last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+	if request.if_none_match:
+		fresh = request.if_none_match.contains_weak(etag)
+	else:
+		fresh = bool(last_modified and request.if_modified_since and last_modified <= request.if_modified_since)
+	response = Response(status=304) if fresh else make_response(render())
+	response.set_etag(etag, weak=True)
+	if last_modified is not None:
+		response.last_modified = last_modified
+	# Per user, and always revalidated so a pantry change shows up on the next visit
+	response.cache_control.private = True
+	response.cache_control.no_cache = True
+	return response
+
 @application.route('/recipe/<int:id>')
 @login_required
 def recipe(id):
-	recipe = Recipe.query.get_or_404(id)
-	print('recipe', recipe)
-	print(recipe.id, recipe.name)
-	recipe.steps = recipe.steps.split('.')
-	recipe.ingredients = recipe.ingredients.split(',')
-	# suggested_recipes = get_ai_recipe_suggestions([])
-	# recipe = next((r for r in suggested_recipes if r["id"] == id), None)
-	
-	if not recipe:
-		flash("Recipe not found.")
-		print("recipe not found")
-		return redirect(url_for('recipes'))
-	
-	return render_template('recipe.html', recipe=recipe, title=recipe.name)
+	# Recipes never change once generated, so the rendered body is kept by id
+	cached = fragment_cache.get(('recipe', id))
+	if cached is None:
+		recipe = with_lines(Recipe.query).filter_by(id=id).first_or_404()
+		cached = {
+			'title': recipe.name,
+			'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
+			'html': render_template('fragments/recipe.html', recipe=recipe),
+		}
+		fragment_cache.set(('recipe', id), cached)
+	created_at = datetime.fromisoformat(cached['created_at']) if cached['created_at'] else None
+	return conditional_page(page_etag('recipe', id), created_at, lambda: render_template(
+		'recipe.html', recipe_fragment=cached['html'], title=cached['title']))
+
+@application.route('/chat', methods=['GET', 'POST'])
+@login_required
+def chat():
+	if request.method == 'POST':
+		message = (request.get_json(silent=True) or request.form).get('message', '').strip()
+		if not message:
+			return jsonify(error='Message cannot be empty.'), 400
+		try:
+			reply = chat_sessions.send(current_user.id, message)
+		except Exception as e:
+			logger.warning('Error in MasterChef chat: %s', e)
+			return jsonify(error='MasterChef is unavailable. Please try again.'), 502
+		return jsonify(reply=reply)
+	return jsonify(history=chat_sessions.history(current_user.id))
+
+@application.route('/chat/reset', methods=['POST'])
+@login_required
+def chat_reset():
+	chat_sessions.reset(current_user.id)
+	return jsonify(history=[])
 
 @application.route('/account', methods=['GET', 'POST'])
 @login_required
@@ -232,17 +694,70 @@ def account():
 
 	return render_template('account.html', title='Account', form=form)
 
+def get_dashboard(user_id: int, now: datetime | None = None) -> tuple[int, list[PantryItem], list[PantryItem]]:
+	"""
+	Collect the pantry summary shown on the home page.
+
+	The total comes from the user's precomputed PantrySummary row, and the
+	item lists from one range scan on the (user_id, expiration_date) index
+	split into the two buckets. Like the total, the lists leave out items that
+	are used up or out of stock.
+
+	Returns:
+		Tuple[int, List[PantryItem], List[PantryItem]]: Items still in the pantry,
+		items expiring within 7 days (including expired ones), and expired items.
+	"""
+	now = now or datetime.now()
+	total_items = get_summary(user_id).total
+	expiring_items = PantryItem.query.filter(PantryItem.user_id == user_id,
+										  PantryItem.expiration_date <= now + timedelta(days=7),
+										  PantryItem.used.isnot(True), PantryItem.out_of_stock.isnot(True)) \
+		.options(db.selectinload(PantryItem.image_urls)) \
+		.order_by(PantryItem.expiration_date).all()
+	expired_items = [item for item in expiring_items if item.expiration_date < now]
+	return total_items, expiring_items, expired_items
+
 @application.route('/')
 @application.route('/home')
 @login_required
 def home():
-	total_items = PantryItem.query.filter_by(owner=current_user).count()
-	expiring_items = PantryItem.query.filter_by(owner=current_user).filter(PantryItem.expiration_date <= datetime.now() + timedelta(days=7)).all()
-	expired_items = PantryItem.query.filter_by(owner=current_user).filter(PantryItem.expiration_date < datetime.now()).all()
-
-	recipes = Recipe.query.all()
-	
-	return render_template('home.html', total_items=total_items, expiring_items=expiring_items, expired_items=expired_items, recipes=recipes, title='Home')
+	page = max(request.args.get('page', 1, type=int), 1)
+	summary = get_summary(current_user.id)
+	# Recipes are only ever added, so the newest one identifies the state of every page of the list
+	newest_recipe_id, newest_recipe_at = db.session.query(db.func.max(Recipe.id), db.func.max(Recipe.created_at)).one()
+	last_modified = max(filter(None, (summary.updated_at, newest_recipe_at)), default=None)
+	etag = page_etag('home', current_user.id, summary.version, summary.as_of, page, newest_recipe_id)
+
+	def render():
+		return render_template('home.html', pantry_fragment=dashboard_fragment(summary),
+							   recipes_fragment=recipes_fragment(page, newest_recipe_id), title='Home')
+
+	return conditional_page(etag, last_modified, render)
+
+def dashboard_fragment(summary) -> str:
+	"""The pantry part of the dashboard, re-rendered only when the pantry version or the day changes."""
+	key = ('dashboard', summary.user_id, summary.version, summary.as_of.isoformat())
+	html = fragment_cache.get(key)
+	if html is None:
+		total_items, expiring_items, expired_items = get_dashboard(summary.user_id)
+		html = render_template('fragments/dashboard_pantry.html', total_items=total_items,
+							   expiring_items=expiring_items, expired_items=expired_items)
+		fragment_cache.set(key, html)
+	return html
+
+def recipes_fragment(page: int, newest_recipe_id: Optional[int]) -> str:
+	"""One page of the dashboard's recipe list, keyed by the newest recipe."""
+	key = ('recipes', page, newest_recipe_id)
+	html = fragment_cache.get(key)
+	if html is None:
+		per_page = application.config['HOME_RECIPES_PER_PAGE']
+		recipes = Recipe.query.order_by(Recipe.created_at.desc(), Recipe.id.desc()) \
+			.offset((page - 1) * per_page).limit(per_page + 1).all()
+		next_page = page + 1 if len(recipes) > per_page else None
+		html = render_template('fragments/dashboard_recipes.html', recipes=recipes[:per_page],
+							   page=page, next_page=next_page)
+		fragment_cache.set(key, html)
+	return html
 
 application.config['UPLOAD_FOLDER'] = 'app/static/uploads'  # Directory to store the uploaded images
 application.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg'}  # Allowed image file extensions
@@ -253,6 +768,7 @@ def allowed_file(filename):
 	return '.' in filename and filename.rsplit('.', 1)[1].lower() in application.config['ALLOWED_EXTENSIONS']
 
 @application.route('/upload', methods=['GET', 'POST'])
+@login_required
 def upload_image():
 	if not os.path.exists(application.config['UPLOAD_FOLDER']):
 		os.makedirs(application.config['UPLOAD_FOLDER'])
@@ -264,63 +780,99 @@ def upload_image():
 		if file.filename == '':
 			return 'No selected file', 400
 		if file and allowed_file(file.filename):
-			filename = secure_filename(file.filename)
-			filepath = os.path.join(application.config['UPLOAD_FOLDER'], filename)
-			filepath = filepath.replace('\\', '/')
-			file.save(filepath)
-
-			img = PIL.Image.open(filepath)
-			
-			if img.mode == 'RGBA':
-				img = img.convert('RGB')
-
-			if filepath.startswith("food"):
-				filepath = filepath[4:]
-			
-			if(filepath.startswith('app')):
-				filepath = filepath[3:]
-			
-			# Call the AI function to get product information
-			product_info = get_information_products(img)
-			print(product_info)
-			if product_info is None or product_info['expiry_date'] is None:
-				return render_template('upload.html', error='Product information not found. Please try again.')
-			
+			# Phones name every photo alike, so the stem gets a random suffix
+			stem = f"{os.path.splitext(secure_filename(file.filename))[0]}_{secrets.token_hex(4)}"
+			# Streamed to disk, then decoded once into display/thumbnail files and the model input
+			source = os.path.join(application.config['UPLOAD_FOLDER'], f'{stem}.upload')
+			file.save(source)
 			try:
-				product_info['expiry_date'] = datetime.strptime(product_info['expiry_date'], '%Y-%m-%d')
-			except ValueError:
-				product_info['expiry_date'] = None
-	
-			# Save the image with the product's name
-			new_filename = f"{product_info['name'].replace(' ', '_')}.jpg"
-			new_filepath = os.path.join(application.config['UPLOAD_FOLDER'], new_filename)
-			new_filepath = new_filepath.replace('\\', '/')
-			img.save(new_filepath, "JPEG")
-
-			# Save the product information to the database
-			new_item = PantryItem(
-				name= product_info['name'],
-				brand= product_info['brand'],
-				category= product_info['type'],
-				used=False,
-				out_of_stock=False,
-				weight = 120.0,
-				expiration_date= product_info['expiry_date'],
-				calories=520.0,
-				nutrition_content= product_info['nutrition_content'],
-				image_path=new_filepath,
-				user_id=current_user.id
-			)
-			db.session.add(new_item)
-			db.session.commit()
-
-			new_image = FoodImage(image_url=filepath, pantry_item_id=new_item.id)
-			db.session.add(new_image)
-			db.session.commit()
-			
-			return "Successfully Added!"
+				variants = image_pipeline.process(source, application.config['UPLOAD_FOLDER'], stem)
+			except PIL.UnidentifiedImageError:
+				return 'Unreadable image', 400
+			finally:
+				os.remove(source)
+
+			# The Gemini call runs on the analysis workers; the client polls the status URL
+			job = analysis_queue.submit(current_user.id, {'filepath': variants['display'], 'thumbnail': variants['thumbnail']},
+										image=variants['model'])
+			return jsonify(job_id=job.id, status=job.status,
+						   status_url=url_for('upload_status', job_id=job.id)), 202
+		return 'File type not allowed', 400
 	return render_template('upload.html')
 
+@application.route('/upload/batch', methods=['POST'])
+@login_required
+def upload_batch():
+	"""
+	Queue one analysis job for many photos, e.g. when unloading the groceries.
+
+	The photos are preprocessed in parallel and the job sends them to Gemini
+	in batches, one prompt per batch, instead of one request per photo. A
+	photo may show several products. Responds like `/upload`.
+	"""
+	files = [file for file in request.files.getlist('files') if file.filename]
+	if not files:
+		return 'No selected file', 400
+	if len(files) > application.config['BATCH_INTAKE_MAX_FILES']:
+		return f"At most {application.config['BATCH_INTAKE_MAX_FILES']} files per batch", 400
+	if not all(allowed_file(file.filename) for file in files):
+		return 'File type not allowed', 400
+	os.makedirs(application.config['UPLOAD_FOLDER'], exist_ok=True)
+
+	# Phones name every photo alike, so each stem gets a random suffix to keep the batch apart
+	stems = [f"{os.path.splitext(secure_filename(file.filename))[0]}_{secrets.token_hex(4)}" for file in files]
+	# Streamed to disk so the workers are handed paths rather than the photos themselves
+	uploads = [(os.path.join(application.config['UPLOAD_FOLDER'], f'{stem}.upload'), stem) for stem in stems]
+	try:
+		for file, (source, _) in zip(files, uploads):
+			file.save(source)
+		variants = image_pipeline.process_many(uploads, application.config['UPLOAD_FOLDER'])
+	except PIL.UnidentifiedImageError:
+		return 'Unreadable image', 400
+	finally:
+		for source, _ in uploads:
+			if os.path.exists(source):
+				os.remove(source)
+
+	payload = {'images': [{'filepath': variant['display'], 'thumbnail': variant['thumbnail']} for variant in variants]}
+	job = analysis_queue.submit(current_user.id, payload, image=[variant['model'] for variant in variants])
+	return jsonify(job_id=job.id, status=job.status,
+				   status_url=url_for('upload_status', job_id=job.id)), 202
+
+@application.route('/upload/<int:job_id>')
+@login_required
+def upload_status(job_id):
+	job = AnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+	status = job.to_dict()
+	status['items'] = [{'id': item_id, 'url': url_for('food_detail', food_id=item_id)} for item_id in status['items']]
+	return jsonify(status)
+
+@application.route('/api/summary')
+@login_required
+def summary_api():
+	return jsonify(get_summary(current_user.id).to_dict())
+
+@application.route('/cache/stats')
+@login_required
+def cache_stats():
+	return jsonify(products=product_cache.stats(), recipes=recipe_cache.stats(), catalog=product_catalog.stats(),
+				   recipe_matcher=recipe_matcher.stats())
+
+@application.route('/metrics')
+def metrics():
+	"""Prometheus scrape endpoint, off unless METRICS_ENABLED; takes METRICS_TOKEN as a bearer token when set."""
+	if not application.config['METRICS_ENABLED']:
+		return 'Not found', 404
+	token = application.config['METRICS_TOKEN']
+	if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+		return 'Unauthorized', 401, {'WWW-Authenticate': 'Bearer'}
+	return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@application.route('/llm/stats')
+@login_required
+def llm_stats():
+	return jsonify(llm_client.stats())
+
 # @application.route('/uploads/<food_id>')
 # def uploaded_file(food_id):
 #     food = PantryItem.query.filter_by(id = food_id).first()
@@ -0,0 +1,436 @@
+import bisect
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from sqlalchemy import Table, column, delete, event, inspect, literal, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app import application, db
+from app.models import PantryItem, Recipe
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r'[^\W_]+')
+
+MAX_QUERY_TERMS = 16
+
+
+def tokenize(text) -> list[str]:
+    """
+    Casefolded words without accents, split like FTS5's unicode61 tokenizer
+    with remove_diacritics: "Crème Fraîche!" -> ["creme", "fraiche"].
+    """
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return _TOKEN.findall(text.casefold())
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    """A searchable table: the text columns with their bm25 weights, and the column scoping results to a user."""
+
+    model: Any
+    columns: tuple[str, ...]
+    weights: tuple[float, ...]
+    owner: Optional[str] = None
+
+    @property
+    def table(self) -> Table:
+        return self.model.__table__
+
+    @property
+    def fts_name(self) -> str:
+        return f'{self.table.name}_fts'
+
+    @property
+    def fts_columns(self) -> tuple[str, ...]:
+        return ('owner',) * bool(self.owner) + self.columns
+
+
+SOURCES = {
+    'pantry': SearchSource(PantryItem, ('name', 'brand', 'nutrition_content'), (10.0, 4.0, 1.0), owner='user_id'),
+    'recipes': SearchSource(Recipe, ('name', 'ingredients', 'steps'), (10.0, 4.0, 1.0)),
+}
+
+# FTS5 keeps each index in its virtual table and these shadow tables
+FTS5_TABLES = {f'{source.fts_name}{suffix}' for source in SOURCES.values()
+               for suffix in ('', '_data', '_idx', '_content', '_docsize', '_config')}
+
+
+def _not_search_table(object, name, type_, reflected, compare_to):
+    # The FTS5 tables are created by a migration but have no model, so autogenerate must not drop them
+    return not (type_ == 'table' and name in FTS5_TABLES)
+
+
+application.extensions['migrate'].configure_args.setdefault('include_object', _not_search_table)
+
+
+class SearchBackend:
+    """
+    Full-text index over the SOURCES.
+
+    Writes take the connection of the transaction that changed the rows,
+    so the index commits or rolls back with them. `search` returns
+    (id, score) pairs, best first, for documents holding every query term;
+    the last term also matches as a prefix, for search-as-you-type.
+    """
+
+    name = None
+
+    def index(self, connection: Connection, kind: str, where=None):
+        """(Re)index the rows of `kind` matching `where` (a clause on its table; all rows when None)."""
+        raise NotImplementedError
+
+    def remove(self, connection: Connection, kind: str, ids: list[int]):
+        raise NotImplementedError
+
+    def search(self, connection: Connection, kind: str, query: str, owner: Optional[int] = None,
+               limit: int = 20, offset: int = 0) -> list[tuple[int, float]]:
+        raise NotImplementedError
+
+    def rebuild(self, connection: Connection):
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {'backend': self.name}
+
+
+def _terms(query: str) -> list[str]:
+    return tokenize(query)[:MAX_QUERY_TERMS]
+
+
+class FTS5Backend(SearchBackend):
+    """
+    SQLite FTS5 tables next to the indexed ones (`pantry_item_fts`, `recipe_fts`).
+
+    Each row is stored under the id of the row it indexes. Pantry items
+    also carry their owner as a `u<user_id>` token, so a user's search is
+    an intersection inside the index instead of a filter over every
+    user's matches. Prefixes of up to 5 characters are indexed, so the
+    word still being typed is looked up like a whole one. Every match is
+    ranked with bm25, column-weighted like the SOURCES.
+
+    The tables are created by a migration (27fdd50082b4), and by
+    `create_all()` for new databases.
+    """
+
+    name = 'fts5'
+
+    @staticmethod
+    def _fts_table(source: SearchSource):
+        return table(source.fts_name, column('rowid'), *map(column, source.fts_columns))
+
+    @staticmethod
+    def create_tables(target, connection: Connection, **kw):
+        """Create the FTS5 tables alongside the model tables (`after_create` of the metadata)."""
+        if not fts5_available(connection):
+            return
+        for source in SOURCES.values():
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {source.fts_name} USING fts5({', '.join(source.fts_columns)}, "
+                f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5')")
+
+    def setup(self, engine: Engine) -> 'FTS5Backend':
+        """Check that the FTS5 tables exist."""
+        with engine.connect() as connection:
+            tables = set(connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'").scalars())
+        missing = sorted({source.fts_name for source in SOURCES.values()} - tables)
+        if missing and tables:
+            logger.error('Search tables %s are missing; run `flask db upgrade`', ', '.join(missing))
+        return self
+
+    def _insert(self, connection: Connection, source: SearchSource, where):
+        values = [source.table.c.id]
+        if source.owner:
+            values.append(literal('u').op('||')(source.table.c[source.owner]))
+        values += [source.table.c[name] for name in source.columns]
+        rows = select(*values)
+        if where is not None:
+            rows = rows.where(where)
+        fts = self._fts_table(source)
+        connection.execute(fts.insert().prefix_with('OR REPLACE').from_select(list(fts.c), rows))
+
+    def index(self, connection, kind, where=None):
+        self._insert(connection, SOURCES[kind], where)
+
+    def remove(self, connection, kind, ids):
+        fts = self._fts_table(SOURCES[kind])
+        connection.execute(delete(fts).where(fts.c.rowid.in_(ids)))
+
+    @staticmethod
+    def match_expression(source: SearchSource, terms: list[str], owner: Optional[int]) -> str:
+        # Terms are plain words after tokenize(), so quoting them is enough to keep FTS5 syntax out
+        phrases = [f'"{term}"' for term in terms]
+        if len(terms[-1]) > 1:
+            phrases[-1] += '*'
+        if source.owner:
+            phrases.insert(0, f'owner : "u{int(owner or 0)}"')
+        return ' AND '.join(phrases)
+
+    def search(self, connection, kind, query, owner=None, limit=20, offset=0):
+        terms = _terms(query)
+        if not terms:
+            return []
+        source = SOURCES[kind]
+        weights = ', '.join(map(str, (0.0,) * bool(source.owner) + source.weights))
+        rows = connection.execute(text(
+            f'SELECT rowid, bm25({source.fts_name}, {weights}) AS score FROM {source.fts_name} '
+            f'WHERE {source.fts_name} MATCH :expression ORDER BY score, rowid DESC LIMIT :limit OFFSET :offset'),
+            {'expression': self.match_expression(source, terms, owner), 'limit': limit, 'offset': offset})
+        # bm25() is lower for better matches
+        return [(row_id, -score) for row_id, score in rows]
+
+    def rebuild(self, connection):
+        for source in SOURCES.values():
+            connection.execute(delete(self._fts_table(source)))
+            self._insert(connection, source, None)
+
+
+class _InvertedIndex:
+    """Postings of one source: (owner, term) -> {document id: weighted term frequency}."""
+
+    def __init__(self):
+        self.postings: dict[tuple[int, str], dict[int, float]] = defaultdict(dict)
+        self.documents: dict[int, tuple[int, list[tuple[int, str]], float]] = {}  # id -> (owner, keys, length)
+        self.total_length = 0.0
+        self._keys: Optional[list[tuple[int, str]]] = None  # sorted, for prefix lookups
+
+    def add(self, doc_id: int, owner: int, fields: list[tuple[float, Optional[str]]]):
+        self.remove(doc_id)
+        frequencies: dict[tuple[int, str], float] = defaultdict(float)
+        length = 0
+        for weight, value in fields:
+            terms = tokenize(value)
+            length += len(terms)
+            for term in terms:
+                frequencies[owner, term] += weight
+        for key, frequency in frequencies.items():
+            self.postings[key][doc_id] = frequency
+        self.documents[doc_id] = (owner, list(frequencies), length)
+        self.total_length += length
+        self._keys = None
+
+    def remove(self, doc_id: int):
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+        for key in document[1]:
+            postings = self.postings[key]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[key]
+        self.total_length -= document[2]
+        self._keys = None
+
+    def expand(self, owner: int, prefix: str) -> list[tuple[int, str]]:
+        if self._keys is None:
+            self._keys = sorted(self.postings)
+        start = bisect.bisect_left(self._keys, (owner, prefix))
+        end = bisect.bisect_left(self._keys, (owner, prefix + '\U0010ffff'))
+        return self._keys[start:end]
+
+    def search(self, owner: int, terms: list[str], limit: int, offset: int) -> list[tuple[int, float]]:
+        """BM25 (k1=1.2, b=0.75) over the documents containing every term."""
+        count = len(self.documents)
+        if not count:
+            return []
+        average_length = self.total_length / count or 1.0
+        scores: Optional[dict[int, float]] = None
+        for position, term in enumerate(terms):
+            prefix = position == len(terms) - 1 and len(term) > 1
+            keys = self.expand(owner, term) if prefix else [(owner, term)]
+            term_scores: dict[int, float] = {}
+            for key in keys:
+                postings = self.postings.get(key, {})
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, frequency in postings.items():
+                    if scores is not None and doc_id not in scores:
+                        continue
+                    length = self.documents[doc_id][2]
+                    score = idf * frequency * 2.2 / (frequency + 1.2 * (0.25 + 0.75 * length / average_length))
+                    term_scores[doc_id] = max(term_scores.get(doc_id, 0.0), score)
+            scores = term_scores if scores is None else {
+                doc_id: scores[doc_id] + score for doc_id, score in term_scores.items()}
+            if not scores:
+                return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+
+class MemoryBackend(SearchBackend):
+    """
+    Pure-Python inverted index, for databases without FTS5 (e.g. Postgres).
+
+    The index lives in the process: it is loaded from the database on the
+    first search, and writes are staged on their connection and applied
+    when it commits (dropped on rollback). Other processes' writes are
+    only seen after `rebuild()`, so this suits single-process deployments.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._indexes: Optional[dict[str, _InvertedIndex]] = None
+        self._lock = threading.RLock()
+
+    def attach(self, engine: Engine) -> 'MemoryBackend':
+        event.listen(engine, 'commit', self._committed)
+        event.listen(engine, 'rollback', lambda connection: connection.info.pop('search_pending', None))
+        return self
+
+    @staticmethod
+    def _fetch(connection: Connection, source: SearchSource, where) -> list[tuple[int, int, list]]:
+        owner = source.table.c[source.owner] if source.owner else literal(0)
+        rows = select(source.table.c.id, owner, *[source.table.c[name] for name in source.columns])
+        if where is not None:
+            rows = rows.where(where)
+        return [(row[0], row[1] or 0, list(zip(source.weights, row[2:]))) for row in connection.execute(rows)]
+
+    def _load(self, connection: Connection) -> dict[str, _InvertedIndex]:
+        with self._lock:
+            if self._indexes is None:
+                indexes = {}
+                for kind, source in SOURCES.items():
+                    indexes[kind] = _InvertedIndex()
+                    for doc_id, owner, fields in self._fetch(connection, source, None):
+                        indexes[kind].add(doc_id, owner, fields)
+                self._indexes = indexes
+            return self._indexes
+
+    def _committed(self, connection: Connection):
+        pending = connection.info.pop('search_pending', None)
+        if not pending or self._indexes is None:
+            return  # not loaded yet: the first search reads the committed rows
+        with self._lock:
+            for kind, documents, removed in pending:
+                for doc_id in removed:
+                    self._indexes[kind].remove(doc_id)
+                for doc_id, owner, fields in documents:
+                    self._indexes[kind].add(doc_id, owner, fields)
+
+    def index(self, connection, kind, where=None):
+        if self._indexes is not None:
+            documents = self._fetch(connection, SOURCES[kind], where)
+            connection.info.setdefault('search_pending', []).append((kind, documents, []))
+
+    def remove(self, connection, kind, ids):
+        if self._indexes is not None:
+            connection.info.setdefault('search_pending', []).append((kind, [], list(ids)))
+
+    def search(self, connection, kind, query, owner=None, limit=20, offset=0):
+        terms = _terms(query)
+        if not terms:
+            return []
+        index = self._load(connection)[kind]
+        with self._lock:
+            return index.search(owner or 0, terms, limit, offset)
+
+    def rebuild(self, connection):
+        with self._lock:
+            self._indexes = None
+            self._load(connection)
+
+    def stats(self) -> dict:
+        indexes = self._indexes or {}
+        return {'backend': self.name, **{kind: len(index.documents) for kind, index in indexes.items()}}
+
+
+def fts5_available(bind) -> bool:
+    """Whether the database behind an engine or connection is SQLite built with FTS5."""
+    if bind.dialect.name != 'sqlite':
+        return False
+    if isinstance(bind, Connection):
+        return 'ENABLE_FTS5' in bind.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    with bind.connect() as connection:
+        return fts5_available(connection)
+
+
+def build_search_backend(config, engine: Engine) -> SearchBackend:
+    """'fts5', 'memory', or 'auto': FTS5 when the database is SQLite built with it."""
+    backend = config['SEARCH_BACKEND']
+    if backend == 'auto':
+        backend = 'fts5' if fts5_available(engine) else 'memory'
+    if backend == 'fts5':
+        return FTS5Backend().setup(engine)
+    if backend == 'memory':
+        return MemoryBackend().attach(engine)
+    raise ValueError(f"Unknown search backend: {config['SEARCH_BACKEND']}")
+
+
+with application.app_context():
+    search_index = build_search_backend(application.config, db.engine)
+if search_index.name == 'fts5':
+    event.listen(db.metadata, 'after_create', FTS5Backend.create_tables)
+
+
+def search_documents(kind: str, query: str, owner: Optional[int] = None, page: int = 1,
+                     per_page: int = 20) -> tuple[list[tuple[Any, float]], bool]:
+    """
+    One page of ranked search results.
+
+    Args:
+        kind (str): 'pantry' (needs `owner`) or 'recipes'.
+        query (str): What the user typed.
+        owner (int, optional): User whose pantry is searched.
+        page (int): 1-based page number.
+        per_page (int): Results per page.
+
+    Returns:
+        Tuple[List[Tuple[Model, float]], bool]: The rows with their scores, best first, and
+        whether there is a next page.
+    """
+    source = SOURCES[kind]
+    connection = db.session.connection()
+    hits = search_index.search(connection, kind, query, owner, limit=per_page + 1, offset=(page - 1) * per_page)
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+    if not hits:
+        return [], False
+    rows = db.session.execute(select(source.model).where(source.model.id.in_([doc_id for doc_id, _ in hits]))
+                              .options(db.raiseload('*'))).scalars()
+    by_id = {row.id: row for row in rows}
+    return [(by_id[doc_id], score) for doc_id, score in hits if doc_id in by_id], has_next
+
+
+def _changed(target, source: SearchSource) -> bool:
+    state = inspect(target)
+    names = source.columns + ((source.owner,) if source.owner else ())
+    return any(state.attrs[name].history.has_changes() for name in names)
+
+
+@event.listens_for(Session, 'after_flush')
+def _documents_flushed(session, flush_context):
+    """Reindex the pantry items and recipes written by a flush, in its transaction."""
+    changed, removed = defaultdict(set), defaultdict(set)
+    for kind, source in SOURCES.items():
+        for target in session.new:
+            if isinstance(target, source.model):
+                changed[kind].add(target.id)
+        for target in session.dirty:
+            if isinstance(target, source.model) and _changed(target, source):
+                changed[kind].add(target.id)
+        for target in session.deleted:
+            if isinstance(target, source.model):
+                removed[kind].add(target.id)
+    if not changed and not removed:
+        return
+    connection = session.connection()
+    for kind, ids in removed.items():
+        search_index.remove(connection, kind, sorted(ids))
+    for kind, ids in changed.items():
+        search_index.index(connection, kind, SOURCES[kind].table.c.id.in_(sorted(ids)))
+
+
+@application.cli.command('search-reindex')
+def search_reindex_command():
+    """Rebuild the full-text search index from the pantry and recipe tables."""
+    with db.engine.begin() as connection:
+        search_index.rebuild(connection)
+    print(f"Rebuilt the {search_index.name} search index.")
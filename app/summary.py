@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import socket
+import threading
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app import application, db
+from app.models import PantryItem, PantrySummary, SummaryRollover
+
+logger = logging.getLogger(__name__)
+
+summary_table = PantrySummary.__table__
+item_table = PantryItem.__table__
+rollover_table = SummaryRollover.__table__
+
+# Columns whose changes move an item between summary buckets
+TRACKED_COLUMNS = ('user_id', 'used', 'out_of_stock', 'category', 'expiration_date')
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is not None and not isinstance(value, datetime):
+        return datetime.combine(value, time.min)
+    return value
+
+
+def expiry_status(expiration: datetime, today: date) -> str:
+    """Red/Yellow/Green bucket of an expiry date, as in `Food_Management.expiry_status`."""
+    days_left = (expiration.date() - today).days
+    if days_left < 0:
+        return 'red'  # expired
+    elif days_left <= 3:
+        return 'yellow'  # expiring soon
+    return 'green'  # long shelf life
+
+
+def _contribution(used, out_of_stock, category, expiration) -> list[tuple[str, datetime]]:
+    """What an item adds to its owner's summary: nothing once it is used or out of stock."""
+    if used or out_of_stock or expiration is None:
+        return []
+    return [(category, _as_datetime(expiration))]
+
+
+def compute_summary(rows, today: date) -> dict:
+    """Summary column values for an iterable of active (category, expiration_date) rows."""
+    values = {'red': 0, 'yellow': 0, 'green': 0, 'next_expiry': None, 'as_of': today}
+    categories = {}
+    for category, expiration in rows:
+        expiration = _as_datetime(expiration)
+        values[expiry_status(expiration, today)] += 1
+        categories[category] = categories.get(category, 0) + 1
+        if expiration.date() >= today and (values['next_expiry'] is None or expiration < values['next_expiry']):
+            values['next_expiry'] = expiration
+    values['category_counts'] = json.dumps(categories, sort_keys=True)
+    return values
+
+
+def _active(query):
+    return query.where(item_table.c.used.isnot(True), item_table.c.out_of_stock.isnot(True))
+
+
+def rebuild_summary(connection, user_id: int, today: Optional[date] = None):
+    """Recompute one user's summary row from the pantry."""
+    today = today or date.today()
+    rows = connection.execute(_active(
+        select(item_table.c.category, item_table.c.expiration_date).where(item_table.c.user_id == user_id)))
+    values = compute_summary(rows, today)
+    updated = connection.execute(summary_table.update().where(summary_table.c.user_id == user_id).values(
+        version=summary_table.c.version + 1, updated_at=datetime.utcnow(), **values)).rowcount
+    if not updated:
+        connection.execute(summary_table.insert().values(user_id=user_id, updated_at=datetime.utcnow(), **values))
+
+
+def bump_version(connection, user_ids):
+    """Mark the users' pantries as changed, so pages cached for the old version are re-rendered."""
+    connection.execute(summary_table.update().where(summary_table.c.user_id.in_(user_ids)).values(
+        version=summary_table.c.version + 1, updated_at=datetime.utcnow()))
+
+
+def apply_delta(connection, user_id: int, removed: list, added: list):
+    """
+    Update a user's summary for items leaving (`removed`) and entering (`added`) it.
+
+    Rows that are missing or from a previous day are
+    rebuilt instead, since every bucket may have shifted.
+    """
+    if user_id is None or not (removed or added):
+        return
+    today = date.today()
+    row = connection.execute(
+        select(summary_table).where(summary_table.c.user_id == user_id).with_for_update()).first()
+    if row is None or row.as_of != today:
+        rebuild_summary(connection, user_id, today)
+        return
+
+    counts = {'red': row.red, 'yellow': row.yellow, 'green': row.green}
+    categories = json.loads(row.category_counts)
+    next_expiry = row.next_expiry
+    recompute_next = False
+    for category, expiration in removed:
+        counts[expiry_status(expiration, today)] -= 1
+        categories[category] = categories.get(category, 0) - 1
+        if categories[category] <= 0:
+            del categories[category]
+        if next_expiry is not None and expiration == next_expiry:
+            recompute_next = True
+    for category, expiration in added:
+        counts[expiry_status(expiration, today)] += 1
+        categories[category] = categories.get(category, 0) + 1
+        if expiration.date() >= today and (next_expiry is None or expiration < next_expiry):
+            next_expiry = expiration
+    if recompute_next:
+        # Served by the (user_id, expiration_date) index
+        next_expiry = connection.execute(_active(
+            select(func.min(item_table.c.expiration_date)).where(
+                item_table.c.user_id == user_id,
+                item_table.c.expiration_date >= datetime.combine(today, time.min)))).scalar()
+
+    connection.execute(summary_table.update().where(summary_table.c.user_id == user_id).values(
+        category_counts=json.dumps(categories, sort_keys=True), next_expiry=next_expiry, **counts))
+
+
+def _updated_contributions(target):
+    """
+    Return (previous user_id, removed, added) for a modified item, or None if
+    no tracked column changed. `removed` is None when the old values are
+    unknown because a column was overwritten without being loaded first.
+    """
+    state = inspect(target)
+    if not any(state.attrs[name].history.has_changes() for name in TRACKED_COLUMNS):
+        return None
+    old = {}
+    for name in TRACKED_COLUMNS:
+        history = state.attrs[name].history
+        if history.added and not history.deleted:
+            return target.user_id, None, []
+        old[name] = history.deleted[0] if history.deleted else getattr(target, name)
+    removed = _contribution(old['used'], old['out_of_stock'], old['category'], old['expiration_date'])
+    added = _contribution(target.used, target.out_of_stock, target.category, target.expiration_date)
+    return old['user_id'], removed, added
+
+
+@event.listens_for(Session, 'after_flush')
+def _pantry_flushed(session, flush_context):
+    """
+    Fold the pantry items written by a flush into their owners' summaries.
+
+    Deltas are gathered for the whole flush and applied once per user, so a
+    batch of inserts that triggers a rebuild is not counted twice. The
+    summary is written on the flush's connection and commits or rolls back
+    with the items.
+
+    Every owner with an item in the flush also gets a new pantry version,
+    including for changes the summary does not count (names, used items).
+    """
+    deltas: dict[int, tuple[list, list]] = {}
+    rebuild = set()
+    touched = {target.user_id for target in (*session.new, *session.dirty, *session.deleted)
+               if isinstance(target, PantryItem)}
+
+    def delta(user_id):
+        return deltas.setdefault(user_id, ([], []))
+
+    for target in session.new:
+        if isinstance(target, PantryItem):
+            delta(target.user_id)[1].extend(_contribution(
+                target.used, target.out_of_stock, target.category, target.expiration_date))
+    for target in session.dirty:
+        if isinstance(target, PantryItem):
+            change = _updated_contributions(target)
+            if change is None:
+                continue
+            old_user_id, removed, added = change
+            if removed is None:
+                rebuild.add(target.user_id)
+                continue
+            delta(old_user_id)[0].extend(removed)
+            delta(target.user_id)[1].extend(added)
+    for target in session.deleted:
+        if isinstance(target, PantryItem):
+            delta(target.user_id)[0].extend(_contribution(
+                target.used, target.out_of_stock, target.category, target.expiration_date))
+
+    if not touched:
+        return
+    connection = session.connection()
+    for user_id in rebuild - {None}:
+        rebuild_summary(connection, user_id)
+    for user_id, (removed, added) in deltas.items():
+        if user_id not in rebuild:
+            apply_delta(connection, user_id, removed, added)
+    # rebuild_summary already bumped the version of the users it rebuilt
+    changed = (touched | set(deltas)) - rebuild - {None}
+    if changed:
+        bump_version(connection, changed)
+
+
+def get_summary(user_id: int) -> PantrySummary:
+    """Return a user's up-to-date summary row, rebuilding it if it is missing or stale."""
+    rollover.start()
+    today = date.today()
+    summary = db.session.get(PantrySummary, user_id)
+    if summary is None or summary.as_of != today:
+        rebuild_summary(db.session.connection(), user_id, today)
+        db.session.commit()
+        summary = db.session.get(PantrySummary, user_id, populate_existing=True)
+    return summary
+
+
+def rollover_summaries(today: Optional[date] = None, batch_size: int = 500) -> int:
+    """
+    Recompute the summaries not yet computed for a new day.
+
+    Users are rebuilt in batches of `batch_size`, each committed on its own,
+    so the rollover never holds the write lock for long and a run that
+    stops part way resumes where it left off.
+
+    Returns:
+        int: The number of users updated.
+    """
+    today = today or date.today()
+    updated = 0
+    last_id = 0
+    while True:
+        with db.engine.begin() as connection:
+            user_ids = connection.execute(
+                select(summary_table.c.user_id)
+                .where(summary_table.c.user_id > last_id, summary_table.c.as_of < today)
+                .order_by(summary_table.c.user_id).limit(batch_size)).scalars().all()
+            for user_id in user_ids:
+                rebuild_summary(connection, user_id, today)
+        if not user_ids:
+            return updated
+        updated += len(user_ids)
+        last_id = user_ids[-1]
+
+
+def claim_rollover(today: date) -> bool:
+    """Record that this process runs the rollover for `today`; False if another process already does."""
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(rollover_table.insert().values(
+                day=today, owner=f'{socket.gethostname()}:{os.getpid()}'[:64], started_at=datetime.utcnow()))
+    except IntegrityError:
+        return False
+    return True
+
+
+class MidnightRollover:
+    """
+    Daemon thread that runs `rollover_summaries` just after every midnight.
+
+    Every worker process runs one, but only the process that claims the day
+    in `summary_rollover` does the work. If it dies part way, the remaining
+    summaries are still rebuilt by `get_summary()` when their users next
+    load a page.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='summary-rollover', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            now = datetime.now()
+            midnight = datetime.combine(now.date() + timedelta(days=1), time.min)
+            if self._stop.wait((midnight - now).total_seconds() + 1):
+                return
+            today = date.today()
+            with self.app.app_context():
+                try:
+                    if claim_rollover(today):
+                        rollover_summaries(today)
+                        with db.engine.begin() as connection:
+                            connection.execute(rollover_table.update().where(rollover_table.c.day == today)
+                                               .values(finished_at=datetime.utcnow()))
+                except Exception:
+                    logger.exception('Error rolling over pantry summaries')
+
+
+rollover = MidnightRollover(application)
+
+
+@application.cli.command('rollover-summaries')
+def rollover_summaries_command():
+    """Recompute all pantry summaries for today (for cron instead of the in-process thread)."""
+    print(f"Rolled over {rollover_summaries()} pantry summaries.")
@@ -0,0 +1,96 @@
+"""
+Benchmark batch intake (/upload/batch) against one /upload per photo.
+
+The Gemini calls are replaced by a fake that sleeps for a fixed per-request
+latency plus a small per-image cost, which is what dominates real intake.
+Each run uploads the same photos through the test client and waits until
+the analysis workers have stored every item.
+
+Usage:
+    python benchmarks/batch_intake.py [--photos 24] [--latency 2.0] [--per-image 0.05]
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_photos(n):
+    import PIL.Image
+    photos = []
+    for i in range(n):
+        buffer = io.BytesIO()
+        PIL.Image.new('RGB', (3024, 4032), (i * 7 % 256, 120, 60)).save(buffer, 'JPEG', quality=90)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def fake_models(latency, per_image):
+    def product(index):
+        return {'image': index, 'name': 'item', 'brand': None, 'type': 'Protein',
+                'expiry_date': '2030-01-01', 'nutrition_content': None}
+
+    def analyze(img):
+        time.sleep(latency + per_image)
+        return product(0)
+
+    def analyze_batch(images):
+        time.sleep(latency + per_image * len(images))
+        return [product(index) for index in range(len(images))]
+
+    return analyze, analyze_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--photos', type=int, default=24)
+    parser.add_argument('--latency', type=float, default=2.0, help='seconds per model request')
+    parser.add_argument('--per-image', type=float, default=0.05, help='extra seconds per image in a request')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='batch-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    from app import application, db
+    from app.jobs import analysis_queue
+    from app.models import User
+
+    application.config.update(WTF_CSRF_ENABLED=False, UPLOAD_FOLDER=os.path.join(workdir, 'uploads'))
+    analysis_queue.analyze, analysis_queue.analyze_batch = fake_models(args.latency, args.per_image)
+    with application.app_context():
+        db.create_all()
+        user = User(username='bench')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+
+    client = application.test_client()
+    client.post('/login', data={'username': 'bench', 'password': 'bench'})
+    photos = make_photos(args.photos)
+
+    start = time.perf_counter()
+    for i, photo in enumerate(photos):
+        client.post('/upload', data={'file': (io.BytesIO(photo), f'photo{i}.jpg')}, content_type='multipart/form-data')
+    analysis_queue.join()
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    client.post('/upload/batch', data={'files': [(io.BytesIO(photo), f'photo{i}.jpg') for i, photo in enumerate(photos)]},
+                content_type='multipart/form-data')
+    analysis_queue.join()
+    batch = time.perf_counter() - start
+
+    print(f"{args.photos} photos, {application.config['ANALYSIS_WORKERS']} analysis workers, "
+          f"batches of {application.config['BATCH_INTAKE_SIZE']} x {application.config['BATCH_INTAKE_CONCURRENCY']} concurrent")
+    print(f"{'':8}{'total':>10}{'per item':>12}")
+    for label, seconds in (('upload', single), ('batch', batch)):
+        print(f"{label:8}{seconds:>9.2f}s{seconds / args.photos * 1000:>10.0f}ms")
+    print(f"speedup: {single / batch:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
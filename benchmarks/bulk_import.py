@@ -0,0 +1,130 @@
+"""
+Benchmark the bulk pantry importer and exporter on a large generated catalog.
+
+Writes `--rows` catalog rows shaped like ingredient.xlsx ("400g",
+"968 kcal", mixed category spellings, an image URL on every `--image-every`
+rows) to a CSV and a JSONL file, imports each into a fresh SQLite database
+with `import_items()`, then streams the pantry back out with
+`export_csv()`. Reports rows per second and the peak memory traced while
+importing and exporting.
+
+Usage:
+    python benchmarks/bulk_import.py [--rows 1000000] [--chunk-size 5000] [--image-every 10]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PRODUCTS = [
+    ('Pork Collar Shabu Shabu', 'Superpork', 'Proteins', '400g', '968 kcal'),
+    ('Chinese Spinach', 'Chef', 'Vegetable', '200g', '46 kcal'),
+    ('Holland Potato', 'China', 'Vegetable', '1kg', '770 kcal'),
+    ('Yellow Noodles', 'LG Noodles', 'Carbohydrate', '1kg', '1400 kcal'),
+    ('Muscat Grapes', 'China Shine', 'Fruit', '500g', '340 kcal'),
+    ('Butter', 'Anchor', 'Fats', '250 g', '1800 kcal'),
+]
+COLUMNS = ['name', 'brand', 'category', 'weight', 'calories', 'nutritional_content', 'image_url', 'expiration_date']
+
+
+def catalog_rows(count, image_every):
+    rng = random.Random(42)
+    for i in range(count):
+        name, brand, category, weight, calories = rng.choice(PRODUCTS)
+        yield {
+            'name': f'{name} {i}',
+            'brand': brand,
+            'category': category,
+            'weight': weight,
+            'calories': calories,
+            'nutritional_content': 'Protein: 20g , Fat: 5g',
+            'image_url': f'https://example.com/{i}.jpg' if i % image_every == 0 else '',
+            'expiration_date': f'2027-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+        }
+
+
+def write_files(workdir, rows, image_every):
+    csv_path, jsonl_path = os.path.join(workdir, 'catalog.csv'), os.path.join(workdir, 'catalog.jsonl')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, COLUMNS)
+        writer.writeheader()
+        writer.writerows(catalog_rows(rows, image_every))
+    with open(jsonl_path, 'w', encoding='utf-8') as f:
+        for row in catalog_rows(rows, image_every):
+            f.write(json.dumps(row) + '\n')
+    return {'csv': csv_path, 'jsonl': jsonl_path}
+
+
+def traced(func):
+    """Run `func`, returning its result, the seconds it took and the peak traced memory in MB."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--image-every', type=int, default=10, help='one row in N has an image URL')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report peak memory (tracemalloc slows everything down)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bulk-bench-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'NOTIFICATIONS_ENABLED': '0',
+    })
+    from app import application, db
+    from app.bulk import READERS, export_csv, import_items
+    from app.models import User
+
+    start = time.perf_counter()
+    paths = write_files(workdir, args.rows, args.image_every)
+    print(f"wrote {args.rows} rows as CSV and JSONL in {time.perf_counter() - start:.1f}s")
+    measure = traced if args.trace_memory else timed
+
+    print(f"{'':14}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'peak MB':>10}")
+    with application.app_context():
+        db.create_all()
+        for fmt, path in paths.items():
+            # One user per format; the second import goes into an already large table
+            user = User(username=fmt, password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+
+            def run_import():
+                with open(path, 'rb') as stream:
+                    return import_items(READERS[fmt](stream), user.id, chunk_size=args.chunk_size)
+
+            result, seconds, peak = measure(run_import)
+            print(f"{'import ' + fmt:14}{result.imported:>10}{seconds:>10.1f}"
+                  f"{result.imported / seconds:>10.0f}{peak:>10.1f}")
+
+        size, seconds, peak = measure(lambda: sum(len(chunk) for chunk in export_csv(user.id)))
+        print(f"{'export csv':14}{result.imported:>10}{seconds:>10.1f}{result.imported / seconds:>10.0f}"
+              f"{peak:>10.1f}   ({size / 2 ** 20:.0f} MB)")
+
+
+def timed(func):
+    """Like `traced`, without the memory tracing overhead (peak is NaN)."""
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start, float('nan')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark product catalog lookups.
+
+Builds a `ProductCatalog` over `--products` generated product names
+("Organic Chicken Breast 12", ...) and times, with the per-query result
+cache disabled so every lookup walks the trigram index:
+
+- search: autocomplete prefixes of catalog names ("organic chi")
+- match: full names with one typo, as read off a label ("Organc Chicken Breast 12")
+
+Reports lookups per second and how often the typo'd name matched the
+product it was made from.
+
+Usage:
+    python benchmarks/catalog.py [--products 20000] [--lookups 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADJECTIVES = ['Organic', 'Fresh', 'Frozen', 'Smoked', 'Whole', 'Sliced', 'Low Fat', 'Premium', 'Baby', 'Wild']
+FOODS = ['Chicken Breast', 'Milk', 'Spinach', 'Salmon Fillet', 'Brown Rice', 'Yellow Noodles', 'Greek Yoghurt',
+         'Butter', 'Potato', 'Tomato', 'Cheddar Cheese', 'Pork Collar', 'Broccoli', 'Grapes', 'Tofu']
+BRANDS = ['Meiji', 'Anchor', 'Chef', 'Superpork', 'Marigold', None]
+
+
+def catalog(count):
+    from app.catalog import Product
+    rng = random.Random(42)
+    return [Product(name=f'{rng.choice(ADJECTIVES)} {rng.choice(FOODS)} {i}', brand=rng.choice(BRANDS),
+                    category='Protein', weight=float(rng.randint(100, 1000)), calories=float(rng.randint(50, 2000)))
+            for i in range(count)]
+
+
+def typo(name, rng):
+    position = rng.randrange(len(name))
+    return name[:position] + name[position + 1:]
+
+
+def rate(func, queries):
+    start = time.perf_counter()
+    results = [func(query) for query in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20_000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='catalog-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    from app.catalog import ProductCatalog
+
+    products = catalog(args.products)
+    product_catalog = ProductCatalog(lambda: products, cache_size=0)
+    start = time.perf_counter()
+    index = product_catalog.index()
+    print(f"built {len(index.products)} products, {len(index.postings)} trigrams in {time.perf_counter() - start:.2f}s")
+
+    rng = random.Random(7)
+    targets = [rng.choice(products) for _ in range(args.lookups)]
+    prefixes = [product.name[:rng.randint(3, len(product.name))] for product in targets]
+    _, search_rate = rate(lambda query: product_catalog.search(query, limit=10), prefixes)
+    labels = [typo(product.name, rng) for product in targets]
+    matched, match_rate = rate(product_catalog.match, labels)
+    correct = sum(found is not None and found.name == product.name for found, product in zip(matched, targets))
+
+    print(f"{'':8}{'lookups/s':>12}")
+    print(f"{'search':8}{search_rate:>12.0f}")
+    print(f"{'match':8}{match_rate:>12.0f}   ({correct / len(targets):.0%} matched the right product)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Benchmark the home dashboard queries before and after the composite indexes.
+
+Seeds a throwaway SQLite database (100k pantry items across 1k users by
+default) and times, per user:
+
+- before: the original three pantry queries plus `Recipe.query.all()`,
+  without the (user_id, expiration_date) / (user_id, category) indexes
+- after: `get_dashboard()` plus one page of recipes, with the indexes
+
+Usage:
+    python benchmarks/dashboard.py [--users 1000] [--items 100000] [--recipes 5000] [--samples 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+INDEXES = {
+    'ix_pantry_item_user_id_expiration_date': '(user_id, expiration_date)',
+    'ix_pantry_item_user_id_category': '(user_id, category)',
+}
+
+
+def seed(db, users, items, recipes):
+    from app.models import User, PantryItem, Recipe
+    rng = random.Random(42)
+    now = datetime.now()
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'password_hash': 'x'} for i in range(1, users + 1)
+    ])
+    db.session.execute(db.insert(PantryItem), [{
+        'user_id': rng.randint(1, users),
+        'name': f'item {i}',
+        'category': rng.choice(CATEGORIES),
+        'used': False,
+        'out_of_stock': False,
+        'expiration_date': now + timedelta(days=rng.randint(-30, 60)),
+        'added_date': now,
+    } for i in range(items)])
+    db.session.execute(db.insert(Recipe), [{
+        'name': f'recipe {i}',
+        'ingredients': 'rice, milk',
+        'steps': 'cook\neat',
+        'created_at': now - timedelta(minutes=i),
+    } for i in range(recipes)])
+    db.session.commit()
+
+
+def legacy_dashboard(user_id):
+    """The query pattern `home()` used before the indexes were added."""
+    from app.models import PantryItem, Recipe
+    total_items = PantryItem.query.filter_by(user_id=user_id).count()
+    expiring_items = PantryItem.query.filter_by(user_id=user_id).filter(PantryItem.expiration_date <= datetime.now() + timedelta(days=7)).all()
+    expired_items = PantryItem.query.filter_by(user_id=user_id).filter(PantryItem.expiration_date < datetime.now()).all()
+    recipes = Recipe.query.all()
+    return total_items, expiring_items, expired_items, recipes
+
+
+def dashboard(user_id, per_page):
+    from app.models import Recipe
+    from app.routes import get_dashboard
+    total_items, expiring_items, expired_items = get_dashboard(user_id)
+    recipes = Recipe.query.order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(per_page + 1).all()
+    return total_items, expiring_items, expired_items, recipes
+
+
+def measure(db, func, user_ids):
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        func(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+        # Each page view starts with an empty identity map
+        db.session.remove()
+    timings.sort()
+    return {
+        'mean_ms': statistics.fmean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[int(len(timings) * 0.95)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--recipes', type=int, default=5000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='dashboard-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    from app import application, db
+
+    with application.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.users, args.items, args.recipes)
+        print(f"seeded {args.items} items / {args.users} users / {args.recipes} recipes "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        user_ids = random.Random(7).choices(range(1, args.users + 1), k=args.samples)
+        per_page = application.config['HOME_RECIPES_PER_PAGE']
+
+        for name in INDEXES:
+            db.session.execute(db.text(f'DROP INDEX {name}'))
+        db.session.commit()
+        before = measure(db, legacy_dashboard, user_ids)
+
+        for name, columns in INDEXES.items():
+            db.session.execute(db.text(f'CREATE INDEX {name} ON pantry_item {columns}'))
+        db.session.execute(db.text('ANALYZE'))
+        db.session.commit()
+        after = measure(db, lambda user_id: dashboard(user_id, per_page), user_ids)
+
+    print(f"{'':8}{'mean':>10}{'p50':>10}{'p95':>10}")
+    for label, result in (('before', before), ('after', after)):
+        print(f"{label:8}{result['mean_ms']:>8.2f}ms{result['p50_ms']:>8.2f}ms{result['p95_ms']:>8.2f}ms")
+    print(f"speedup (mean): {before['mean_ms'] / after['mean_ms']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
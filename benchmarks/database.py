@@ -0,0 +1,154 @@
+"""
+Benchmark mixed read/write throughput on SQLite with and without the tuning.
+
+Seeds a throwaway database with the app's schema, then runs `--readers`
+threads loading a user's expiring items (the home dashboard query) and
+`--writers` threads adding one pantry item per transaction, each for
+`--duration` seconds, against two engines on copies of the same file:
+
+- default: rollback journal, synchronous=FULL, SQLAlchemy's default pool
+  and pysqlite's 5 second lock timeout
+- tuned: `engine_options()` and the PRAGMAs from `configure_engine()`
+  (WAL, synchronous=NORMAL, larger cache, mmap, busy timeout)
+
+It reports reads and writes per second, p95 latency and how many
+operations failed with "database is locked".
+
+Usage:
+    python benchmarks/database.py [--users 200] [--items 50000] [--readers 8] [--writers 4] [--duration 10]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+
+
+def seed(path, users, items):
+    from sqlalchemy import create_engine, insert
+    from app.models import PantryItem, User, db
+    engine = create_engine('sqlite:///' + path)
+    db.metadata.create_all(engine)
+    rng = random.Random(42)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{'id': i, 'username': f'user{i}', 'password_hash': 'x'} for i in range(1, users + 1)])
+        conn.execute(insert(PantryItem), [{
+            'user_id': rng.randint(1, users),
+            'name': f'item {i}',
+            'category': rng.choice(CATEGORIES),
+            'used': False,
+            'out_of_stock': False,
+            'expiration_date': now + timedelta(days=rng.randint(-30, 60)),
+            'added_date': now,
+        } for i in range(items)])
+    engine.dispose()
+
+
+def run(engine, users, readers, writers, duration) -> dict:
+    from sqlalchemy import insert, select
+    from app.models import PantryItem
+    results = {'read': [], 'write': [], 'locked': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(kind, seed):
+        rng = random.Random(seed)
+        latencies, locked, errors = [], 0, 0
+        while time.perf_counter() < deadline:
+            user_id = rng.randint(1, users)
+            start = time.perf_counter()
+            try:
+                if kind == 'read':
+                    with engine.connect() as conn:
+                        conn.execute(select(PantryItem).where(
+                            PantryItem.user_id == user_id,
+                            PantryItem.expiration_date <= datetime.now() + timedelta(days=7),
+                        ).order_by(PantryItem.expiration_date)).all()
+                else:
+                    with engine.begin() as conn:
+                        conn.execute(insert(PantryItem).values(
+                            user_id=user_id, name='new item', category=rng.choice(CATEGORIES), used=False,
+                            out_of_stock=False, expiration_date=datetime.now() + timedelta(days=7),
+                            added_date=datetime.now()))
+            except Exception as e:
+                if 'database is locked' in str(e):
+                    locked += 1
+                else:
+                    errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+        with lock:
+            results[kind].extend(latencies)
+            results['locked'] += locked
+            results['errors'] += errors
+
+    threads = [threading.Thread(target=worker, args=('read', i)) for i in range(readers)] + \
+              [threading.Thread(target=worker, args=('write', 1000 + i)) for i in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results['seconds'] = time.perf_counter() - start
+    return results
+
+
+def p95_ms(latencies):
+    latencies = sorted(latencies)
+    return latencies[int(len(latencies) * 0.95)] * 1000 if latencies else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--items', type=int, default=50_000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per configuration')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='database-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'app.db')
+    from sqlalchemy import create_engine
+    from app import application
+    from app.database import configure_engine, engine_options
+
+    seed(os.path.join(workdir, 'seed.db'), args.users, args.items)
+    engines = {}
+    for name in ('default', 'tuned'):
+        path = os.path.join(workdir, f'{name}.db')
+        shutil.copy(os.path.join(workdir, 'seed.db'), path)
+        url = 'sqlite:///' + path
+        if name == 'default':
+            engines[name] = create_engine(url)
+        else:
+            engines[name] = create_engine(url, **engine_options(url, application.config))
+            configure_engine(engines[name], application.config)
+
+    print(f"{args.items} items, {args.readers} readers, {args.writers} writers, {args.duration:.0f}s each")
+    print(f"{'':9}{'reads/s':>10}{'read p95':>11}{'writes/s':>10}{'write p95':>11}{'locked':>8}{'errors':>8}")
+    report = {}
+    for name, engine in engines.items():
+        result = report[name] = run(engine, args.users, args.readers, args.writers, args.duration)
+        engine.dispose()
+        print(f"{name:9}{len(result['read']) / result['seconds']:>10.0f}{p95_ms(result['read']):>9.1f}ms"
+              f"{len(result['write']) / result['seconds']:>10.0f}{p95_ms(result['write']):>9.1f}ms"
+              f"{result['locked']:>8}{result['errors']:>8}")
+    for kind in ('read', 'write'):
+        before, after = len(report['default'][kind]), len(report['tuned'][kind])
+        if before:
+            print(f"{kind} throughput: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Microbenchmark the compact Food_Management against the original implementation.
+
+The original kept the expiry date as a string in a per-instance __dict__ and
+parsed it with `datetime.strptime` (plus a `datetime.today()` call) on every
+`days_until_expiry` / `expiry_status` access. The current class uses
+__slots__, parses dates once into day ordinals and caches today's ordinal
+for the day. Reports memory per item (tracemalloc) and time per status check.
+
+Usage:
+    python benchmarks/food_item.py [--items 100000] [--checks 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.columnar import CATEGORIES
+from app.llm import Food_Management
+
+
+class LegacyFood:
+    """The parts of the original Food_Management a status check touches."""
+
+    def __init__(self, info):
+        self._name = info['name']
+        self._brand = info['brand']
+        self._type = info['type']
+        self._expiry_date = info['expiry_date']
+        self._used = False
+        self._out_of_stock = False
+        self._images = None
+        self._info = None
+        self._added_date = datetime.now().date()
+
+    @property
+    def days_until_expiry(self):
+        if self._expiry_date:
+            expiry = datetime.strptime(self._expiry_date, '%Y-%m-%d').date()
+            today = datetime.today().date()
+            return (expiry - today).days
+        return None
+
+    @property
+    def expiry_status(self):
+        days_left = self.days_until_expiry
+        if days_left is not None:
+            if days_left < 0:
+                return 'Red'
+            elif days_left <= 3:
+                return 'Yellow'
+            else:
+                return 'Green'
+        return 'Unknown expiry status'
+
+
+def make_products(n):
+    rng = random.Random(42)
+    today = date.today()
+    return [{
+        'name': f'item {i}',
+        'brand': rng.choice([None, 'Meiji', 'Magnolia', 'Marigold']),
+        'type': rng.choice(CATEGORIES),
+        'expiry_date': (today + timedelta(days=rng.randint(-30, 90))).strftime('%Y-%m-%d'),
+    } for i in range(n)]
+
+
+def measure(build, products, checks):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = build(products)
+    per_item = (tracemalloc.get_traced_memory()[0] - before) / len(items)
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(checks):
+        for item in items:
+            item.expiry_status
+    per_check = (time.perf_counter() - start) * 1e9 / (len(items) * checks)
+    return per_item, per_check
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=100_000)
+    parser.add_argument('--checks', type=int, default=5)
+    args = parser.parse_args()
+
+    products = make_products(args.items)
+    # Item names, brands and dates are shared by both, so only the objects themselves are counted
+    results = {
+        'legacy': measure(lambda products: [LegacyFood(product) for product in products], products, args.checks),
+        'compact': measure(Food_Management.from_products, products, args.checks),
+    }
+
+    print(f"{'':9}{'bytes/item':>12}{'ns/status':>12}")
+    for label, (per_item, per_check) in results.items():
+        print(f"{label:9}{per_item:>12.0f}{per_check:>12.0f}")
+    (legacy_memory, legacy_check), (memory, check) = results['legacy'], results['compact']
+    print(f"memory: {legacy_memory / memory:.1f}x smaller, status check: {legacy_check / check:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
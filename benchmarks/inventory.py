@@ -0,0 +1,81 @@
+"""
+Benchmark ColumnarInventory against Inventory_Management / Food_Management.
+
+For each size, builds both inventories from the same random products and
+times the operations the app uses: sorting by days until expiry, grouping
+by category sorted by expiry, and classifying every item Red/Yellow/Green.
+
+Usage:
+    python benchmarks/inventory.py [--sizes 10000,100000,1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.columnar import CATEGORIES, ColumnarInventory
+from app.llm import Food_Management, Inventory_Management
+
+
+def make_products(n):
+    rng = random.Random(42)
+    today = date.today()
+    return [{
+        'name': f'item {i}',
+        'brand': rng.choice([None, 'Meiji', 'Magnolia', 'Marigold']),
+        'type': rng.choice(CATEGORIES),
+        'expiry_date': (today + timedelta(days=rng.randint(-30, 90))).strftime('%Y-%m-%d'),
+    } for i in range(n)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_objects(products):
+    inventory = Inventory_Management()
+    build = timed(lambda: [inventory.add_food_item(Food_Management(product)) for product in products])
+    return {
+        'build': build,
+        'sort_by_expiry': timed(inventory.sort_by_days_until_expiry),
+        'group_by_category': timed(inventory.sort_by_category_and_expiry),
+        'expiry_status': timed(lambda: [item.expiry_status for item in inventory.food_items]),
+    }
+
+
+def bench_columnar(products):
+    holder = {}
+    build = timed(lambda: holder.setdefault('inventory', ColumnarInventory.from_products(products)))
+    inventory = holder['inventory']
+    return {
+        'build': build,
+        'sort_by_expiry': timed(inventory.sort_by_days_until_expiry),
+        'group_by_category': timed(inventory.sort_by_category_and_expiry),
+        'expiry_status': timed(inventory.expiry_status_codes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    args = parser.parse_args()
+
+    print(f"{'items':>9} {'operation':<18}{'objects':>12}{'columnar':>12}{'speedup':>9}")
+    for size in [int(size) for size in args.sizes.split(',')]:
+        products = make_products(size)
+        objects = bench_objects(products)
+        columnar = bench_columnar(products)
+        for operation in objects:
+            speedup = objects[operation] / columnar[operation] if columnar[operation] else float('inf')
+            print(f"{size:>9} {operation:<18}{objects[operation]:>10.1f}ms{columnar[operation]:>10.1f}ms{speedup:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
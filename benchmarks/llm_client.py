@@ -0,0 +1,124 @@
+"""
+Exercise the model client against a fake model with injected latency and faults.
+
+The fake stands in for `genai.GenerativeModel`: every request sleeps for a
+random latency, honours the `request_options` timeout the client passes
+down, and fails with a 503 at the configured rate. Three phases run with
+`--threads` concurrent callers:
+
+- healthy: only the base failure rate
+- outage: every request fails, which should open the circuit breaker so
+  most calls are rejected immediately instead of waiting on upstream
+- half-open: healthy again after the breaker's cooldown; one trial call
+  goes upstream while the rest are still rejected
+- recovered: the trial succeeded and the circuit is closed again
+
+Usage:
+    python benchmarks/llm_client.py [--calls 200] [--threads 16] [--latency 0.05] [--failure-rate 0.1]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """`generate_content` with configurable latency, jitter, failure rate and hangs."""
+
+    def __init__(self, latency=0.05, jitter=0.5, failure_rate=0.0, hang_rate=0.0, seed=42):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        from google.api_core import exceptions
+        timeout = (request_options or {}).get('timeout', float('inf'))
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            latency = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+        if roll < self.hang_rate:
+            latency = float('inf')
+        if latency > timeout:
+            time.sleep(timeout)
+            raise exceptions.DeadlineExceeded('fake model timed out')
+        time.sleep(latency)
+        if roll < self.hang_rate + self.failure_rate:
+            raise exceptions.ServiceUnavailable('fake model unavailable')
+        return FakeResponse('{"name": "rice"}')
+
+
+def run_phase(client, model, calls, threads):
+    from app.llm_client import CircuitOpenError
+    outcomes = {'ok': 0, 'failed': 0, 'rejected': 0}
+    lock = threading.Lock()
+
+    def one(_):
+        try:
+            client.generate('product_info', model, ['prompt'])
+            outcome = 'ok'
+        except CircuitOpenError:
+            outcome = 'rejected'
+        except Exception:
+            outcome = 'failed'
+        with lock:
+            outcomes[outcome] += 1
+
+    requests = model.requests
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(calls)))
+    outcomes['upstream_requests'] = model.requests - requests
+    outcomes['seconds'] = round(time.perf_counter() - start, 2)
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--failure-rate', type=float, default=0.1)
+    parser.add_argument('--hang-rate', type=float, default=0.01)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='llm-bench-'), 'bench.db'))
+    from app.llm_client import CircuitBreaker, ModelClient
+
+    cooldown = 1.0
+    client = ModelClient(max_concurrency=8, timeout=2.0, retries=3, backoff_base=0.05, backoff_max=0.5,
+                         breaker=CircuitBreaker(threshold=0.5, window=20, min_calls=10, cooldown=cooldown))
+    model = FakeModel(latency=args.latency, failure_rate=args.failure_rate, hang_rate=args.hang_rate)
+
+    print('healthy  ', run_phase(client, model, args.calls, args.threads))
+    model.failure_rate, model.hang_rate = 1.0, 0.0
+    print('outage   ', run_phase(client, model, args.calls, args.threads), client.breaker.state)
+    model.failure_rate, model.hang_rate = args.failure_rate, args.hang_rate
+    time.sleep(cooldown)
+    print('half-open', run_phase(client, model, args.calls, args.threads), client.breaker.state)
+    print('recovered', run_phase(client, model, args.calls, args.threads), client.breaker.state)
+
+    stats = client.stats()['operations']['product_info']
+    latency = stats.pop('latency')
+    print('counters ', stats)
+    print('latency  ', {key: latency[key] for key in ('count', 'mean', 'p50', 'p95', 'p99')})
+
+
+if __name__ == '__main__':
+    main()
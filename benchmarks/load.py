@@ -0,0 +1,284 @@
+"""
+Load-test the main pages against a seeded database with the local model backend.
+
+Seeds a throwaway SQLite database (users, pantry items with their images,
+recipes) and then `--concurrency` simulated users log in and request a mix
+of pages for `--duration` seconds:
+
+    GET /home, GET /inventory, GET /recipes, POST /recipes, GET /recipe/<id>,
+    GET /food/<id>, POST /upload
+
+Requests run in-process through Flask test clients, one per thread, so the
+numbers are the app's own overhead plus the simulated model latency
+(`--model-latency`, via MODEL_BACKEND=local). Per route it reports p50, p95
+and p99 latency, throughput and SQL queries per request, and writes
+everything to a JSON file tagged with the current commit. Pass an earlier
+file with `--compare` to print the change per route.
+
+Usage:
+    python benchmarks/load.py [--users 50] [--items 5000] [--images 1] [--recipes 500]
+                              [--concurrency 8] [--duration 20] [--model-latency 0.2]
+                              [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+PASSWORD = 'benchmark'
+
+# Relative weight of each route in the simulated traffic
+ROUTE_MIX = {
+    'GET /home': 25,
+    'GET /inventory': 15,
+    'GET /recipes': 10,
+    'POST /recipes': 5,
+    'GET /recipe/<id>': 15,
+    'GET /food/<id>': 25,
+    'POST /upload': 5,
+}
+
+
+def seed(db, users, items, images, recipes):
+    """Bulk-insert the dataset; returns {user_id: [pantry item ids]} and the recipe ids."""
+    from werkzeug.security import generate_password_hash
+    from app.models import FoodImage, PantryItem, Recipe, User
+    rng = random.Random(42)
+    now = datetime.now()
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(db.insert(User), [
+        {'id': i, 'username': f'user{i}', 'password_hash': password_hash} for i in range(1, users + 1)
+    ])
+    db.session.execute(db.insert(PantryItem), [{
+        'id': i,
+        'user_id': rng.randint(1, users),
+        'name': rng.choice(['Rice', 'Milk', 'Eggs', 'Broccoli', 'Butter', 'Apples']) + f' {i}',
+        'category': rng.choice(CATEGORIES),
+        'used': False,
+        'out_of_stock': False,
+        'weight': 100.0,
+        'calories': 250.0,
+        'nutrition_content': 'About 250 kcal per 100g.',
+        'expiration_date': now + timedelta(days=rng.randint(-10, 30)),
+        'added_date': now,
+    } for i in range(1, items + 1)])
+    db.session.execute(db.insert(FoodImage), [
+        {'image_url': f'/static/uploads/item{i}_{n}.jpg', 'pantry_item_id': i}
+        for i in range(1, items + 1) for n in range(images)
+    ])
+    db.session.execute(db.insert(Recipe), [{
+        'id': i,
+        'name': f'Recipe {i}',
+        'ingredients': 'rice, milk, eggs',
+        'steps': 'Boil the rice.\nAdd milk and eggs.\nServe.',
+        'created_at': now - timedelta(minutes=i),
+    } for i in range(1, recipes + 1)])
+    db.session.commit()
+
+    owned = {}
+    for item_id, user_id in db.session.query(PantryItem.id, PantryItem.user_id):
+        owned.setdefault(user_id, []).append(item_id)
+    return owned, list(range(1, recipes + 1))
+
+
+class QueryCounter:
+    """Counts SQL statements and their time per thread while `active` is set."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'active', False):
+            self._local.queries += 1
+            self._local.seconds += time.perf_counter() - self._local.started
+
+    def start(self):
+        self._local.active = True
+        self._local.queries = 0
+        self._local.seconds = 0.0
+
+    def stop(self) -> tuple[int, float]:
+        self._local.active = False
+        return self._local.queries, self._local.seconds
+
+
+def make_photo(rng) -> bytes:
+    import PIL.Image
+    buffer = io.BytesIO()
+    PIL.Image.new('RGB', (1280, 960), tuple(rng.randrange(256) for _ in range(3))).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def simulate_user(application, counter, owned, recipe_ids, deadline, seed, samples, lock):
+    rng = random.Random(seed)
+    user_id = rng.choice(list(owned))
+    client = application.test_client()
+    routes, weights = zip(*ROUTE_MIX.items())
+
+    def timed(route, send):
+        counter.start()
+        start = time.perf_counter()
+        try:
+            status = send().status_code
+        except Exception:
+            status = 500
+        elapsed = time.perf_counter() - start
+        queries, query_seconds = counter.stop()
+        with lock:
+            samples.setdefault(route, []).append((elapsed, status, queries, query_seconds))
+
+    timed('POST /login', lambda: client.post('/login', data={'username': f'user{user_id}', 'password': PASSWORD}))
+    items = owned[user_id]
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        if route == 'GET /recipe/<id>':
+            timed(route, lambda: client.get(f'/recipe/{rng.choice(recipe_ids)}'))
+        elif route == 'GET /food/<id>':
+            timed(route, lambda: client.get(f'/food/{rng.choice(items)}'))
+        elif route == 'POST /recipes':
+            ingredients = rng.sample(['Rice', 'Milk', 'Eggs', 'Broccoli', 'Butter', 'Apples'], 2)
+            timed(route, lambda: client.post('/recipes', data={'ingredients': ingredients}))
+        elif route == 'POST /upload':
+            photo = make_photo(rng)
+            timed(route, lambda: client.post('/upload', data={'file': (io.BytesIO(photo), 'photo.jpg')},
+                                             content_type='multipart/form-data'))
+        else:
+            timed(route, lambda: client.get(route.split(' ', 1)[1]))
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(samples, wall_seconds) -> dict:
+    report = {}
+    for route, entries in sorted(samples.items()):
+        latencies = sorted(entry[0] * 1000 for entry in entries)
+        report[route] = {
+            'requests': len(entries),
+            'errors': sum(1 for entry in entries if entry[1] >= 400),
+            'throughput_rps': len(entries) / wall_seconds,
+            'mean_ms': sum(latencies) / len(latencies),
+            'p50_ms': percentile(latencies, 0.50),
+            'p95_ms': percentile(latencies, 0.95),
+            'p99_ms': percentile(latencies, 0.99),
+            'queries_mean': sum(entry[2] for entry in entries) / len(entries),
+            'queries_max': max(entry[2] for entry in entries),
+            'query_ms_mean': sum(entry[3] for entry in entries) * 1000 / len(entries),
+        }
+    return report
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_report(report, baseline=None):
+    header = f"{'route':<18}{'reqs':>7}{'err':>5}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}"
+    if baseline:
+        header += f"{'p95 vs base':>13}"
+    print(header)
+    for route, stats in report.items():
+        line = (f"{route:<18}{stats['requests']:>7}{stats['errors']:>5}{stats['throughput_rps']:>8.1f}"
+                f"{stats['p50_ms']:>7.1f}ms{stats['p95_ms']:>7.1f}ms{stats['p99_ms']:>7.1f}ms{stats['queries_mean']:>9.1f}")
+        base = (baseline or {}).get(route)
+        if base:
+            line += f"{(stats['p95_ms'] / base['p95_ms'] - 1) * 100:>+12.0f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--images', type=int, default=1, help='images per pantry item')
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load')
+    parser.add_argument('--model-latency', type=float, default=0.2, help='seconds per stubbed model request')
+    parser.add_argument('--output', help='JSON results file (default: load-<commit>.json in the temp directory)')
+    parser.add_argument('--compare', help='earlier JSON results to compare p95 against')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='load-bench-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'PRODUCT_CACHE_PATH': os.path.join(workdir, 'product_cache.db'),
+        'MODEL_BACKEND': 'local',
+        'LOCAL_MODEL_LATENCY': str(args.model_latency),
+        'NOTIFICATIONS_ENABLED': '0',
+    })
+    from app import application, db
+    from app.jobs import analysis_queue
+
+    application.config.update(WTF_CSRF_ENABLED=False, UPLOAD_FOLDER=os.path.join(workdir, 'uploads'))
+    with application.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        owned, recipe_ids = seed(db, args.users, args.items, args.images, args.recipes)
+        print(f"seeded {args.users} users / {args.items} items / {args.items * args.images} images / "
+              f"{args.recipes} recipes in {time.perf_counter() - start:.1f}s")
+        counter = QueryCounter(db.engine)
+
+    samples, lock = {}, threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=simulate_user, args=(application, counter, owned, recipe_ids,
+                                                            deadline, seed, samples, lock))
+               for seed in range(args.concurrency)]
+    # The app's own prints still cost their time, but are kept off the report
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall_seconds = time.perf_counter() - start
+        analysis_queue.join()
+
+    report = summarize(samples, wall_seconds)
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'settings': vars(args),
+        'wall_seconds': wall_seconds,
+        'total_throughput_rps': sum(len(entries) for entries in samples.values()) / wall_seconds,
+        'routes': report,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+    print_report(report, baseline)
+    print(f"total throughput: {results['total_throughput_rps']:.1f} req/s over {wall_seconds:.1f}s")
+
+    output = args.output or os.path.join(tempfile.gettempdir(), f'load-{commit}.json')
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
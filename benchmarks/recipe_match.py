@@ -0,0 +1,111 @@
+"""
+Benchmark matching a pantry against the saved recipes.
+
+Seeds a throwaway SQLite database with `--recipes` generated recipes
+("2 cups brown rice, 300g chicken breast, diced, ...") and a user with
+`--pantry` items expiring over the next weeks, indexes the recipes, then
+times `--lookups` calls of `RecipeMatcher.recommend_for_user()` (the
+pantry query, the new-recipe check and the scoring):
+
+- pantry: the whole pantry
+- picked: restricted to recipes using one or two picked items
+
+Reports the index build time, p50/p95/p99 latency and how many lookups
+found a recipe covering at least RECIPE_MATCH_MIN_COVERAGE of its
+ingredients, i.e. would not have called the model.
+
+Usage:
+    python benchmarks/recipe_match.py [--recipes 100000] [--pantry 60] [--lookups 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FOODS = ['chicken breast', 'chicken thigh', 'milk', 'spinach', 'salmon fillet', 'brown rice', 'yellow noodles',
+         'greek yoghurt', 'butter', 'potato', 'tomato', 'cheddar cheese', 'pork collar', 'broccoli', 'grapes', 'tofu',
+         'egg', 'beef mince', 'prawn', 'mushroom', 'carrot', 'apple', 'bread', 'pasta', 'lentil', 'chickpea', 'onion',
+         'garlic', 'ginger', 'soy sauce', 'coconut milk', 'bell pepper', 'cabbage', 'cucumber', 'lemon', 'lime',
+         'coriander', 'basil', 'parmesan', 'cream', 'flour', 'honey', 'oyster sauce', 'spring onion', 'chilli']
+AMOUNTS = ['200g', '2 cups', '1 tbsp', '3', '1 can', 'a handful of', '2 cloves', '500 ml', '1/2 tsp']
+PREPARATION = ['', '', ', diced', ', sliced', ', finely chopped']
+STAPLES = ['salt and pepper to taste', '2 tbsp olive oil', 'water']
+
+
+def seed(db, recipes, pantry, batch=20_000):
+    from app.models import PantryItem, Recipe, User
+    rng = random.Random(42)
+    now = datetime.now()
+    db.session.execute(db.insert(User), [{'id': 1, 'username': 'bench', 'password_hash': 'x'}])
+    for start in range(0, recipes, batch):
+        rows = []
+        for _ in range(start, min(start + batch, recipes)):
+            foods = rng.sample(FOODS, rng.randint(3, 8))
+            ingredients = [f'{rng.choice(AMOUNTS)} {food}{rng.choice(PREPARATION)}' for food in foods]
+            rows.append({'name': ' '.join(foods[:2]).title(), 'steps': 'Cook.',
+                         'ingredients': ', '.join(ingredients + rng.sample(STAPLES, 1))})
+        db.session.execute(db.insert(Recipe), rows)
+    items = rng.sample(FOODS, min(pantry, len(FOODS)))
+    db.session.execute(db.insert(PantryItem), [{
+        'user_id': 1, 'name': f'Fresh {food.title()}', 'category': 'Protein', 'added_date': now,
+        'expiration_date': now + timedelta(days=rng.randint(-2, 30)),
+    } for food in items])
+    db.session.commit()
+    return [f'Fresh {food.title()}' for food in items]
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return [latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--pantry', type=int, default=60, help='pantry items, at most one per generated food')
+    parser.add_argument('--lookups', type=int, default=500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='recipe-match-bench-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'NOTIFICATIONS_ENABLED': '0',
+    })
+    from app import application, db
+    from app.ingredients import backfill_recipes
+    from app.recommend import recipe_matcher
+
+    with application.app_context():
+        db.create_all()
+        names = seed(db, args.recipes, args.pantry)
+        backfill_recipes(batch_size=5000)  # the recipes are seeded as text only
+        start = time.perf_counter()
+        recipe_matcher.index()
+        stats = recipe_matcher.stats()
+        print(f"indexed {stats['recipes']} recipes, {stats['ingredients']} ingredients "
+              f"in {time.perf_counter() - start:.2f}s")
+
+        rng = random.Random(7)
+        min_coverage = application.config['RECIPE_MATCH_MIN_COVERAGE']
+        print(f"{'':10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'local hits':>12}")
+        for label in ('pantry', 'picked'):
+            latencies, hits = [], 0
+            for _ in range(args.lookups):
+                required = rng.sample(names, rng.randint(1, 2)) if label == 'picked' else ()
+                start = time.perf_counter()
+                matches = recipe_matcher.recommend_for_user(1, required, limit=5, min_coverage=min_coverage)
+                latencies.append(time.perf_counter() - start)
+                hits += bool(matches)
+                db.session.rollback()
+            p50, p95, p99 = percentiles(latencies)
+            print(f"{label:10}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}{hits / args.lookups:>12.0%}")
+
+
+if __name__ == '__main__':
+    main()
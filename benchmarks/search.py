@@ -0,0 +1,123 @@
+"""
+Benchmark full-text search latency on a large generated corpus.
+
+Seeds a throwaway SQLite database with `--items` pantry items spread over
+`--users` users and `--recipes` recipes, builds the search index, then
+times `--queries` searches of each kind through `search_documents()` (the
+index lookup plus loading the page of rows):
+
+- pantry: one user's items, one or two words, the last typed as a prefix
+- recipes: every saved recipe, one or two words
+
+Reports p50/p95/p99 latency per kind and page. `--backend memory` times
+the pure-Python fallback instead of FTS5.
+
+Usage:
+    python benchmarks/search.py [--items 1000000] [--recipes 100000] [--users 1000] [--backend fts5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ADJECTIVES = ['Organic', 'Fresh', 'Frozen', 'Smoked', 'Whole', 'Sliced', 'Low Fat', 'Premium', 'Baby', 'Wild',
+              'Spicy', 'Sweet', 'Crispy', 'Roasted', 'Plain', 'Salted', 'Unsalted', 'Light', 'Golden', 'Mini']
+FOODS = ['Chicken Breast', 'Milk', 'Spinach', 'Salmon Fillet', 'Brown Rice', 'Yellow Noodles', 'Greek Yoghurt',
+         'Butter', 'Potato', 'Tomato', 'Cheddar Cheese', 'Pork Collar', 'Broccoli', 'Grapes', 'Tofu', 'Eggs',
+         'Beef Mince', 'Prawns', 'Mushrooms', 'Carrots', 'Apples', 'Bread', 'Pasta', 'Lentils', 'Chickpeas']
+BRANDS = ['Meiji', 'Anchor', 'Chef', 'Superpork', 'Marigold', 'Farmhouse', 'Golden Churn', 'Pokka', None]
+STYLES = ['Stir-Fry', 'Soup', 'Curry', 'Salad', 'Bake', 'Stew', 'Omelette', 'Fried Rice', 'Pie', 'Skewers']
+
+
+def seed(db, users, items, recipes, batch=50_000):
+    from app.models import PantryItem, Recipe, User
+    rng = random.Random(42)
+    now = datetime.now()
+    db.session.execute(db.insert(User), [{'id': i, 'username': f'user{i}', 'password_hash': 'x'}
+                                         for i in range(1, users + 1)])
+    for start in range(0, items, batch):
+        db.session.execute(db.insert(PantryItem), [{
+            'user_id': rng.randint(1, users),
+            'name': f'{rng.choice(ADJECTIVES)} {rng.choice(FOODS)}',
+            'brand': rng.choice(BRANDS),
+            'category': 'Protein',
+            'nutrition_content': f'{rng.randint(50, 900)} kcal, {rng.randint(1, 40)}g protein',
+            'expiration_date': now + timedelta(days=rng.randint(-10, 60)),
+            'added_date': now,
+        } for _ in range(start, min(start + batch, items))])
+    for start in range(0, recipes, batch):
+        rows = []
+        for _ in range(start, min(start + batch, recipes)):
+            ingredients = rng.sample(FOODS, 4)
+            rows.append({'name': f'{rng.choice(ADJECTIVES)} {ingredients[0]} {rng.choice(STYLES)}',
+                         'ingredients': ', '.join(ingredients),
+                         'steps': f'Prepare the {ingredients[1].lower()}.\nCook with the {ingredients[2].lower()}.\nServe.'})
+        db.session.execute(db.insert(Recipe), rows)
+    db.session.commit()
+
+
+def queries(count, rng):
+    for _ in range(count):
+        words = f'{rng.choice(ADJECTIVES)} {rng.choice(FOODS)}'.lower().split()
+        picked = words[rng.randrange(len(words)):][:2]
+        picked[-1] = picked[-1][:rng.randint(3, len(picked[-1]))] if len(picked[-1]) > 3 else picked[-1]
+        yield ' '.join(picked)
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return [latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 for p in (0.5, 0.95, 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=1_000_000)
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=500, help='searches per kind and page')
+    parser.add_argument('--backend', choices=['fts5', 'memory'], default='fts5')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='search-bench-')
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir, 'bench.db'),
+        'SEARCH_BACKEND': args.backend,
+        'NOTIFICATIONS_ENABLED': '0',
+    })
+    from app import application, db
+    from app.search import search_documents, search_index
+
+    with application.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        seed(db, args.users, args.items, args.recipes)
+        print(f"seeded {args.items} items and {args.recipes} recipes in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        with db.engine.begin() as connection:
+            search_index.rebuild(connection)
+        print(f"built the {search_index.name} index in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(7)
+        print(f"{'':16}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'hits/page':>11}")
+        for kind in ('pantry', 'recipes'):
+            for page in (1, 5):
+                latencies, hits = [], 0
+                for query in queries(args.queries, rng):
+                    owner = rng.randint(1, args.users) if kind == 'pantry' else None
+                    start = time.perf_counter()
+                    results, _ = search_documents(kind, query, owner, page=page, per_page=20)
+                    latencies.append(time.perf_counter() - start)
+                    hits += len(results)
+                    db.session.rollback()  # end the read transaction like a request would
+                p50, p95, p99 = percentiles(latencies)
+                print(f"{f'{kind} page {page}':16}{p50:>9.2f}{p95:>9.2f}{p99:>9.2f}{hits / args.queries:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,4 +6,133 @@ class Config:
 	SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or\
 		'sqlite:///' + os.path.join(basedir, 'app.db')
 	SQLALCHEMY_TRACK_MODIFICATIONS = False
-	
\ No newline at end of file
+
+	# Connection pool shared by request threads, analysis workers and the notifier.
+	# SQLite files run in WAL mode so reads go on during writes; a writer waits up to
+	# SQLITE_BUSY_TIMEOUT seconds for the lock instead of failing with "database is locked".
+	DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 10))
+	DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+	DATABASE_POOL_TIMEOUT = float(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+	DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE', 1800))
+	SQLITE_WAL = os.environ.get('SQLITE_WAL', '1') == '1'
+	SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+	SQLITE_BUSY_TIMEOUT = float(os.environ.get('SQLITE_BUSY_TIMEOUT', 15))
+	SQLITE_CACHE_SIZE_MB = int(os.environ.get('SQLITE_CACHE_SIZE_MB', 16))
+	SQLITE_MMAP_SIZE_MB = int(os.environ.get('SQLITE_MMAP_SIZE_MB', 256))
+
+	# Number of background threads running Gemini image analysis for /upload.
+	# Set to 0 to run jobs inline in the request (useful for local debugging).
+	ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 2))
+	# A running job is leased to its process for this long and the lease is renewed while it runs;
+	# jobs whose lease ran out (the process died) are taken over by the other processes.
+	ANALYSIS_JOB_LEASE = int(os.environ.get('ANALYSIS_JOB_LEASE', 120))  # seconds
+
+	# Uploaded photos are preprocessed in this many worker processes (0 runs inline).
+	# Sizes are the longest side in pixels of the image sent to the model and of the stored variants.
+	IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+	IMAGE_MODEL_SIZE = int(os.environ.get('IMAGE_MODEL_SIZE', 1024))
+	IMAGE_DISPLAY_SIZE = int(os.environ.get('IMAGE_DISPLAY_SIZE', 1600))
+	IMAGE_THUMBNAIL_SIZE = int(os.environ.get('IMAGE_THUMBNAIL_SIZE', 320))
+	IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+
+	# Batch intake (/upload/batch): images per Gemini request, concurrent requests per batch
+	# and the most photos accepted in one upload.
+	BATCH_INTAKE_SIZE = int(os.environ.get('BATCH_INTAKE_SIZE', 8))
+	BATCH_INTAKE_CONCURRENCY = int(os.environ.get('BATCH_INTAKE_CONCURRENCY', 4))
+	BATCH_INTAKE_MAX_FILES = int(os.environ.get('BATCH_INTAKE_MAX_FILES', 50))
+
+	# Model backend for product recognition, recipes and chat: 'gemini', or 'local' for
+	# rule-based offline answers that wait LOCAL_MODEL_LATENCY seconds per request.
+	MODEL_BACKEND = os.environ.get('MODEL_BACKEND', 'gemini')
+	GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', 'YOUR-API-KEY')
+	GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+	LOCAL_MODEL_LATENCY = float(os.environ.get('LOCAL_MODEL_LATENCY', 0))
+
+	# Every Gemini call goes through one client: at most LLM_MAX_CONCURRENCY calls in flight,
+	# LLM_TIMEOUT seconds per call including retries, and a circuit breaker that rejects calls
+	# for LLM_BREAKER_COOLDOWN seconds once LLM_BREAKER_THRESHOLD of recent attempts failed.
+	LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+	LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', 30))
+	LLM_RETRIES = int(os.environ.get('LLM_RETRIES', 3))
+	LLM_BACKOFF_BASE = float(os.environ.get('LLM_BACKOFF_BASE', 0.5))  # seconds, doubled per retry
+	LLM_BACKOFF_MAX = float(os.environ.get('LLM_BACKOFF_MAX', 8))
+	LLM_BREAKER_THRESHOLD = float(os.environ.get('LLM_BREAKER_THRESHOLD', 0.5))
+	LLM_BREAKER_WINDOW = int(os.environ.get('LLM_BREAKER_WINDOW', 20))
+	LLM_BREAKER_MIN_CALLS = int(os.environ.get('LLM_BREAKER_MIN_CALLS', 5))
+	LLM_BREAKER_COOLDOWN = float(os.environ.get('LLM_BREAKER_COOLDOWN', 30))
+
+	# LOG_JSON adds a handler writing logs as JSON lines through a background thread, next to
+	# the server's own. Requests slower than PROFILE_THRESHOLD seconds can be profiled: a
+	# PROFILE_SAMPLE_RATE share of requests runs under cProfile and slow ones are saved to
+	# PROFILE_DIR. METRICS_ENABLED serves metrics at /metrics, to scrapers sending
+	# "Authorization: Bearer <METRICS_TOKEN>" when a token is set.
+	LOG_JSON = os.environ.get('LOG_JSON', '0') == '1'
+	LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+	METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+	METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+	PROFILE_SLOW_REQUESTS = os.environ.get('PROFILE_SLOW_REQUESTS', '0') == '1'
+	PROFILE_THRESHOLD = float(os.environ.get('PROFILE_THRESHOLD', 1.0))
+	PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.1))
+	PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(basedir, 'profiles')
+
+	# Bulk pantry import (flask import-pantry, POST /api/pantry/import): rows per transaction.
+	BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', 5000))
+
+	# Local product catalog behind name autocomplete and the details filled in for items added
+	# by name or photo: the products in CATALOG_PATH (.xlsx, .csv or .jsonl, like ingredient.xlsx)
+	# plus the CATALOG_PANTRY_NAMES most common pantry names, rebuilt every CATALOG_REFRESH seconds.
+	# A name must be CATALOG_MATCH_THRESHOLD similar (shared trigrams, 0-1) to fill in details.
+	# The app refuses to start if CATALOG_PATH cannot be read; set it empty to use pantry names only.
+	CATALOG_PATH = os.environ.get('CATALOG_PATH', os.path.join(basedir, 'ingredient.xlsx'))
+	CATALOG_PANTRY_NAMES = int(os.environ.get('CATALOG_PANTRY_NAMES', 10000))
+	CATALOG_REFRESH = int(os.environ.get('CATALOG_REFRESH', 3600))  # seconds
+	CATALOG_MATCH_THRESHOLD = float(os.environ.get('CATALOG_MATCH_THRESHOLD', 0.5))
+
+	# Full-text search over pantry items and recipes: 'fts5' keeps SQLite FTS5 tables in the
+	# database, 'memory' a per-process inverted index (for databases without FTS5), and 'auto'
+	# picks FTS5 when the database supports it. The FTS5 tables are created by `flask db upgrade`.
+	SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+	SEARCH_PER_PAGE = int(os.environ.get('SEARCH_PER_PAGE', 20))
+
+	# Rendered fragments of the recipe and dashboard pages: 'memory' keeps an LRU per process,
+	# 'disk' stores them under FRAGMENT_CACHE_DIR for every worker. Dashboards are keyed by
+	# a pantry version bumped on each write, so the TTL only bounds how long unused ones stay.
+	FRAGMENT_CACHE_BACKEND = os.environ.get('FRAGMENT_CACHE_BACKEND', 'memory')
+	FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 2048))
+	FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 24 * 3600))  # seconds
+	FRAGMENT_CACHE_DIR = os.environ.get('FRAGMENT_CACHE_DIR') or os.path.join(basedir, 'fragment_cache')
+
+	# Persistent cache of Gemini product-recognition results, keyed by image hash.
+	PRODUCT_CACHE_PATH = os.environ.get('PRODUCT_CACHE_PATH') or os.path.join(basedir, 'product_cache.db')
+	PRODUCT_CACHE_TTL = int(os.environ.get('PRODUCT_CACHE_TTL', 30 * 24 * 3600))  # seconds
+	PRODUCT_CACHE_SIZE = int(os.environ.get('PRODUCT_CACHE_SIZE', 5000))
+	PRODUCT_CACHE_DISTANCE = int(os.environ.get('PRODUCT_CACHE_DISTANCE', 3))  # max differing perceptual-hash bits, 0-3
+
+	# Generated recipes are reused for the same ingredient selection for this long.
+	RECIPE_CACHE_SIZE = int(os.environ.get('RECIPE_CACHE_SIZE', 1024))
+	RECIPE_CACHE_TTL = int(os.environ.get('RECIPE_CACHE_TTL', 7 * 24 * 3600))  # seconds
+
+	# Saved recipes whose ingredients the pantry covers at least RECIPE_MATCH_MIN_COVERAGE (0-1) of
+	# are offered before asking the model; the stream sends up to RECIPE_MATCH_LIMIT of them.
+	RECIPE_MATCH_MIN_COVERAGE = float(os.environ.get('RECIPE_MATCH_MIN_COVERAGE', 0.75))
+	RECIPE_MATCH_LIMIT = int(os.environ.get('RECIPE_MATCH_LIMIT', 3))
+
+	# MasterChef chat sessions kept in memory, and the history size before old turns are compacted.
+	CHAT_MAX_SESSIONS = int(os.environ.get('CHAT_MAX_SESSIONS', 256))
+	CHAT_IDLE_TIMEOUT = int(os.environ.get('CHAT_IDLE_TIMEOUT', 30 * 60))  # seconds
+	CHAT_TOKEN_BUDGET = int(os.environ.get('CHAT_TOKEN_BUDGET', 4000))
+
+	# Recipes listed per page on the home dashboard.
+	HOME_RECIPES_PER_PAGE = int(os.environ.get('HOME_RECIPES_PER_PAGE', 10))
+
+	# Expiry notifications: digests are sent this many days before items expire.
+	NOTIFICATIONS_ENABLED = os.environ.get('NOTIFICATIONS_ENABLED', '0') == '1'
+	NOTIFY_DAYS_BEFORE = [int(days) for days in os.environ.get('NOTIFY_DAYS_BEFORE', '7,3,1').split(',')]
+	NOTIFY_HOUR = int(os.environ.get('NOTIFY_HOUR', 8))
+	# A failed lookup or digest is retried after this long
+	NOTIFY_RETRY_INTERVAL = int(os.environ.get('NOTIFY_RETRY_INTERVAL', 60))  # seconds
+	NOTIFY_SINKS = os.environ.get('NOTIFY_SINKS', 'file').split(',')  # file, smtp
+	NOTIFY_FILE = os.environ.get('NOTIFY_FILE') or os.path.join(basedir, 'notifications.log')
+	MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+	MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+	MAIL_SENDER = os.environ.get('MAIL_SENDER', 'fridge@localhost')
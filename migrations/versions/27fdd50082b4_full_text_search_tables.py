@@ -0,0 +1,49 @@
+"""full-text search tables
+
+Revision ID: 27fdd50082b4
+Revises: 0259a9b38876
+Create Date: 2026-10-18 17:02:11.412907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '27fdd50082b4'
+down_revision = '0259a9b38876'
+branch_labels = None
+depends_on = None
+
+# SQLite FTS5 tables of app.search.FTS5Backend; other databases use its in-memory index
+FTS_TABLES = {
+    'pantry_item_fts': ('pantry_item', "id, 'u' || user_id, name, brand, nutrition_content",
+                        'owner, name, brand, nutrition_content'),
+    'recipe_fts': ('recipe', 'id, name, ingredients, steps', 'name, ingredients, steps'),
+}
+
+
+def _fts5_available(bind):
+    if bind.dialect.name != 'sqlite':
+        return False
+    return 'ENABLE_FTS5' in bind.exec_driver_sql('PRAGMA compile_options').scalars().all()
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not _fts5_available(bind):
+        return
+    for name, (source, values, columns) in FTS_TABLES.items():
+        # Earlier versions created these tables when the app started
+        op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5({columns}, "
+                   f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5')")
+        op.execute(f'DELETE FROM {name}')
+        op.execute(f'INSERT INTO {name} (rowid, {columns}) SELECT {values} FROM {source}')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    for name in FTS_TABLES:
+        op.execute(f'DROP TABLE IF EXISTS {name}')
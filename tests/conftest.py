@@ -0,0 +1,61 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads its config at import time, so everything it writes goes to a throwaway directory
+WORKDIR = tempfile.mkdtemp(prefix='pantry-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(WORKDIR, 'test.db'),
+    'MODEL_BACKEND': 'local',
+    'ANALYSIS_WORKERS': '0',
+    'NOTIFICATIONS_ENABLED': '0',
+    'PRODUCT_CACHE_PATH': os.path.join(WORKDIR, 'product_cache.db'),
+    'FRAGMENT_CACHE_DIR': os.path.join(WORKDIR, 'fragment_cache'),
+    'NOTIFY_FILE': os.path.join(WORKDIR, 'notifications.log'),
+    'CATALOG_PATH': '',  # pantry names only; test_catalog.py checks reading catalog files
+})
+
+from app import application, db  # noqa: E402
+from app.models import User  # noqa: E402
+
+
+@pytest.fixture
+def database():
+    """The app with empty tables and no app context pushed, so every request gets its own as when serving."""
+    application.config.update(TESTING=True, WTF_CSRF_ENABLED=False, UPLOAD_FOLDER=os.path.join(WORKDIR, 'uploads'))
+    os.makedirs(application.config['UPLOAD_FOLDER'], exist_ok=True)
+    with application.app_context():
+        db.create_all()
+    yield application
+    with application.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+
+
+@pytest.fixture
+def app(database):
+    with database.app_context():
+        yield database
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='alice')
+    user.set_password('pw')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    client = app.test_client()
+    client.post('/login', data={'username': 'alice', 'password': 'pw'})
+    return client
@@ -0,0 +1,54 @@
+import io
+
+import pytest
+
+from app.bulk import import_items, read_jsonl, read_xlsx
+from app.models import FoodImage, PantryItem
+from app.search import search_documents
+
+
+def test_jsonl_rows_that_are_not_objects_are_skipped(app, user):
+    lines = (b'{"name": "Milk", "type": "Protein", "expiry_date": "2030-01-31"}\n[1, 2]\n"Eggs"\n'
+             b'{"name": "Tofu", "type": "Protein", "expiry_date": "2030-02-01"}\n')
+
+    result = import_items(read_jsonl(io.BytesIO(lines)), user.id)
+
+    assert (result.imported, result.skipped) == (2, 2)
+    assert all('Expected a JSON object' in error for error in result.errors)
+
+
+def test_long_names_are_kept_up_to_the_column_size(app, user):
+    name = 'Organic ' * 20
+    import_items([{'name': name, 'category': 'Protein', 'expiration_date': '2030-01-31'}], user.id)
+
+    assert PantryItem.query.one().name == name.strip()[:128]
+
+
+def test_xlsx_import(app, user):
+    openpyxl = pytest.importorskip('openpyxl')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['Name', 'Type', 'expiry_date', 'Weight'])
+    sheet.append(['Greek Yoghurt', 'protein', '2030-01-31', '1kg'])
+    stream = io.BytesIO()
+    workbook.save(stream)
+    stream.seek(0)
+
+    result = import_items(read_xlsx(stream), user.id)
+
+    assert result.imported == 1
+    item = PantryItem.query.one()
+    assert (item.name, item.category, item.weight) == ('Greek Yoghurt', 'Protein', 1000.0)
+
+
+def test_imported_rows_are_indexed_and_keep_their_images(app, user):
+    rows = [{'name': f'Milk {n}', 'category': 'Protein', 'expiration_date': '2030-01-31',
+             'image_url': f'/static/milk{n}.jpg' if n % 2 else None} for n in range(5)]
+
+    result = import_items(rows, user.id, chunk_size=2)
+
+    assert result.imported == 5
+    results, _ = search_documents('pantry', 'milk', user.id, per_page=10)
+    assert sorted(item.name for item, _ in results) == [f'Milk {n}' for n in range(5)]
+    images = {image.food_id.name: image.image_url for image in FoodImage.query}
+    assert images == {'Milk 1': '/static/milk1.jpg', 'Milk 3': '/static/milk3.jpg'}
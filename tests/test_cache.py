@@ -0,0 +1,76 @@
+import time
+
+import PIL.Image
+import PIL.ImageDraw
+import pytest
+
+from app.cache import ProductCache, perceptual_hash
+
+
+def label(expiry='2030-01-31'):
+    return {'name': 'Fresh Milk', 'brand': 'Meiji', 'type': 'Protein', 'expiry_date': expiry}
+
+
+def carton(shade=0):
+    img = PIL.Image.new('RGB', (64, 64), 'white')
+    PIL.ImageDraw.Draw(img).rectangle((8, 8, 40, 56), fill=(shade, 90, 160))
+    return img
+
+
+def test_near_duplicate_rereads_expiry(tmp_path):
+    cache = ProductCache(str(tmp_path / 'products.db'))
+    cache.get_or_compute(carton(), lambda img: label(), lambda img: None)
+
+    reads = []
+    product = cache.get_or_compute(carton(shade=3), lambda img: label('2099-01-01'),
+                                   lambda img: reads.append(img) or '2030-02-14')
+
+    assert cache.near_hits == 1 and len(reads) == 1
+    assert product == label('2030-02-14')
+
+
+def test_exact_hit_keeps_stored_expiry(tmp_path):
+    cache = ProductCache(str(tmp_path / 'products.db'))
+    cache.get_or_compute(carton(), lambda img: label(), lambda img: None)
+
+    product = cache.get_or_compute(carton(), lambda img: None, lambda img: '2099-01-01')
+
+    assert cache.hits == 1
+    assert product == label()
+
+
+def test_result_without_expiry_is_not_stored(tmp_path):
+    cache = ProductCache(str(tmp_path / 'products.db'))
+    cache.get_or_compute(carton(), lambda img: label(expiry=None), lambda img: None)
+
+    assert cache.get(carton()) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_expired_entries_are_missed_and_deleted_on_the_next_write(tmp_path, monkeypatch):
+    cache = ProductCache(str(tmp_path / 'products.db'), ttl=60)
+    cache.put(carton(), label())
+    later = time.time() + 120
+    monkeypatch.setattr(time, 'time', lambda: later)
+
+    assert cache.get(carton()) is None
+    assert cache.stats()['size'] == 1
+    cache.put(carton(shade=200), label())
+    assert cache.stats()['size'] == 1 and cache.evictions == 1
+
+
+def test_distance_beyond_the_bands_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ProductCache(str(tmp_path / 'products.db'), max_distance=4)
+
+
+def test_perceptual_hash_matches_the_pixel_comparison():
+    img = carton(shade=50)
+    small = img.convert('L').resize((9, 8), PIL.Image.LANCZOS)
+    pixels = [small.getpixel((col, row)) for row in range(8) for col in range(9)]
+    expected = 0
+    for row in range(8):
+        for col in range(8):
+            expected = (expected << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+
+    assert perceptual_hash(img) == expected
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from app.catalog import check_catalog_file, read_catalog_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_readable_catalog_passes_the_startup_check(tmp_path):
+    path = tmp_path / 'catalog.csv'
+    path.write_text('Name,Type,Weight\nFresh Milk,protein,1l\n')
+
+    check_catalog_file(str(path))
+    [product] = read_catalog_file(str(path))
+    assert (product.name, product.category, product.weight) == ('Fresh Milk', 'Protein', 1000.0)
+
+
+@pytest.mark.parametrize('name', ['missing.xlsx', 'catalog.pdf'])
+def test_unreadable_catalog_stops_startup(tmp_path, name):
+    path = tmp_path / name
+    if name.endswith('.pdf'):
+        path.write_bytes(b'%PDF')
+
+    with pytest.raises(RuntimeError, match='CATALOG_PATH'):
+        check_catalog_file(str(path))
+
+
+def test_bundled_catalog_is_readable():
+    pytest.importorskip('openpyxl')
+    check_catalog_file(os.path.join(ROOT, 'ingredient.xlsx'))
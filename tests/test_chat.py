@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.chat import ChatSessionManager, estimate_tokens
+from app.models import ChatSession, PantryItem
+
+
+class FakeChef:
+    def __init__(self, planner, history=None, summary=None):
+        self.names = sorted(food.name for foods in planner.selected_ingredients.values() for food in foods)
+
+    def send_message(self, message):
+        return ', '.join(self.names)
+
+
+def add_item(user, name, **flags):
+    item = PantryItem(name=name, brand=None, category='Protein', expiration_date=datetime.now() + timedelta(days=7),
+                      user_id=user.id, image_path=None)
+    for flag, value in flags.items():
+        setattr(item, flag, value)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_viewing_chat_creates_no_session(client):
+    response = client.get('/chat')
+
+    assert response.get_json() == {'history': []}
+    assert ChatSession.query.count() == 0
+
+
+def test_chef_sees_pantry_changes(app, user):
+    chats = ChatSessionManager(chef_factory=FakeChef)
+    add_item(user, 'Milk')
+    add_item(user, 'Eggs', out_of_stock=True)
+    assert chats.send(user.id, 'What can I cook?') == 'Milk'
+
+    add_item(user, 'Tofu')
+    assert chats.send(user.id, 'And now?') == 'Milk, Tofu'
+    assert ChatSession.query.count() == 1
+
+
+def test_summary_stays_within_a_quarter_of_the_budget(app, user):
+    chats = ChatSessionManager(chef_factory=FakeChef, token_budget=200)
+    add_item(user, 'Milk')
+    for n in range(30):
+        chats.send(user.id, f'Question {n}: ' + 'what goes with milk? ' * 5)
+
+    summary = ChatSession.query.one().summary
+    assert summary and len(summary) <= 200
+    assert estimate_tokens(summary) <= 200 // 4 + 1
+    assert summary.startswith('Customer: ') or summary.startswith('Chef: ')
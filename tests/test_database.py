@@ -0,0 +1,39 @@
+import sqlite3
+
+import pytest
+
+from app import db
+from app.database import begin_write
+from app.models import User
+
+
+def other_writer():
+    return sqlite3.connect(db.engine.url.database, timeout=0, isolation_level=None)
+
+
+def test_begin_write_takes_the_write_lock_up_front(app, user):
+    begin_write(db.session)
+    other = other_writer()
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            other.execute('BEGIN IMMEDIATE')
+        db.session.rollback()
+        other.execute('BEGIN IMMEDIATE')
+        other.execute('ROLLBACK')
+    finally:
+        other.close()
+
+
+def test_reads_see_other_commits(app, user):
+    assert User.query.count() == 1
+    other = other_writer()
+    try:
+        other.execute("INSERT INTO user (username, password_hash) VALUES ('bob', 'x')")
+    finally:
+        other.close()
+    assert User.query.count() == 2
+
+    begin_write(db.session)
+    db.session.add(User(username='carol', password_hash='x'))
+    db.session.commit()
+    assert User.query.count() == 3
@@ -0,0 +1,39 @@
+import io
+import os
+
+import PIL.Image
+
+from app.images import image_pipeline
+
+
+def jpeg(size=(800, 600)):
+    buffer = io.BytesIO()
+    PIL.Image.new('RGB', size, 'orange').save(buffer, 'JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+def test_pipeline_reads_the_upload_from_disk(app, tmp_path):
+    source = tmp_path / 'photo.upload'
+    source.write_bytes(jpeg((3000, 2000)).getvalue())
+    variants = image_pipeline.process(str(source), str(tmp_path), 'photo')
+
+    assert PIL.Image.open(variants['display']).size == (image_pipeline.display_size, 1067)
+    assert max(PIL.Image.open(variants['thumbnail']).size) == image_pipeline.thumbnail_size
+    assert max(PIL.Image.open(io.BytesIO(variants['model'])).size) == image_pipeline.model_size
+
+
+def test_batch_upload_leaves_no_spooled_files(client, app):
+    response = client.post('/upload/batch', data={'files': [(jpeg(), 'a.jpg'), (jpeg(), 'b.jpg')]},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    names = os.listdir(app.config['UPLOAD_FOLDER'])
+    assert not [name for name in names if name.endswith('.upload')]
+    assert len([name for name in names if name.endswith('_thumb.jpg')]) >= 2
+
+
+def test_unreadable_upload_is_removed(client, app):
+    response = client.post('/upload', data={'file': (io.BytesIO(b'not a photo'), 'c.jpg')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert not [name for name in os.listdir(app.config['UPLOAD_FOLDER']) if name.endswith('.upload')]
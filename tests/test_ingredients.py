@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from app import db
+from app.ingredients import pantry_ingredient_names
+from app.models import PantryItem, Recipe
+
+
+def add_item(user, name, days=7, **flags):
+    item = PantryItem(name=name, brand=None, category='Protein', expiration_date=datetime.now() + timedelta(days=days),
+                      user_id=user.id, image_path=None)
+    for flag, value in flags.items():
+        setattr(item, flag, value)
+    db.session.add(item)
+
+
+def add_recipe(name, ingredients, user_id=None):
+    recipe = Recipe(name, ingredients, ['Cook.'], user_id=user_id)
+    db.session.add(recipe)
+    return recipe
+
+
+def test_pantry_names_cover_every_run_of_words():
+    assert pantry_ingredient_names(['Fresh Chicken Breast Fillets']) == {
+        'chicken breast fillet', 'chicken breast', 'breast fillet', 'chicken', 'breast', 'fillet'}
+
+
+def test_cookable_recipes(client, user):
+    add_item(user, 'Fresh Milk')
+    add_item(user, 'Chicken Breasts')
+    add_item(user, 'Spinach', days=-1)
+    add_item(user, 'Eggs', out_of_stock=True)
+    omelette = add_recipe('Omelette', ['3 eggs', '100 ml milk', 'salt to taste'])
+    creamy = add_recipe('Creamy Chicken', ['300g chicken breast, diced', '1 cup milk', 'pepper'])
+    saag = add_recipe('Chicken Saag', ['200g chicken breast', '2 cups spinach', '1/2 cup milk'], user_id=user.id)
+    add_recipe('Fruit Salad', ['2 apples', '1 banana'])
+    db.session.commit()
+
+    now = client.get('/api/recipes/cookable').get_json()
+    assert [recipe['name'] for recipe in now['recipes']] == ['Creamy Chicken']
+    assert now['recipes'][0]['missing'] == 0 and now['next_page'] is None
+
+    nearly = client.get('/api/recipes/cookable?missing=1').get_json()
+    assert [(recipe['id'], recipe['missing']) for recipe in nearly['recipes']] == [
+        (creamy.id, 0), (saag.id, 1), (omelette.id, 1)]
+
+    mine = client.get('/api/recipes/cookable?missing=1&mine=1').get_json()
+    assert [recipe['id'] for recipe in mine['recipes']] == [saag.id]
@@ -0,0 +1,36 @@
+import atexit
+import logging
+import logging.handlers
+
+from app.instrumentation import setup_logging
+
+
+def test_json_logging_keeps_the_existing_handlers(caplog):
+    root = logging.getLogger()
+    before = list(root.handlers)
+    level = root.level
+    listener = setup_logging('INFO')
+    try:
+        logging.getLogger('app.test').warning('still captured')
+        assert root.handlers[:len(before)] == before
+        assert any(isinstance(handler, logging.handlers.QueueHandler) for handler in root.handlers)
+        assert 'still captured' in caplog.text
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        root.handlers = before
+        root.setLevel(level)
+
+
+def test_metrics_are_off_by_default(app):
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+def test_metrics_token(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_ENABLED', True)
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    client = app.test_client()
+
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200 and b'http_requests_total' in response.data
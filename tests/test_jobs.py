@@ -0,0 +1,122 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import PIL.Image
+import pytest
+
+from app import db
+from app.jobs import JobQueue, analyse_upload
+from app.models import AnalysisJob, FoodImage, PantryItem
+
+
+def photo(app, name):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f'{name}.jpg').replace('\\', '/')
+    PIL.Image.new('RGB', (64, 64), 'green').save(path, 'JPEG')
+    return path
+
+
+def milk(image):
+    return {'name': 'Fresh Milk', 'brand': 'Meiji', 'type': 'Protein', 'expiry_date': '2030-01-31'}
+
+
+def test_upload_job_creates_item(app, user):
+    jobs = JobQueue(app, analyze=milk, workers=0)
+    job = jobs.submit(user.id, {'filepath': photo(app, 'a')})
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.status == 'done'
+    assert job.lease_expires_at is None
+    [item_id] = json.loads(job.result)
+    item = db.session.get(PantryItem, item_id)
+    assert (item.name, item.brand, item.user_id) == ('Fresh Milk', 'Meiji', user.id)
+    assert item.expiration_date == datetime(2030, 1, 31)
+
+
+def test_same_product_keeps_both_photos(app, user):
+    jobs = JobQueue(app, analyze=milk, workers=0)
+    first = jobs.submit(user.id, {'filepath': photo(app, 'a')})
+    second = jobs.submit(user.id, {'filepath': photo(app, 'b')})
+
+    paths = [db.session.get(PantryItem, json.loads(db.session.get(AnalysisJob, job.id).result)[0]).image_path
+             for job in (first, second)]
+    assert paths[0] != paths[1]
+    assert all(os.path.exists(path) for path in paths)
+    urls = {image.image_url for image in FoodImage.query}
+    assert len(urls) == 2
+
+
+def test_failed_job_records_error(app, user):
+    jobs = JobQueue(app, analyze=lambda image: None, workers=0)
+    job = jobs.submit(user.id, {'filepath': photo(app, 'a')})
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.status == 'failed'
+    assert 'Product information not found' in job.error
+    assert PantryItem.query.count() == 0
+
+
+def running_job(user, lease_expires_at):
+    job = AnalysisJob(user_id=user.id, status='running', claimed_by='other-host:1',
+                      payload=json.dumps({'filepath': 'missing.jpg'}), lease_expires_at=lease_expires_at)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def test_running_job_with_live_lease_is_left_alone(app, user):
+    job_id = running_job(user, datetime.utcnow() + timedelta(minutes=5))
+    jobs = JobQueue(app, analyze=milk, workers=0)
+
+    assert job_id not in jobs._pending()
+    jobs.run(job_id)
+    job = db.session.get(AnalysisJob, job_id, populate_existing=True)
+    assert (job.status, job.claimed_by) == ('running', 'other-host:1')
+
+
+def test_running_job_with_expired_lease_is_taken_over(app, user):
+    job_id = running_job(user, datetime.utcnow() - timedelta(seconds=1))
+    jobs = JobQueue(app, analyze=milk, workers=0)
+
+    assert job_id in jobs._pending()
+    jobs.run(job_id)
+    job = db.session.get(AnalysisJob, job_id, populate_existing=True)
+    assert job.status == 'failed'  # it ran here: the photo named in the payload does not exist
+    assert job.claimed_by == jobs.owner
+
+
+def test_failed_commit_leaves_the_photo_for_the_retry(app, user, monkeypatch):
+    path = photo(app, 'a')
+    jobs = JobQueue(app, analyze=milk, workers=0)
+
+    def broken_commit():
+        raise OSError('disk full')
+
+    monkeypatch.setattr(db.session, 'commit', broken_commit)
+    with pytest.raises(OSError):
+        analyse_upload(user.id, {'filepath': path}, jobs.analyze, job_id=1)
+    monkeypatch.undo()
+    db.session.rollback()
+
+    assert os.path.exists(path)
+    assert analyse_upload(user.id, {'filepath': path}, jobs.analyze, job_id=1)
+
+
+def test_product_without_a_name_fails_cleanly(app, user):
+    jobs = JobQueue(app, analyze=lambda image: {'name': None, 'expiry_date': '2030-01-31'}, workers=0)
+    job = jobs.submit(user.id, {'filepath': photo(app, 'a')})
+
+    job = db.session.get(AnalysisJob, job.id)
+    assert job.status == 'failed'
+    assert 'Product information not found' in job.error
+
+
+def test_pending_jobs_are_queued_once(app, user):
+    job_id = running_job(user, datetime.utcnow() - timedelta(seconds=1))
+    jobs = JobQueue(app, analyze=milk, workers=0)
+
+    for _ in range(3):
+        for pending in jobs._pending():
+            jobs._enqueue(pending)
+
+    assert jobs._queue.qsize() == 1 and jobs._enqueued == {job_id}
@@ -0,0 +1,68 @@
+import pytest
+
+from app.llm_client import CircuitBreaker, ModelClient
+
+
+def opened_client():
+    """A client whose breaker has just opened, with the trial due straight away."""
+    breaker = CircuitBreaker(min_calls=1, cooldown=0)
+    breaker.record(breaker.allow(), False)
+    assert breaker.state == 'half_open'
+    return ModelClient(retries=0, breaker=breaker)
+
+
+def test_failed_trial_with_a_bad_request_releases_the_trial():
+    client = opened_client()
+
+    def bad_request(seconds):
+        raise ValueError('bad prompt')
+
+    with pytest.raises(ValueError):
+        client.call('test', bad_request)
+    assert client.call('test', lambda seconds: 'ok') == 'ok'
+    assert client.breaker.state == 'closed'
+
+
+def test_only_the_trial_call_decides_the_trial():
+    breaker = CircuitBreaker(min_calls=2, cooldown=0)
+    in_flight = breaker.allow()
+    breaker.record(breaker.allow(), False)
+    breaker.record(breaker.allow(), False)
+    trial = breaker.allow()
+
+    breaker.record(in_flight, True)
+    assert breaker.state == 'half_open'
+    assert breaker.allow() is None
+    breaker.record(trial, True)
+    assert breaker.state == 'closed'
+
+
+class Model:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def generate_content(self, contents, stream=False, request_options=None):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+def test_stream_failing_mid_way_reopens_the_circuit():
+    client = opened_client()
+    stream = client.stream('test', Model(['a', ConnectionError('dropped')]), [])
+
+    assert next(stream) == 'a'
+    with pytest.raises(ConnectionError):
+        next(stream)
+    assert client.breaker.opened == 2
+
+
+def test_abandoned_stream_releases_the_trial():
+    client = opened_client()
+    stream = client.stream('test', Model(['a', 'b']), [])
+    assert next(stream) == 'a'
+    stream.close()
+
+    assert list(client.stream('test', Model(['c']), [])) == ['c']
+    assert client.breaker.state == 'closed'
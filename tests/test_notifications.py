@@ -0,0 +1,103 @@
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from app import db
+from app.models import ExpiryNotification, PantryItem
+from app.notifications import NotificationScheduler
+
+
+class ListSink:
+    def __init__(self):
+        self.digests = []
+
+    def send(self, digest):
+        self.digests.append(digest)
+
+
+def add_item(user, name, expiration_date):
+    item = PantryItem(name=name, brand=None, category='Protein', expiration_date=expiration_date,
+                      user_id=user.id, image_path=None)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def scheduler(app, sink, days_before=(3,)):
+    return NotificationScheduler(app, days_before=days_before, notify_at=time(8, 0), sinks=[sink])
+
+
+def test_lookup_picks_up_items_added_elsewhere(app, user):
+    notify_at = datetime.combine(datetime.now().date() + timedelta(days=1), time(8, 0))
+    notifier = scheduler(app, ListSink())
+    notifier.load_window(notify_at - timedelta(hours=2))
+    assert notifier._heap == []
+    assert notifier.next_notify_at(notifier._loaded_until) == notify_at
+
+    # Written by another process before the notify-at time
+    item = add_item(user, 'Milk', datetime.combine(notify_at.date() + timedelta(days=3), time.min))
+    notifier.load_window(notify_at + timedelta(seconds=1))
+
+    assert [(due, item_id) for due, _, item_id, _ in notifier._heap] == [(notify_at, item.id)]
+
+
+def test_start_after_the_notify_hour_still_sends_todays_notices(app, user):
+    today = datetime.now().date()
+    item = add_item(user, 'Milk', datetime.combine(today + timedelta(days=3), time.min))
+    notifier = scheduler(app, ListSink())
+
+    notifier.load_window(datetime.combine(today, time(15, 0)))
+
+    assert [(due, item_id) for due, _, item_id, _ in notifier._heap] == [(datetime.combine(today, time(8, 0)), item.id)]
+
+
+def test_failed_lookup_does_not_move_the_window(app, user, monkeypatch):
+    notifier = scheduler(app, ListSink())
+    notifier.load_window(datetime.combine(datetime.now().date(), time(6, 0)))
+    loaded_until = notifier._loaded_until
+
+    def broken(*args, **kwargs):
+        raise OSError('database unavailable')
+
+    monkeypatch.setattr(db.session, 'query', broken)
+    with pytest.raises(OSError):
+        notifier.load_window(datetime.combine(datetime.now().date(), time(9, 0)))
+    assert notifier._loaded_until == loaded_until
+
+
+def test_missed_notices_make_one_line_per_item(app, user):
+    today = datetime.now().date()
+    item = add_item(user, 'Milk', datetime.combine(today + timedelta(days=1), time.min))
+    sink = ListSink()
+    notifier = scheduler(app, sink, days_before=(3, 1))
+
+    notifier.load_window(datetime.combine(today, time(9, 0)))
+    notifier.deliver(notifier._heap)
+
+    assert [(entry.item_id, entry.days_before) for entry in sink.digests[0].entries] == [(item.id, 1)]
+    assert ExpiryNotification.query.count() == 2
+
+
+def test_each_notification_is_sent_once(app, user):
+    item = add_item(user, 'Milk', datetime.combine(datetime.now().date() + timedelta(days=3), time.min))
+    due = [(datetime.now(), 3, item.id, item.expiration_date)]
+    first, second = ListSink(), ListSink()
+
+    scheduler(app, first).deliver(due)
+    scheduler(app, second).deliver(due)
+
+    assert [entry.item_id for digest in first.digests for entry in digest.entries] == [item.id]
+    assert second.digests == []
+    assert ExpiryNotification.query.count() == 1
+
+
+def test_failed_digest_releases_its_claim(app, user):
+    class BrokenSink:
+        def send(self, digest):
+            raise OSError('mail server down')
+
+    item = add_item(user, 'Milk', datetime.combine(datetime.now().date() + timedelta(days=3), time.min))
+    due = [(datetime.now(), 3, item.id, item.expiration_date)]
+
+    assert scheduler(app, BrokenSink()).deliver(due) == []
+    assert ExpiryNotification.query.count() == 0
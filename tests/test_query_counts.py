@@ -0,0 +1,112 @@
+"""
+The listing pages issue a fixed number of SQL queries, whatever the pantry size.
+
+A page whose count grows with the number of items loads something per row
+(an N+1). Rendered fragments are cleared before each request, so the
+counts are for a full render.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.cache import fragment_cache
+from app.models import FoodImage, PantryItem, User
+
+CATEGORIES = ["Carbohydrates", "Fruits and Vegetables", "Protein", "Fats"]
+PASSWORD = 'pw'
+SIZES = (5, 50)  # pantry items per user
+IMAGES = 2  # images per pantry item
+# Most queries each page may issue, in the order they are requested
+BUDGETS = {
+    '/home': 11,
+    '/inventory': 1,
+    '/api/inventory': 2,
+    '/recipes': 2,
+    '/food/{item_id}': 3,
+}
+
+
+class QueryCounter:
+    """Counts SQL statements issued on the current thread while `active` is set."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._local = threading.local()
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._local, 'active', False):
+            self._local.queries += 1
+
+    def count(self, func) -> int:
+        self._local.active, self._local.queries = True, 0
+        try:
+            func()
+        finally:
+            self._local.active = False
+        return self._local.queries
+
+    def remove(self):
+        event.remove(self.engine, 'after_cursor_execute', self._after)
+
+
+def seed(sizes) -> dict[int, tuple[str, int]]:
+    """
+    One user per pantry size, with items expiring around this week; returns
+    {size: (username, first item id)}. Rows are inserted directly, so the
+    first page view also builds the user's pantry summary.
+    """
+    now = datetime.now()
+    password_hash = generate_password_hash(PASSWORD)
+    users, item_id = {}, 1
+    for user_id, size in enumerate(sizes, start=1):
+        db.session.execute(db.insert(User), [{'id': user_id, 'username': f'user{size}', 'password_hash': password_hash}])
+        db.session.execute(db.insert(PantryItem), [{
+            'id': item_id + i,
+            'user_id': user_id,
+            'name': f'item {i}',
+            'category': CATEGORIES[i % len(CATEGORIES)],
+            'used': False,
+            'out_of_stock': False,
+            'expiration_date': now + timedelta(days=i % 10 - 3),
+            'added_date': now,
+        } for i in range(size)])
+        db.session.execute(db.insert(FoodImage), [
+            {'image_url': f'/static/uploads/item{item_id + i}_{n}.jpg', 'pantry_item_id': item_id + i}
+            for i in range(size) for n in range(IMAGES)
+        ])
+        users[size] = (f'user{size}', item_id)
+        item_id += size
+    db.session.commit()
+    return users
+
+
+@pytest.fixture
+def counter(database):
+    with database.app_context():
+        counter = QueryCounter(db.engine)
+    yield counter
+    counter.remove()
+
+
+def test_pages_stay_within_their_query_budgets(database, counter):
+    with database.app_context():
+        users = seed(SIZES)
+
+    counts = {page: {} for page in BUDGETS}
+    for size, (username, item_id) in users.items():
+        client = database.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        for page in BUDGETS:
+            fragment_cache.clear()
+            # Read the body so streamed templates are rendered inside the count
+            counts[page][size] = counter.count(lambda: client.get(page.format(item_id=item_id)).get_data())
+
+    over = {page: by_size for page, by_size in counts.items() if max(by_size.values()) > BUDGETS[page]}
+    growing = {page: by_size for page, by_size in counts.items() if len(set(by_size.values())) > 1}
+    assert not over, f'over budget: {over}'
+    assert not growing, f'query count grows with pantry size: {growing}'
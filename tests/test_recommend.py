@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db
+from app.ingredients import backfill_recipes
+from app.models import PantryItem, Recipe
+from app.recommend import RecipeMatcher, saved_recipe_lines
+
+
+def add_item(user, name, days=7):
+    db.session.add(PantryItem(name=name, brand=None, category='Protein', user_id=user.id,
+                              expiration_date=datetime.now() + timedelta(days=days), image_path=None))
+
+
+def test_match_and_cookable_agree_on_coverage(client, user, monkeypatch):
+    monkeypatch.setattr('app.routes.recipe_matcher', RecipeMatcher(saved_recipe_lines))
+    monkeypatch.setitem(client.application.config, 'RECIPE_MATCH_MIN_COVERAGE', 0.5)
+    add_item(user, 'Chicken Breasts')
+    add_item(user, 'Fresh Milk')
+    creamy = Recipe('Creamy Chicken', ['300g chicken breast, diced', '1 cup milk', 'pepper'], ['Cook.'])
+    saag = Recipe('Chicken Saag', ['200g chicken breast', '2 cups spinach', '1/2 cup milk'], ['Cook.'])
+    db.session.add_all([creamy, saag])
+    db.session.commit()
+
+    matches = {recipe['recipe_id']: recipe for recipe in client.get('/api/recipes/match').get_json()['recipes']}
+    cookable = {recipe['id']: recipe['missing']
+                for recipe in client.get('/api/recipes/cookable?missing=1').get_json()['recipes']}
+
+    assert (matches[creamy.id]['coverage'], matches[creamy.id]['missing']) == (1.0, [])
+    assert matches[saag.id]['missing'] == ['spinach']
+    assert cookable == {recipe_id: len(match['missing']) for recipe_id, match in matches.items()}
+
+
+def test_matcher_picks_up_backfilled_recipes(app, user):
+    matcher = RecipeMatcher(saved_recipe_lines)
+    add_item(user, 'Salmon Fillet')
+    db.session.execute(insert(Recipe.__table__).values(name='Salmon Bake', ingredients='2 salmon fillets, lemon',
+                                                      steps='Bake.'))
+    db.session.commit()
+    assert matcher.recommend_for_user(user.id) == []
+
+    backfill_recipes()
+
+    [match] = matcher.recommend_for_user(user.id)
+    assert (match.coverage, match.missing) == (0.5, ('lemon',))
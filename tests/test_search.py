@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models import PantryItem
+from app.search import search_documents, search_index
+
+
+@pytest.fixture
+def milks(app, user):
+    db.session.add_all(PantryItem(name=f'Milk {n}', brand=None, category='Protein', user_id=user.id,
+                                  expiration_date=datetime.now() + timedelta(days=n), image_path=None)
+                       for n in range(5))
+    db.session.commit()
+
+
+def test_paging_reaches_every_match(user, milks):
+    seen, page, has_next = [], 1, True
+    while has_next:
+        results, has_next = search_documents('pantry', 'milk', user.id, page=page, per_page=2)
+        seen += [item.name for item, _ in results]
+        page += 1
+
+    assert sorted(seen) == [f'Milk {n}' for n in range(5)]
+
+
+def test_older_matches_rank_by_relevance(app, user):
+    db.session.add(PantryItem(name='Oat Milk', brand=None, category='Protein', user_id=user.id,
+                              expiration_date=datetime.now(), image_path=None))
+    db.session.add_all(PantryItem(name='Cereal', brand='Milk Co', category='Protein', user_id=user.id,
+                                  expiration_date=datetime.now(), image_path=None) for _ in range(20))
+    db.session.commit()
+
+    results, _ = search_documents('pantry', 'milk', user.id, page=1, per_page=1)
+
+    # A name match outranks brand matches, however many newer ones there are
+    assert [item.name for item, _ in results] == ['Oat Milk']
+
+
+def test_fts5_tables_are_created_with_the_models(app):
+    if search_index.name != 'fts5':
+        pytest.skip('only the FTS5 backend keeps tables')
+    tables = set(db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type = 'table'")).scalars())
+
+    assert {'pantry_item_fts', 'recipe_fts'} <= tables
@@ -0,0 +1,51 @@
+from datetime import date, datetime, timedelta
+
+from app import db
+from app.models import PantryItem, PantrySummary, User
+from app.routes import get_dashboard
+from app.summary import claim_rollover, get_summary, rollover_summaries
+
+
+def add_item(user, name, days, **flags):
+    item = PantryItem(name=name, brand=None, category='Protein', expiration_date=datetime.now() + timedelta(days=days),
+                      user_id=user.id, image_path=None)
+    for flag, value in flags.items():
+        setattr(item, flag, value)
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_dashboard_leaves_out_used_and_out_of_stock_items(app, user):
+    add_item(user, 'Milk', 2)
+    add_item(user, 'Eggs', 2, used=True)
+    add_item(user, 'Tofu', -1, out_of_stock=True)
+    add_item(user, 'Ham', -1)
+
+    total, expiring, expired = get_dashboard(user.id)
+
+    assert total == 2
+    assert sorted(item.name for item in expiring) == ['Ham', 'Milk']
+    assert [item.name for item in expired] == ['Ham']
+
+
+def test_rollover_rebuilds_stale_summaries_in_batches(app, user):
+    users = [user] + [User(username=f'user{n}', password_hash='x') for n in range(4)]
+    db.session.add_all(users[1:])
+    db.session.commit()
+    for each in users:
+        add_item(each, 'Milk', 2)
+        get_summary(each.id)
+    db.session.query(PantrySummary).update({'as_of': date.today() - timedelta(days=1)})
+    db.session.commit()
+
+    assert rollover_summaries(batch_size=2) == 5
+    assert rollover_summaries(batch_size=2) == 0
+    db.session.expire_all()
+    assert {summary.as_of for summary in PantrySummary.query} == {date.today()}
+
+
+def test_rollover_is_claimed_once_per_day(app):
+    assert claim_rollover(date.today())
+    assert not claim_rollover(date.today())
+    assert claim_rollover(date.today() + timedelta(days=1))